@@ -0,0 +1,74 @@
+import os
+import sys
+
+# The server modules use flat imports (`from models import *`), so put server/ on the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'server'))
+
+import pytest
+from sqlalchemy import event
+
+from app import create_app
+from cache import response_cache
+from config import TestingConfig, config
+from models import db
+
+# The testing config uses a throwaway in-memory database
+flask_app = create_app('testing')
+
+@pytest.fixture
+def app():
+    with flask_app.app_context():
+        db.create_all()
+        response_cache.clear()
+        # The co-occurrence matrix and exercise catalog belong to the previous test's database
+        flask_app.extensions.pop('cooccurrence', None)
+        flask_app.extensions.pop('exercise_catalog', None)
+        yield flask_app
+        writer = flask_app.extensions.pop('link_writer', None)
+        if writer:
+            # Flush anything still queued before its tables go
+            writer.close()
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def shared_app(monkeypatch, tmp_path):
+    """An app on tmp_path/shared.db whose cache tag versions live in cache_tags, like a production worker's"""
+    class SharedTagsConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'shared.db'}"
+        RESPONSE_CACHE_SHARED_TAGS = True
+
+    monkeypatch.setitem(config, 'shared-tags', SharedTagsConfig)
+    app = create_app('shared-tags')
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def count_queries(app, client):
+    """Return a function that issues a request and reports how many SQL statements it ran"""
+    def count(method, url, **kwargs):
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        # Expire everything and drop cached responses so the request really hits the database
+        db.session.expire_all()
+        response_cache.clear()
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            response = client.open(url, method=method, **kwargs)
+            # Drain streamed bodies so queries issued by the generator are counted too
+            response.get_data()
+            response.close()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+        return response, len(statements)
+    return count
@@ -1,16 +1,61 @@
-from flask import Flask, jsonify, request
-from flask_migrate import Migrate
+import json
+import os
+
+import click
+from flask import Blueprint, Flask, Response, abort, current_app, jsonify, request, stream_with_context
 from marshmallow import ValidationError
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload, selectinload
+from werkzeug.exceptions import HTTPException
 
 from models import *
 from schemas import *
+from pagination import paginate, paginated_response, parse_limit
+from bulk import bulk_insert, bulk_items, bulk_response, load_many, reject
+from stats import exercise_stats, parse_weeks
+from filters import workout_filter_clauses
+from cache import response_cache
+from config import config
+from database import apply_sqlite_pragmas, init_read_engine
+from metrics import metrics
+from jobs import jobs
+from deletes import delete_links, delete_links_in_batches, delete_row
+from summaries import add_links, exercise_records, summaries_cli, workout_summary
+from search import search
+from timeline import timeline, timeline_cli
+from links import conflict_response, create_link, link_conflict, load_link
+from sync import ResyncRequired, changes_since, sync_batch
+from writebehind import QueueFull, link_writer, stored_receipt
+from catalog import app_catalog, exercise_page
+from serializers import fast_path_enabled
+from importer import import_logs_command
+
+# Rows fetched per server-side batch when streaming exports
+EXPORT_BATCH_SIZE = 1000
+
+api = Blueprint('api', __name__)
+
+def create_app(config_name=None):
+    """Build the app for 'development', 'production' or 'testing' (default: $APP_CONFIG or development)"""
+    app = Flask(__name__)
+    app.config.from_object(config[config_name or os.environ.get('APP_CONFIG', 'development')])
 
-app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///app.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    if click.get_current_context(silent=True) is not None:
+        # Loaded by the `flask` command: register `flask db`. Workers never import Alembic
+        from flask_migrate import Migrate
+        Migrate(app, db)
+    with app.app_context():
+        apply_sqlite_pragmas(db.engine, app.config['SQLITE_PRAGMAS'])
+        init_read_engine(app, db.engine)
+    response_cache.init_app(app)
+    metrics.init_app(app, db, counters=lambda: process_counters(app))
 
-migrate = Migrate(app, db)
-db.init_app(app)
+    app.register_blueprint(api)
+    app.cli.add_command(summaries_cli)
+    app.cli.add_command(timeline_cli)
+    app.cli.add_command(import_logs_command)
+    return app
 
 # Error handler decorator for cleaner code
 def handle_errors(f):
@@ -19,93 +64,346 @@ def handle_errors(f):
             return f(*args, **kwargs)
         except ValidationError as e:
             return jsonify({"errors": e.messages}), 400
+        except HTTPException:
+            # Let 404s from get_or_404 and friends keep their status code
+            raise
         except Exception as e:
             return jsonify({"error": str(e)}), 500
     wrapper.__name__ = f.__name__
     return wrapper
 
 # Workout Routes
-@app.route('/workouts', methods=['GET'])
+@api.route('/workouts', methods=['GET'])
 @handle_errors
+@response_cache.cached(lambda: ['workouts'])
 def get_workouts():
-    workouts = Workout.query.all()
-    return jsonify(workouts_schema.dump(workouts))
+    filters = workout_filter_clauses(workout_filter_schema.load(request.args))
+    workouts, next_cursor = paginate(Workout, WorkoutSchema, ('date', 'id'), filters)
+    return paginated_response(workouts, next_cursor)
+
+@api.route('/workouts/export', methods=['GET'])
+@handle_errors
+def export_workouts():
+    # Stream one JSON document per line so memory stays flat regardless of history size
+    filters = workout_filter_clauses(workout_filter_schema.load(request.args))
+    query = (
+        select(Workout)
+        .where(*filters)
+        .options(selectinload(Workout.workout_exercises))
+        .order_by(Workout.date, Workout.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+
+    def generate():
+        for workout in db.session.scalars(query):
+            yield json.dumps(workout_detail_schema.dump(workout)) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
 
-@app.route('/workouts/<int:id>', methods=['GET'])
+@api.route('/workouts/<int:id>', methods=['GET'])
 @handle_errors
+@response_cache.cached(lambda id: [f'workout:{id}', 'workout-details'])
 def get_workout(id):
-    workout = Workout.query.get_or_404(id)
+    # Load the nested workout_exercises in the same round-trip as the workout
+    workout = Workout.query.options(joinedload(Workout.workout_exercises)).filter_by(id=id).first_or_404()
     return jsonify(workout_detail_schema.dump(workout))
 
-@app.route('/workouts', methods=['POST'])
+@api.route('/workouts/<int:id>/summary', methods=['GET'])
+@handle_errors
+@response_cache.cached(lambda id: [f'workout:{id}', 'workout-details'])
+def get_workout_summary(id):
+    workout = Workout.query.get_or_404(id)
+    return jsonify(workout_summary_schema.dump(workout_summary(workout)))
+
+@api.route('/workouts/<int:id>/suggestions', methods=['GET'])
+@handle_errors
+@response_cache.cached(lambda id: [f'workout:{id}', 'stats'])
+def get_workout_suggestions(id):
+    # NumPy and SciPy load with the first suggestion, not at worker start
+    from suggestions import DEFAULT_SUGGESTIONS, MAX_SUGGESTIONS, app_matrix, suggestions
+    limit = parse_limit(request.args, default=DEFAULT_SUGGESTIONS, maximum=MAX_SUGGESTIONS)
+    Workout.query.get_or_404(id)
+    return jsonify(suggestions_schema.dump(suggestions(app_matrix(current_app), id, limit)))
+
+@api.route('/workouts', methods=['POST'])
 @handle_errors
 def create_workout():
     workout_data = workout_schema.load(request.json)
     db.session.add(workout_data)
     db.session.commit()
+    response_cache.invalidate('workouts')
     return jsonify(workout_schema.dump(workout_data)), 201
 
-@app.route('/workouts/<int:id>', methods=['DELETE'])
+@api.route('/workouts/bulk', methods=['POST'])
+@handle_errors
+def create_workouts_bulk():
+    rows, errors = load_many(workouts_bulk_schema, bulk_items())
+    created = workouts_schema.dump(bulk_insert(Workout, rows.values()))
+    db.session.commit()
+    if created:
+        response_cache.invalidate('workouts')
+    return bulk_response(created, errors)
+
+@api.route('/workouts/<int:id>', methods=['DELETE'])
 @handle_errors
 def delete_workout(id):
-    workout = Workout.query.get_or_404(id)
-    db.session.delete(workout)
+    Workout.query.get_or_404(id)
+    if request.args.get('mode') == 'async':
+        return accepted(jobs.submit('delete_workout', purge_workout, id))
+    
+    # Set-based deletes instead of loading every child through the ORM cascade
+    exercise_ids = delete_links(WorkoutExercise.workout_id, id)
+    delete_row(Workout, id)
     db.session.commit()
+    response_cache.invalidate('workouts', f'workout:{id}', 'stats')
+    response_cache.invalidate_many('exercise', exercise_ids, group='exercise-details')
     return jsonify({"message": f"Workout {id} deleted successfully"})
 
 # Exercise Routes
-@app.route('/exercises', methods=['GET'])
+@api.route('/exercises', methods=['GET'])
 @handle_errors
+@response_cache.cached(lambda: ['exercises'])
 def get_exercises():
-    exercises = Exercise.query.all()
-    return jsonify(exercises_schema.dump(exercises))
+    # Served from the in-memory catalog: one version read instead of the page query
+    filters = exercise_filter_schema.load(request.args)
+    catalog = app_catalog(current_app).current()
+    exercises, next_cursor = exercise_page(catalog, ExerciseSchema, request.args, filters, fast_path_enabled())
+    return paginated_response(exercises, next_cursor)
+
+@api.route('/exercises/stats', methods=['GET'])
+@handle_errors
+@response_cache.cached(lambda: ['exercises', 'stats'])
+def get_exercises_stats():
+    stats = exercise_stats(weeks=parse_weeks(request.args))
+    return jsonify(exercises_stats_schema.dump(stats))
+
+@api.route('/exercises/<int:id>/stats', methods=['GET'])
+@handle_errors
+@response_cache.cached(lambda id: [f'exercise:{id}', 'exercise-details'])
+def get_exercise_stats(id):
+    stats = exercise_stats(id, weeks=parse_weeks(request.args))
+    if not stats:
+        abort(404)
+    return jsonify(exercise_stats_schema.dump(stats[0]))
+
+@api.route('/exercises/<int:id>/records', methods=['GET'])
+@handle_errors
+@response_cache.cached(lambda id: [f'exercise:{id}', 'exercise-details'])
+def get_exercise_records(id):
+    app_catalog(current_app).current().get_or_404(id)
+    return jsonify(exercise_records_schema.dump(exercise_records(id)))
 
-@app.route('/exercises/<int:id>', methods=['GET'])
+@api.route('/exercises/<int:id>', methods=['GET'])
 @handle_errors
+@response_cache.cached(lambda id: [f'exercise:{id}', 'exercise-details'])
 def get_exercise(id):
-    exercise = Exercise.query.get_or_404(id)
+    exercise = Exercise.query.options(joinedload(Exercise.workout_exercises)).filter_by(id=id).first_or_404()
     return jsonify(exercise_detail_schema.dump(exercise))
 
-@app.route('/exercises', methods=['POST'])
+@api.route('/exercises', methods=['POST'])
 @handle_errors
 def create_exercise():
     exercise_data = exercise_schema.load(request.json)
     db.session.add(exercise_data)
     db.session.commit()
+    response_cache.invalidate('exercises')
     return jsonify(exercise_schema.dump(exercise_data)), 201
 
-@app.route('/exercises/<int:id>', methods=['DELETE'])
+@api.route('/exercises/bulk', methods=['POST'])
+@handle_errors
+def create_exercises_bulk():
+    rows, errors = load_many(exercises_bulk_schema, bulk_items())
+    
+    # Names must be unique against existing rows and within the batch
+    names = [row['name'] for row in rows.values()]
+    existing = app_catalog(current_app).current().by_name
+    taken = {name for name in names if name in existing}
+    for index, row in list(rows.items()):
+        if row['name'] in taken:
+            reject(rows, errors, index, 'name', "Exercise name already exists.")
+        taken.add(row['name'])
+    
+    created = exercises_schema.dump(bulk_insert(Exercise, rows.values()))
+    db.session.commit()
+    if created:
+        response_cache.invalidate('exercises')
+    return bulk_response(created, errors)
+
+@api.route('/exercises/<int:id>', methods=['DELETE'])
 @handle_errors
 def delete_exercise(id):
-    exercise = Exercise.query.get_or_404(id)
-    db.session.delete(exercise)
+    Exercise.query.get_or_404(id)
+    if request.args.get('mode') == 'async':
+        return accepted(jobs.submit('delete_exercise', purge_exercise, id))
+    
+    workout_ids = delete_links(WorkoutExercise.exercise_id, id)
+    delete_row(Exercise, id)
     db.session.commit()
+    # Workout lists can be filtered by exercise/category, so they change too
+    response_cache.invalidate('exercises', f'exercise:{id}', 'stats', 'workouts')
+    response_cache.invalidate_many('workout', workout_ids, group='workout-details')
     return jsonify({"message": f"Exercise {id} deleted successfully"})
 
+# Background deletes for parents with very large histories: children go in
+# bounded batches, each in its own transaction, then the parent row.
+def purge_workout(job, id):
+    delete_links_in_batches(WorkoutExercise.workout_id, id, job)
+    delete_row(Workout, id)
+    db.session.commit()
+    response_cache.invalidate('workouts', f'workout:{id}', 'stats', 'exercise-details')
+
+def purge_exercise(job, id):
+    delete_links_in_batches(WorkoutExercise.exercise_id, id, job)
+    delete_row(Exercise, id)
+    db.session.commit()
+    response_cache.invalidate('exercises', f'exercise:{id}', 'stats', 'workouts', 'workout-details')
+
+def accepted(job):
+    response = jsonify({**job, "status_url": f"/jobs/{job['id']}"})
+    response.headers['Location'] = f"/jobs/{job['id']}"
+    return response, 202
+
 # WorkoutExercise Routes
-@app.route('/workouts/<int:workout_id>/exercises/<int:exercise_id>/workout_exercises', methods=['POST'])
+@api.route('/workouts/<int:workout_id>/exercises/<int:exercise_id>/workout_exercises', methods=['POST'])
 @handle_errors
 def add_exercise_to_workout(workout_id, exercise_id):
-    # Verify resources exist and no duplicate
-    Workout.query.get_or_404(workout_id)
-    Exercise.query.get_or_404(exercise_id)
+    # No existence or duplicate SELECTs up front: the INSERT's foreign keys and
+    # unique constraint report those, so a new link is one statement plus the summaries
+    row, invalid = load_link(request.json or {})
+    if invalid:
+        # A missing parent or a duplicate still takes precedence over a bad body
+        conflict = link_conflict(workout_id, exercise_id)
+        return conflict_response(conflict) if conflict else invalid
+    if request.args.get('mode') == 'async':
+        return queued(workout_id, exercise_id, row)
+    
+    link, conflict = create_link(workout_id, exercise_id, row)
+    if conflict:
+        return conflict_response(conflict)
+    db.session.commit()
+    response_cache.invalidate('workouts', f'workout:{workout_id}', f'exercise:{exercise_id}', 'stats')
     
-    if WorkoutExercise.query.filter_by(workout_id=workout_id, exercise_id=exercise_id).first():
-        return jsonify({"error": "Exercise already added to this workout"}), 400
+    return jsonify(workout_exercise_schema.dump(link)), 201
+
+def queued(workout_id, exercise_id, row):
+    # Write-behind: the link is committed later in a group with others (see writebehind.py)
+    try:
+        receipt = link_writer(current_app._get_current_object()).enqueue(workout_id, exercise_id, row)
+    except QueueFull as e:
+        return jsonify({"error": str(e)}), 503, {'Retry-After': '1'}
+    status_url = f"/workout_exercises/receipts/{receipt['id']}"
+    response = jsonify({**receipt, "status_url": status_url})
+    response.headers['Location'] = status_url
+    return response, 202
+
+@api.route('/workout_exercises/receipts/<receipt_id>', methods=['GET'])
+def get_link_receipt(receipt_id):
+    # Queued links are only known to the process that accepted them; decided ones are stored
+    writer = current_app.extensions.get('link_writer')
+    receipt = (writer.get(receipt_id) if writer else None) or stored_receipt(receipt_id)
+    if receipt is None:
+        abort(404)
+    return jsonify(receipt)
+
+@api.route('/workouts/<int:workout_id>/workout_exercises/bulk', methods=['POST'])
+@handle_errors
+def add_exercises_to_workout_bulk(workout_id):
+    Workout.query.get_or_404(workout_id)
+    rows, errors = load_many(workout_exercises_bulk_schema, bulk_items())
     
-    # Prepare data
-    data = request.json or {}
-    data.update({'workout_id': workout_id, 'exercise_id': exercise_id})
+    # Two set-based lookups replace the per-item exists/duplicate queries
+    exercise_ids = {row['exercise_id'] for row in rows.values()}
+    known = set(db.session.scalars(select(Exercise.id).where(Exercise.id.in_(exercise_ids))))
+    linked = set(db.session.scalars(
+        select(WorkoutExercise.exercise_id)
+        .where(WorkoutExercise.workout_id == workout_id, WorkoutExercise.exercise_id.in_(exercise_ids))
+    ))
     
-    # Validate at least one metric is provided
-    if not any([data.get('reps'), data.get('sets'), data.get('duration_seconds')]):
-        return jsonify({"error": "At least one of reps, sets, or duration_seconds must be provided"}), 400
+    for index, row in list(rows.items()):
+        exercise_id = row['exercise_id']
+        if not any([row.get('reps'), row.get('sets'), row.get('duration_seconds')]):
+            reject(rows, errors, index, '_schema', "At least one of reps, sets, or duration_seconds must be provided")
+        elif exercise_id not in known:
+            reject(rows, errors, index, 'exercise_id', f"Exercise {exercise_id} not found")
+        elif exercise_id in linked:
+            reject(rows, errors, index, 'exercise_id', "Exercise already added to this workout")
+        else:
+            linked.add(exercise_id)
+            row['workout_id'] = workout_id
     
-    workout_exercise = workout_exercise_schema.load(data)
-    db.session.add(workout_exercise)
+    inserted = bulk_insert(WorkoutExercise, rows.values())
+    if inserted:
+        add_links(WorkoutExercise.id.in_([row.id for row in inserted]))
+    created = workout_exercises_schema.dump(inserted)
     db.session.commit()
-    
-    return jsonify(workout_exercise_schema.dump(workout_exercise)), 201
+    if created:
+        response_cache.invalidate('workouts', f'workout:{workout_id}', 'stats',
+                                  *(f"exercise:{row['exercise_id']}" for row in created))
+    return bulk_response(created, errors)
+
+# Calendar Routes
+@api.route('/stats/timeline', methods=['GET'])
+@handle_errors
+@response_cache.cached(lambda: ['workouts', 'stats'])
+def get_timeline():
+    return jsonify(timeline_buckets_schema.dump(timeline(timeline_schema.load(request.args))))
+
+# Search Routes
+@api.route('/search', methods=['GET'])
+@handle_errors
+@response_cache.cached(lambda: ['exercises', 'workouts'])
+def search_all():
+    results, next_cursor = search(search_schema.load(request.args), request.args)
+    return paginated_response(search_results_schema.dump(results), next_cursor)
+
+# Sync Routes
+@api.route('/sync', methods=['GET'])
+@handle_errors
+def get_changes():
+    try:
+        return jsonify(changes_since(request.args))
+    except ResyncRequired as e:
+        return jsonify({"error": str(e), "resync": True}), 410
+
+@api.route('/sync', methods=['POST'])
+@handle_errors
+def post_mutations():
+    body, status, replayed = sync_batch(request.headers.get('Idempotency-Key'), request.get_json(silent=True))
+    if status == 200 and not replayed:
+        # A batch can touch any row, so drop every cached list and detail
+        response_cache.invalidate('exercises', 'workouts', 'stats', 'exercise-details', 'workout-details')
+    response = jsonify(body)
+    if replayed:
+        response.headers['Idempotent-Replayed'] = 'true'
+    return response, status
+
+@api.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        abort(404)
+    return jsonify(job)
+
+@api.route('/cache/stats', methods=['GET'])
+def get_cache_stats():
+    return jsonify(response_cache.stats())
+
+def process_counters(app):
+    """Counters /metrics reports besides the per-route ones, summed across workers like them"""
+    cache_stats = response_cache.stats()
+    writer = app.extensions.get('link_writer')
+    writer_stats = writer.stats() if writer else {'written': 0, 'failed': 0, 'commits': 0}
+    return [
+        ('response_cache_hits_total', 'Responses served from the response cache', cache_stats['hits']),
+        ('response_cache_misses_total', 'Responses computed and stored in the response cache', cache_stats['misses']),
+        ('write_behind_links_written_total', 'Queued links committed by the write-behind writer', writer_stats['written']),
+        ('write_behind_links_failed_total', 'Queued links the write-behind writer rejected', writer_stats['failed']),
+        ('write_behind_commits_total', 'Transactions committed by the write-behind writer', writer_stats['commits']),
+    ]
+
+@api.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 if __name__ == '__main__':
-    app.run(port=5555, debug=True)
\ No newline at end of file
+    create_app().run(port=5555, debug=True)
\ No newline at end of file
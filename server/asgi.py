@@ -0,0 +1,8 @@
+"""
+ASGI entry point for the async deployment mode
+Run with: uvicorn asgi:app --workers 4 --port 5555
+"""
+
+from async_app import create_async_app
+
+app = create_async_app('production')
@@ -0,0 +1,433 @@
+"""
+ASGI variant of the API: the same routes, models and schemas served by Quart
+on SQLAlchemy's asyncio extension with aiosqlite.
+Run with: uvicorn asgi:app  (see asgi.py)
+
+Views await the database instead of holding a worker thread for the whole
+request, so one process can keep many slow client connections open. The
+multi-statement write helpers (summaries, deletes, bulk inserts) are the
+same sync functions the WSGI app uses, run on the request's AsyncSession
+with run_sync(). The response cache, /metrics and write-behind links
+(?mode=async on POST .../workout_exercises, see writebehind.py) are WSGI-only;
+here that POST always writes before it answers.
+"""
+
+import asyncio
+import json
+import os
+from functools import wraps
+
+from marshmallow import ValidationError
+from quart import Blueprint, Quart, Response, abort, current_app, jsonify, request
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.pool import StaticPool
+from werkzeug.exceptions import HTTPException
+
+from models import *
+from schemas import *
+from pagination import build_page, next_page_headers, page_items, parse_limit
+from bulk import bulk_insert, bulk_status, check_bulk_items, load_many, reject
+from stats import exercise_stats, parse_weeks
+from filters import workout_filter_clauses
+from config import config
+from database import apply_sqlite_pragmas
+from jobs import jobs
+from deletes import delete_links, delete_links_in_batches, delete_row
+from summaries import add_links, exercise_records, workout_summary
+from search import search
+from timeline import timeline
+from links import conflict_response, create_link, link_conflict, load_link
+from sync import ResyncRequired, changes_since, sync_batch
+from catalog import app_catalog, exercise_page
+
+# Rows fetched per server-side batch when streaming exports
+EXPORT_BATCH_SIZE = 1000
+
+api = Blueprint('async_api', __name__)
+
+def async_database_url(app):
+    """The app's SQLite URL on the aiosqlite driver"""
+    url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+    if url.database and url.database != ':memory:' and not os.path.isabs(url.database):
+        # Same rule as Flask-SQLAlchemy: relative SQLite paths live in the instance folder
+        url = url.set(database=os.path.join(app.instance_path, url.database))
+    return url.set(drivername='sqlite+aiosqlite')
+
+def create_async_app(config_name=None):
+    """Build the ASGI app for 'development', 'production' or 'testing' (default: $APP_CONFIG or development)"""
+    app = Quart(__name__)
+    app.config.from_object(config[config_name or os.environ.get('APP_CONFIG', 'development')])
+
+    url = async_database_url(app)
+    options = dict(app.config['SQLALCHEMY_ENGINE_OPTIONS'])
+    if url.database in (None, '', ':memory:'):
+        # One shared connection, or every checkout would see a different empty database
+        options = {'poolclass': StaticPool}
+    engine = create_async_engine(url, **options)
+    apply_sqlite_pragmas(engine.sync_engine, app.config['SQLITE_PRAGMAS'])
+    app.extensions['async_engine'] = engine
+    app.extensions['async_session'] = async_sessionmaker(engine, expire_on_commit=False)
+    # The co-occurrence matrix holds a thread lock while it queries. Under run_sync a
+    # second request on this loop would block the loop on it, so they take turns here first
+    app.extensions['suggestions_lock'] = asyncio.Lock()
+
+    @app.after_serving
+    async def dispose_engine():
+        await engine.dispose()
+
+    app.register_blueprint(api)
+    return app
+
+def session():
+    return current_app.extensions['async_session']()
+
+def handle_errors(f):
+    @wraps(f)
+    async def wrapper(*args, **kwargs):
+        try:
+            return await f(*args, **kwargs)
+        except ValidationError as e:
+            return jsonify({"errors": e.messages}), 400
+        except HTTPException:
+            raise
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+    return wrapper
+
+def paginated_response(items, next_cursor):
+    if isinstance(items, bytes):
+        response = Response(items, mimetype='application/json')
+    else:
+        response = jsonify(items)
+    response.headers.update(next_page_headers(request.path, request.args, next_cursor))
+    return response
+
+async def get_or_404(s, model, id):
+    instance = await s.get(model, id)
+    if instance is None:
+        abort(404)
+    return instance
+
+# Workout Routes
+@api.route('/workouts', methods=['GET'])
+@handle_errors
+async def get_workouts():
+    filters = workout_filter_clauses(workout_filter_schema.load(request.args))
+    page = build_page(Workout, WorkoutSchema, ('date', 'id'), request.args, filters,
+                      current_app.config['FAST_LIST_SERIALIZATION'])
+    async with session() as s:
+        workouts, next_cursor = page_items(page, await s.execute(page.statement))
+    return paginated_response(workouts, next_cursor)
+
+@api.route('/workouts/export', methods=['GET'])
+@handle_errors
+async def export_workouts():
+    filters = workout_filter_clauses(workout_filter_schema.load(request.args))
+    query = (
+        select(Workout)
+        .where(*filters)
+        .options(selectinload(Workout.workout_exercises))
+        .order_by(Workout.date, Workout.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    make_session = current_app.extensions['async_session']
+
+    async def generate():
+        async with make_session() as s:
+            async for workout in await s.stream_scalars(query):
+                yield json.dumps(workout_detail_schema.dump(workout)) + '\n'
+
+    return Response(generate(), mimetype='application/x-ndjson')
+
+@api.route('/workouts/<int:id>', methods=['GET'])
+@handle_errors
+async def get_workout(id):
+    query = select(Workout).options(joinedload(Workout.workout_exercises)).where(Workout.id == id)
+    async with session() as s:
+        workout = (await s.execute(query)).unique().scalar_one_or_none()
+    if workout is None:
+        abort(404)
+    return jsonify(workout_detail_schema.dump(workout))
+
+@api.route('/workouts/<int:id>/summary', methods=['GET'])
+@handle_errors
+async def get_workout_summary(id):
+    async with session() as s:
+        workout = await get_or_404(s, Workout, id)
+        summary = await s.run_sync(lambda sync: workout_summary(workout, sync))
+    return jsonify(workout_summary_schema.dump(summary))
+
+@api.route('/workouts/<int:id>/suggestions', methods=['GET'])
+@handle_errors
+async def get_workout_suggestions(id):
+    # NumPy and SciPy load with the first suggestion, not at worker start
+    from suggestions import DEFAULT_SUGGESTIONS, MAX_SUGGESTIONS, app_matrix, suggestions
+    limit = parse_limit(request.args, default=DEFAULT_SUGGESTIONS, maximum=MAX_SUGGESTIONS)
+    matrix = app_matrix(current_app)
+    async with session() as s:
+        await get_or_404(s, Workout, id)
+        async with current_app.extensions['suggestions_lock']:
+            results = await s.run_sync(lambda sync: suggestions(matrix, id, limit, sync))
+    return jsonify(suggestions_schema.dump(results))
+
+@api.route('/workouts', methods=['POST'])
+@handle_errors
+async def create_workout():
+    workout = workout_schema.load(await request.get_json(), transient=True)
+    async with session() as s:
+        s.add(workout)
+        await s.commit()
+    return jsonify(workout_schema.dump(workout)), 201
+
+@api.route('/workouts/bulk', methods=['POST'])
+@handle_errors
+async def create_workouts_bulk():
+    rows, errors = load_many(workouts_bulk_schema, check_bulk_items(await request.get_json(silent=True)))
+    async with session() as s:
+        created = workouts_schema.dump(await s.run_sync(lambda sync: bulk_insert(Workout, rows.values(), sync)))
+        await s.commit()
+    return jsonify({"created": created, "errors": errors}), bulk_status(created, errors)
+
+@api.route('/workouts/<int:id>', methods=['DELETE'])
+@handle_errors
+async def delete_workout(id):
+    background = request.args.get('mode') == 'async'
+    async with session() as s:
+        await get_or_404(s, Workout, id)
+        if not background:
+            await s.run_sync(remove, Workout, WorkoutExercise.workout_id, id)
+            await s.commit()
+    if background:
+        # Started once this request's session has given its connection back
+        return accepted(await start_job('delete_workout', purge, Workout, WorkoutExercise.workout_id, id))
+    return jsonify({"message": f"Workout {id} deleted successfully"})
+
+# Exercise Routes
+@api.route('/exercises', methods=['GET'])
+@handle_errors
+async def get_exercises():
+    filters = exercise_filter_schema.load(request.args)
+    catalog = app_catalog(current_app)
+    async with session() as s:
+        current = await s.run_sync(lambda sync: catalog.current(sync))
+    exercises, next_cursor = exercise_page(current, ExerciseSchema, request.args, filters,
+                                           fast=current_app.config['FAST_LIST_SERIALIZATION'])
+    return paginated_response(exercises, next_cursor)
+
+@api.route('/exercises/stats', methods=['GET'])
+@handle_errors
+async def get_exercises_stats():
+    weeks = parse_weeks(request.args)
+    async with session() as s:
+        stats = await s.run_sync(lambda sync: exercise_stats(weeks=weeks, session=sync))
+    return jsonify(exercises_stats_schema.dump(stats))
+
+@api.route('/exercises/<int:id>/stats', methods=['GET'])
+@handle_errors
+async def get_exercise_stats(id):
+    weeks = parse_weeks(request.args)
+    async with session() as s:
+        stats = await s.run_sync(lambda sync: exercise_stats(id, weeks=weeks, session=sync))
+    if not stats:
+        abort(404)
+    return jsonify(exercise_stats_schema.dump(stats[0]))
+
+@api.route('/exercises/<int:id>/records', methods=['GET'])
+@handle_errors
+async def get_exercise_records(id):
+    catalog = app_catalog(current_app)
+    async with session() as s:
+        await s.run_sync(lambda sync: catalog.current(sync).get_or_404(id))
+        records = await s.run_sync(lambda sync: exercise_records(id, sync))
+    return jsonify(exercise_records_schema.dump(records))
+
+@api.route('/exercises/<int:id>', methods=['GET'])
+@handle_errors
+async def get_exercise(id):
+    query = select(Exercise).options(joinedload(Exercise.workout_exercises)).where(Exercise.id == id)
+    async with session() as s:
+        exercise = (await s.execute(query)).unique().scalar_one_or_none()
+    if exercise is None:
+        abort(404)
+    return jsonify(exercise_detail_schema.dump(exercise))
+
+@api.route('/exercises', methods=['POST'])
+@handle_errors
+async def create_exercise():
+    exercise = exercise_schema.load(await request.get_json(), transient=True)
+    async with session() as s:
+        s.add(exercise)
+        await s.commit()
+    return jsonify(exercise_schema.dump(exercise)), 201
+
+@api.route('/exercises/bulk', methods=['POST'])
+@handle_errors
+async def create_exercises_bulk():
+    rows, errors = load_many(exercises_bulk_schema, check_bulk_items(await request.get_json(silent=True)))
+    catalog = app_catalog(current_app)
+    async with session() as s:
+        # Names must be unique against existing rows and within the batch
+        names = [row['name'] for row in rows.values()]
+        existing = (await s.run_sync(lambda sync: catalog.current(sync))).by_name
+        taken = {name for name in names if name in existing}
+        for index, row in list(rows.items()):
+            if row['name'] in taken:
+                reject(rows, errors, index, 'name', "Exercise name already exists.")
+            taken.add(row['name'])
+
+        created = exercises_schema.dump(await s.run_sync(lambda sync: bulk_insert(Exercise, rows.values(), sync)))
+        await s.commit()
+    return jsonify({"created": created, "errors": errors}), bulk_status(created, errors)
+
+@api.route('/exercises/<int:id>', methods=['DELETE'])
+@handle_errors
+async def delete_exercise(id):
+    background = request.args.get('mode') == 'async'
+    async with session() as s:
+        await get_or_404(s, Exercise, id)
+        if not background:
+            await s.run_sync(remove, Exercise, WorkoutExercise.exercise_id, id)
+            await s.commit()
+    if background:
+        # Started once this request's session has given its connection back
+        return accepted(await start_job('delete_exercise', purge, Exercise, WorkoutExercise.exercise_id, id))
+    return jsonify({"message": f"Exercise {id} deleted successfully"})
+
+# Sync delete bodies, run on the AsyncSession's underlying Session
+def remove(sync, model, column, id):
+    delete_links(column, id, sync)
+    delete_row(model, id, sync)
+
+def purge(sync, job, model, column, id):
+    delete_links_in_batches(column, id, job, session=sync)
+    delete_row(model, id, sync)
+    sync.commit()
+
+async def start_job(kind, fn, *args):
+    """Store a job and run fn(sync_session, job, *args) as a background task on the event loop"""
+    async with session() as s:
+        job = await s.run_sync(lambda sync: jobs.create(kind, sync))
+    make_session = current_app.extensions['async_session']
+
+    async def run():
+        async with make_session() as s:
+            await s.run_sync(lambda sync: jobs.start(job, sync))
+            try:
+                await s.run_sync(fn, job, *args)
+            except Exception as e:
+                await s.run_sync(lambda sync: jobs.finish(job, sync, e))
+            else:
+                await s.run_sync(lambda sync: jobs.finish(job, sync))
+
+    # Quart awaits background tasks on shutdown, so a purge isn't cut off mid-batch
+    current_app.add_background_task(run)
+    return dict(job)
+
+def accepted(job):
+    response = jsonify({**job, "status_url": f"/jobs/{job['id']}"})
+    response.headers['Location'] = f"/jobs/{job['id']}"
+    return response, 202
+
+# WorkoutExercise Routes
+@api.route('/workouts/<int:workout_id>/exercises/<int:exercise_id>/workout_exercises', methods=['POST'])
+@handle_errors
+async def add_exercise_to_workout(workout_id, exercise_id):
+    row, invalid = load_link(await request.get_json() or {})
+    async with session() as s:
+        if invalid:
+            conflict = await s.run_sync(lambda sync: link_conflict(workout_id, exercise_id, sync))
+            return conflict_response(conflict) if conflict else invalid
+
+        link, conflict = await s.run_sync(lambda sync: create_link(workout_id, exercise_id, row, sync))
+        if conflict:
+            return conflict_response(conflict)
+        await s.commit()
+
+    return jsonify(workout_exercise_schema.dump(link)), 201
+
+@api.route('/workouts/<int:workout_id>/workout_exercises/bulk', methods=['POST'])
+@handle_errors
+async def add_exercises_to_workout_bulk(workout_id):
+    async with session() as s:
+        await get_or_404(s, Workout, workout_id)
+        rows, errors = load_many(workout_exercises_bulk_schema, check_bulk_items(await request.get_json(silent=True)))
+
+        exercise_ids = {row['exercise_id'] for row in rows.values()}
+        known = set(await s.scalars(select(Exercise.id).where(Exercise.id.in_(exercise_ids))))
+        linked = set(await s.scalars(
+            select(WorkoutExercise.exercise_id)
+            .where(WorkoutExercise.workout_id == workout_id, WorkoutExercise.exercise_id.in_(exercise_ids))
+        ))
+
+        for index, row in list(rows.items()):
+            exercise_id = row['exercise_id']
+            if not any([row.get('reps'), row.get('sets'), row.get('duration_seconds')]):
+                reject(rows, errors, index, '_schema', "At least one of reps, sets, or duration_seconds must be provided")
+            elif exercise_id not in known:
+                reject(rows, errors, index, 'exercise_id', f"Exercise {exercise_id} not found")
+            elif exercise_id in linked:
+                reject(rows, errors, index, 'exercise_id', "Exercise already added to this workout")
+            else:
+                linked.add(exercise_id)
+                row['workout_id'] = workout_id
+
+        def insert_links(sync):
+            inserted = bulk_insert(WorkoutExercise, rows.values(), sync)
+            if inserted:
+                add_links(WorkoutExercise.id.in_([row.id for row in inserted]), sync)
+            return inserted
+
+        created = workout_exercises_schema.dump(await s.run_sync(insert_links))
+        await s.commit()
+    return jsonify({"created": created, "errors": errors}), bulk_status(created, errors)
+
+# Calendar Routes
+@api.route('/stats/timeline', methods=['GET'])
+@handle_errors
+async def get_timeline():
+    params = timeline_schema.load(request.args)
+    async with session() as s:
+        buckets = await s.run_sync(lambda sync: timeline(params, sync))
+    return jsonify(timeline_buckets_schema.dump(buckets))
+
+# Search Routes
+@api.route('/search', methods=['GET'])
+@handle_errors
+async def search_all():
+    params, args = search_schema.load(request.args), request.args
+    async with session() as s:
+        results, next_cursor = await s.run_sync(lambda sync: search(params, args, sync))
+    return paginated_response(search_results_schema.dump(results), next_cursor)
+
+# Sync Routes
+@api.route('/sync', methods=['GET'])
+@handle_errors
+async def get_changes():
+    args = request.args
+    async with session() as s:
+        try:
+            return jsonify(await s.run_sync(lambda sync: changes_since(args, sync)))
+        except ResyncRequired as e:
+            return jsonify({"error": str(e), "resync": True}), 410
+
+@api.route('/sync', methods=['POST'])
+@handle_errors
+async def post_mutations():
+    key, payload = request.headers.get('Idempotency-Key'), await request.get_json(silent=True)
+    async with session() as s:
+        body, status, replayed = await s.run_sync(lambda sync: sync_batch(key, payload, sync))
+    response = jsonify(body)
+    if replayed:
+        response.headers['Idempotent-Replayed'] = 'true'
+    return response, status
+
+@api.route('/jobs/<job_id>', methods=['GET'])
+async def get_job(job_id):
+    async with session() as s:
+        job = await s.run_sync(lambda sync: jobs.get(job_id, sync))
+    if job is None:
+        abort(404)
+    return jsonify(job)
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Compare the WSGI app (gunicorn gthread) with the ASGI app (uvicorn) under concurrent connections
+Run with: python bench_asgi.py [--concurrency 8,64,256] [--slow-clients 0,32] [--workers 2 --threads 4]
+
+Seeds a throwaway database, starts each server in turn on it with the same
+number of worker processes, and runs bench_load's readers against it. With
+--slow-clients, that many extra connections trickle a POST body one byte at
+a time for the whole run, the way a phone on a bad network does: each one
+pins a gthread worker thread, while uvicorn waits for the bytes on its
+event loop. The response cache is off for both.
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+from bench_load import run_level
+
+def seed(database_url, workouts):
+    os.environ["DATABASE_URL"] = database_url
+    from app import create_app
+    from models import db
+    from seed import generate
+    from summaries import rebuild
+
+    app = create_app("production")
+    with app.app_context():
+        db.create_all()
+        with db.engine.begin() as connection:
+            generate(connection, workouts, max(50, workouts // 200), 4)
+        rebuild()
+        db.session.commit()
+        db.engine.dispose()
+
+def server_command(kind, port, workers, threads):
+    if kind == "wsgi":
+        return [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--bind", f"127.0.0.1:{port}",
+                "--workers", str(workers), "--threads", str(threads), "--access-logfile", "/dev/null"]
+    return [sys.executable, "-m", "uvicorn", "asgi:app", "--port", str(port), "--workers", str(workers),
+            "--no-access-log", "--log-level", "warning"]
+
+def wait_until_ready(url, timeout=30):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            if requests.get(f"{url}/exercises?limit=1", timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"server at {url} did not start")
+
+def slow_client(port, stop, interval=0.25):
+    # Trailing JSON whitespace keeps the body arriving for longer than any run
+    body = json.dumps({"duration_minutes": 30, "notes": "sent from a very slow connection"}).encode() + b" " * 4096
+    head = (f"POST /workouts HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n").encode()
+    try:
+        with socket.create_connection(("127.0.0.1", port)) as sock:
+            sock.sendall(head)
+            for i in range(len(body)):
+                if stop.wait(interval):
+                    return
+                sock.sendall(body[i:i + 1])
+    except OSError:
+        pass
+
+def run_server(kind, args, env, paths):
+    url = f"http://127.0.0.1:{args.port}"
+    process = subprocess.Popen(server_command(kind, args.port, args.workers, args.threads), env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    results = {}
+    try:
+        wait_until_ready(url)
+        for slow in (int(s) for s in args.slow_clients.split(",")):
+            stop = threading.Event()
+            trickles = [threading.Thread(target=slow_client, args=(args.port, stop), daemon=True) for _ in range(slow)]
+            for thread in trickles:
+                thread.start()
+            time.sleep(0.5 if slow else 0)
+            for concurrency in (int(c) for c in args.concurrency.split(",")):
+                result = run_level(url, paths, concurrency, args.duration)
+                results[f"{concurrency}/{slow}"] = result
+                print(f"{kind:>6}{concurrency:>8}{slow:>6}{result['rps']:>10.0f}{result['p50']:>10.1f}"
+                      f"{result['p95']:>10.1f}{result['p99']:>10.1f}{result['errors']:>8}")
+            stop.set()
+            for thread in trickles:
+                thread.join()
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workouts", type=int, default=10_000)
+    parser.add_argument("--paths", default="/workouts,/exercises,/workouts/1,/exercises/1/records")
+    parser.add_argument("--concurrency", default="8,64,256")
+    parser.add_argument("--slow-clients", default="0,32", help="comma-separated counts of trickling connections")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=4, help="gunicorn threads per worker")
+    parser.add_argument("--port", type=int, default=5599)
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        print(f"Seeding {args.workouts:,} workouts...")
+        seed(database_url, args.workouts)
+        env = {**os.environ, "DATABASE_URL": database_url, "RESPONSE_CACHE_ENABLED": "0"}
+
+        print(f"\n{'server':>6}{'conns':>8}{'slow':>6}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+        results = {kind: run_server(kind, args, env, args.paths.split(",")) for kind in ("wsgi", "asgi")}
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
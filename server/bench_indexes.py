@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Benchmark the secondary indexes on workouts.date and workout_exercises.exercise_id
+Run with: python bench_indexes.py [--workouts 1000000] [--links-per-workout 3]
+
+Builds a throwaway SQLite database, times each query without the indexes,
+creates them, then times the same queries again.
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import create_engine, delete, select, text
+
+from models import db, Workout, WorkoutExercise
+from seed import generate
+
+INDEXES = [index for table in (Workout.__table__, WorkoutExercise.__table__) for index in table.indexes]
+
+def queries(exercises):
+    start = date.today() - timedelta(days=400)
+    return {
+        "workouts in a 30 day range": (select(Workout.id, Workout.duration_minutes)
+                                       .where(Workout.date.between(start, start + timedelta(days=30)))),
+        "first page ordered by (date, id)": select(Workout).order_by(Workout.date, Workout.id).limit(50),
+        "links for one exercise": select(WorkoutExercise).where(WorkoutExercise.exercise_id == exercises // 2),
+        "cascade delete for one exercise": delete(WorkoutExercise).where(WorkoutExercise.exercise_id == exercises // 2),
+    }
+
+def time_queries(engine, statements, repeat):
+    results = {}
+    for label, statement in statements.items():
+        samples = []
+        for _ in range(repeat):
+            with engine.connect() as conn:
+                started = time.perf_counter()
+                conn.execute(statement).all() if statement.is_select else conn.execute(statement)
+                samples.append((time.perf_counter() - started) * 1000)
+                conn.rollback()
+        results[label] = statistics.median(samples)
+    return results
+
+def query_plans(engine, statements):
+    plans = {}
+    with engine.connect() as conn:
+        for label, statement in statements.items():
+            sql = str(statement.compile(engine, compile_kwargs={"literal_binds": True}))
+            rows = conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")).all()
+            plans[label] = "; ".join(row[-1] for row in rows)
+    return plans
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workouts", type=int, default=1_000_000)
+    parser.add_argument("--exercises", type=int, default=500)
+    parser.add_argument("--links-per-workout", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        db.metadata.create_all(engine)
+
+        print(f"Populating {args.workouts:,} workouts and {args.workouts * args.links_per_workout:,} links...")
+        started = time.perf_counter()
+        with engine.begin() as conn:
+            generate(conn, args.workouts, args.exercises, args.links_per_workout)
+        for index in INDEXES:
+            index.drop(engine)
+        print(f"Populated in {time.perf_counter() - started:.1f}s\n")
+
+        statements = queries(args.exercises)
+        before, plans_before = time_queries(engine, statements, args.repeat), query_plans(engine, statements)
+
+        started = time.perf_counter()
+        for index in INDEXES:
+            index.create(engine)
+        with engine.begin() as conn:
+            conn.execute(text("ANALYZE"))
+        print(f"Created {', '.join(index.name for index in INDEXES)} in {time.perf_counter() - started:.1f}s\n")
+
+        after, plans_after = time_queries(engine, statements, args.repeat), query_plans(engine, statements)
+
+        print(f"{'query':<36}{'no index (ms)':>15}{'indexed (ms)':>15}{'speedup':>10}")
+        for label in statements:
+            print(f"{label:<36}{before[label]:>15.2f}{after[label]:>15.2f}{before[label] / after[label]:>9.0f}x")
+        print()
+        for label in statements:
+            print(f"{label}\n  before: {plans_before[label]}\n  after:  {plans_after[label]}")
+
+if __name__ == "__main__":
+    main()
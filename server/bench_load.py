@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Concurrent read load test against a running server
+Run with: python bench_load.py --url http://localhost:5555 [--concurrency 1,4,16] [--writers 1]
+
+Each concurrency level runs for --duration seconds with that many reader
+threads issuing GETs round-robin over --paths. With --writers, background
+threads POST workouts the whole time, which shows whether readers are
+blocked by the writer (rollback journal) or not (WAL).
+"""
+
+import argparse
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+def reader(url, paths, deadline, latencies, errors):
+    session = requests.Session()
+    i = 0
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            response = session.get(url + paths[i % len(paths)], timeout=30)
+            if response.status_code != 200:
+                errors.append(response.status_code)
+        except requests.RequestException as e:
+            errors.append(type(e).__name__)
+        latencies.append((time.perf_counter() - started) * 1000)
+        i += 1
+
+def writer(url, stop, written):
+    session = requests.Session()
+    while not stop.is_set():
+        response = session.post(f"{url}/workouts", json={"duration_minutes": 30, "notes": "load test"}, timeout=30)
+        if response.status_code == 201:
+            written.append(1)
+
+def percentile(values, pct):
+    return statistics.quantiles(values, n=100)[pct - 1] if len(values) > 1 else values[0]
+
+def run_level(url, paths, concurrency, duration, writers=0):
+    """Run `concurrency` readers (and `writers` writers) for `duration` seconds and summarise"""
+    latencies, errors, written = [], [], []
+    stop = threading.Event()
+    writer_threads = [threading.Thread(target=writer, args=(url, stop, written)) for _ in range(writers)]
+    for thread in writer_threads:
+        thread.start()
+
+    started = time.perf_counter()
+    deadline = started + duration
+    with ThreadPoolExecutor(concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(reader, url, paths, deadline, latencies, errors)
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    for thread in writer_threads:
+        thread.join()
+
+    return {
+        "rps": len(latencies) / elapsed,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "errors": len(errors),
+        "writes": len(written),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:5555")
+    parser.add_argument("--paths", default="/workouts,/exercises,/workouts/1,/exercises/1")
+    parser.add_argument("--concurrency", default="1,4,16,32")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--writers", type=int, default=0)
+    args = parser.parse_args()
+    paths = args.paths.split(",")
+
+    print(f"{'readers':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}{'writes':>8}")
+    for concurrency in (int(c) for c in args.concurrency.split(",")):
+        result = run_level(args.url, paths, concurrency, args.duration, args.writers)
+        print(f"{concurrency:>8}{result['rps']:>10.0f}{result['p50']:>10.1f}"
+              f"{result['p95']:>10.1f}{result['p99']:>10.1f}{result['errors']:>8}{result['writes']:>8}")
+
+if __name__ == "__main__":
+    main()
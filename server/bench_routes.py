@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Latency benchmark for every route in app.py at several data sizes
+Run with: python bench_routes.py [--sizes 1000,10000,100000] [--requests 50] [--output results.json]
+      or: python bench_routes.py --compare baseline.json --output results.json
+
+Each size gets a fresh throwaway SQLite database filled by seed.generate().
+Requests go through Flask's test client, so the numbers are application
+latency without network or WSGI server overhead. Results are written as JSON;
+--compare reports p50 regressions against an earlier run and exits non-zero
+if any route is slower than --threshold.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+# Keys are (method, url rule) exactly as registered in app.py. Each value builds
+# the i-th request as (url, json_body) from the run context, plus an optional
+# cap on requests for routes whose cost grows with the whole table.
+SCENARIOS = {
+    ('GET', '/workouts'): (lambda ctx, i: ('/workouts', None), None),
+    ('GET', '/workouts/export'): (lambda ctx, i: ('/workouts/export', None), 3),
+    ('GET', '/workouts/<int:id>'): (lambda ctx, i: (f'/workouts/{ctx.workout(i)}', None), None),
+    ('GET', '/workouts/<int:id>/suggestions'): (lambda ctx, i: (f'/workouts/{ctx.workout(i)}/suggestions', None), None),
+    ('GET', '/workouts/<int:id>/summary'): (lambda ctx, i: (f'/workouts/{ctx.workout(i)}/summary', None), None),
+    ('POST', '/workouts'): (lambda ctx, i: ('/workouts', {"duration_minutes": 45, "notes": "bench"}), None),
+    ('POST', '/workouts/bulk'): (lambda ctx, i: ('/workouts/bulk', [{"duration_minutes": 30}] * 100), None),
+    ('DELETE', '/workouts/<int:id>'): (lambda ctx, i: (f'/workouts/{ctx.size - i}', None), None),
+    ('GET', '/exercises'): (lambda ctx, i: ('/exercises', None), None),
+    ('GET', '/exercises/stats'): (lambda ctx, i: ('/exercises/stats', None), 5),
+    ('GET', '/stats/timeline'): (lambda ctx, i: ('/stats/timeline?bucket=day', None), 20),
+    ('GET', '/exercises/<int:id>/stats'): (lambda ctx, i: (f'/exercises/{ctx.exercise(i)}/stats', None), None),
+    ('GET', '/exercises/<int:id>/records'): (lambda ctx, i: (f'/exercises/{ctx.exercise(i)}/records', None), None),
+    ('GET', '/exercises/<int:id>'): (lambda ctx, i: (f'/exercises/{ctx.exercise(i)}', None), None),
+    ('POST', '/exercises'): (lambda ctx, i: ('/exercises', {"name": f"Bench {i}", "category": "cardio"}), None),
+    ('POST', '/exercises/bulk'): (
+        lambda ctx, i: ('/exercises/bulk', [{"name": f"Bench bulk {i}-{j}", "category": "strength"} for j in range(100)]),
+        None,
+    ),
+    ('DELETE', '/exercises/<int:id>'): (lambda ctx, i: (f'/exercises/{ctx.exercises - i}', None), None),
+    ('POST', '/workouts/<int:workout_id>/exercises/<int:exercise_id>/workout_exercises'): (
+        lambda ctx, i: (f'/workouts/{ctx.workout(i)}/exercises/{ctx.fresh_exercises[0]}/workout_exercises', {"reps": 10, "sets": 3}),
+        None,
+    ),
+    ('POST', '/workouts/<int:workout_id>/workout_exercises/bulk'): (
+        lambda ctx, i: (f'/workouts/{ctx.workout(i)}/workout_exercises/bulk',
+                        [{"exercise_id": e, "reps": 8, "sets": 3} for e in ctx.fresh_exercises[1:]]),
+        None,
+    ),
+    ('GET', '/workout_exercises/receipts/<receipt_id>'): (lambda ctx, i: ('/workout_exercises/receipts/unknown', None), None),
+    ('GET', '/search'): (lambda ctx, i: (f'/search?q=exercise+{ctx.exercise(i)}', None), None),
+    ('GET', '/sync'): (lambda ctx, i: ('/sync', None), 20),
+    ('POST', '/sync'): (
+        lambda ctx, i: ('/sync', {"mutations": [{"op": "update", "type": "workout", "id": ctx.workout(i), "data": {"notes": "synced"}}]},
+                        {'Idempotency-Key': f'bench-{i}'}),
+        None,
+    ),
+    ('GET', '/jobs/<job_id>'): (lambda ctx, i: ('/jobs/unknown', None), None),
+    ('GET', '/cache/stats'): (lambda ctx, i: ('/cache/stats', None), None),
+    ('GET', '/metrics'): (lambda ctx, i: ('/metrics', None), None),
+}
+
+# Reads first so writes and deletes don't change what the reads see
+METHOD_ORDER = {'GET': 0, 'POST': 1, 'DELETE': 2}
+
+class RunContext:
+    def __init__(self, size, exercises, fresh_exercises):
+        self.size = size
+        self.exercises = exercises
+        # Exercises with no links yet, so link-creating routes never hit duplicates
+        self.fresh_exercises = fresh_exercises
+
+    def workout(self, i):
+        # Spread reads over the id range; stay clear of the ids deleted at the top end
+        return 1 + (i * 7919) % (self.size // 2)
+
+    def exercise(self, i):
+        return 1 + (i * 31) % (self.exercises // 2)
+
+def percentiles(samples):
+    cuts = statistics.quantiles(samples, n=100) if len(samples) > 1 else [samples[0]] * 99
+    return {
+        "p50_ms": round(cuts[49], 3),
+        "p90_ms": round(cuts[89], 3),
+        "p99_ms": round(cuts[98], 3),
+        "mean_ms": round(statistics.fmean(samples), 3),
+        "max_ms": round(max(samples), 3),
+        "requests": len(samples),
+    }
+
+def route_keys(app):
+    keys = set()
+    for rule in app.url_map.iter_rules():
+        if rule.endpoint == 'static':
+            continue
+        for method in rule.methods - {'HEAD', 'OPTIONS'}:
+            keys.add((method, rule.rule))
+    return keys
+
+def run_size(app, size, requests, links_per_workout):
+    from sqlalchemy import insert
+    from models import db, Exercise
+    from seed import generate
+    from summaries import rebuild
+
+    exercises = max(50, size // 200)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        with db.engine.begin() as connection:
+            generate(connection, size, exercises, links_per_workout)
+            fresh = connection.execute(
+                insert(Exercise).returning(Exercise.id),
+                [{"name": f"Fresh {j}", "category": "strength", "equipment_needed": False} for j in range(21)],
+            ).scalars().all()
+        rebuild()
+        db.session.commit()
+        db.session.remove()
+
+    ctx = RunContext(size, exercises, fresh)
+    client = app.test_client()
+    results = {}
+    keys = sorted(route_keys(app) & SCENARIOS.keys(), key=lambda key: (METHOD_ORDER.get(key[0], 9), key[1]))
+    for method, rule in keys:
+        build, cap = SCENARIOS[method, rule]
+        samples, statuses = [], set()
+        for i in range(min(requests, cap or requests)):
+            # Scenarios may add request headers as a third item
+            url, body, *headers = build(ctx, i)
+            started = time.perf_counter()
+            response = client.open(url, method=method, json=body, headers=headers[0] if headers else None)
+            response.get_data()
+            samples.append((time.perf_counter() - started) * 1000)
+            statuses.add(response.status_code)
+        results[f"{method} {rule}"] = {**percentiles(samples), "status": sorted(statuses)}
+        print(f"  {method:<7}{rule:<72}{results[f'{method} {rule}']['p50_ms']:>9.2f} ms p50  {sorted(statuses)}")
+    return results
+
+def compare(previous, current, threshold):
+    """Print p50 changes and return the list of regressions beyond threshold"""
+    regressions = []
+    for size, routes in current["results"].items():
+        for route, stats in routes.items():
+            before = previous.get("results", {}).get(size, {}).get(route)
+            if not before:
+                continue
+            ratio = stats["p50_ms"] / before["p50_ms"] if before["p50_ms"] else 1.0
+            # Ignore sub-millisecond jitter
+            if ratio > 1 + threshold and stats["p50_ms"] - before["p50_ms"] > 1.0:
+                regressions.append((size, route, before["p50_ms"], stats["p50_ms"], ratio))
+    for size, route, before, after, ratio in regressions:
+        print(f"REGRESSION size={size} {route}: p50 {before:.2f} -> {after:.2f} ms ({ratio:.2f}x)")
+    return regressions
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,100000", help="comma-separated workout counts")
+    parser.add_argument("--requests", type=int, default=50, help="requests per route and size")
+    parser.add_argument("--links-per-workout", type=int, default=4)
+    parser.add_argument("--config", default="production", help="app config to benchmark")
+    parser.add_argument("--cache", action="store_true", help="leave the response cache on")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="earlier results file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed p50 slowdown (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    # Config reads DATABASE_URL at import time
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp.name, 'bench.db')}"
+    from app import create_app
+
+    app = create_app(args.config)
+    app.config["RESPONSE_CACHE_ENABLED"] = args.cache
+
+    missing = sorted(route_keys(app) - SCENARIOS.keys())
+    if missing:
+        print("No benchmark scenario for: " + ", ".join(f"{m} {r}" for m, r in missing))
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "config": args.config,
+            "cache": args.cache,
+            "requests": args.requests,
+            "links_per_workout": args.links_per_workout,
+        },
+        "results": {},
+    }
+    for size in (int(s) for s in args.sizes.split(",")):
+        print(f"\n{size:,} workouts")
+        report["results"][str(size)] = run_size(app, size, args.requests, args.links_per_workout)
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {args.output}")
+    tmp.cleanup()
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), report, args.threshold)
+        sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
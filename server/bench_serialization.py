@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: marshmallow schema dumps vs the precompiled fast list serializer
+Run with: python bench_serialization.py [--sizes 10000,100000] [--repeat 5]
+
+Both paths read the same rows from a throwaway SQLite database and produce
+the same bytes; the schema path is ORM load + workouts_schema.dump + jsonify
+encoding, the fast path is a Core select of column tuples + RowSerializer.
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="10000,100000")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    tmp = tempfile.TemporaryDirectory()
+    # Config reads DATABASE_URL at import time
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp.name, 'bench.db')}"
+    from sqlalchemy import insert, select
+    from app import create_app
+    from models import db, Workout
+    from schemas import WorkoutSchema, workouts_schema
+    from serializers import orjson, row_serializer
+
+    app = create_app("production")
+    print(f"orjson: {'yes' if orjson else 'no (stdlib json fallback)'}\n")
+    print(f"{'rows':>8}{'schema ms':>12}{'fast ms':>10}{'speedup':>9}{'identical':>11}")
+
+    with app.app_context():
+        db.create_all()
+        today = date.today()
+        inserted = 0
+        for size in sizes:
+            db.session.execute(insert(Workout), [
+                {"date": today - timedelta(days=i % 1000), "duration_minutes": 5 + i % 120, "notes": f"Workout notes {i}"}
+                for i in range(inserted, size)
+            ])
+            db.session.commit()
+            inserted = size
+            statement = select(Workout).order_by(Workout.date, Workout.id)
+            serializer = row_serializer(WorkoutSchema)
+            fast_statement = select(*serializer.columns).order_by(Workout.date, Workout.id)
+
+            def schema_path():
+                db.session.expunge_all()
+                workouts = db.session.scalars(statement).all()
+                return (app.json.dumps(workouts_schema.dump(workouts), separators=(",", ":")) + "\n").encode()
+
+            def fast_path():
+                return serializer.encode(db.session.execute(fast_statement).all())
+
+            timings = {}
+            for label, path in (("schema", schema_path), ("fast", fast_path)):
+                samples = []
+                for _ in range(args.repeat):
+                    started = time.perf_counter()
+                    body = path()
+                    samples.append((time.perf_counter() - started) * 1000)
+                timings[label] = (statistics.median(samples), body)
+
+            (schema_ms, schema_body), (fast_ms, fast_body) = timings["schema"], timings["fast"]
+            print(f"{size:>8}{schema_ms:>12.1f}{fast_ms:>10.1f}{schema_ms / fast_ms:>8.1f}x{str(schema_body == fast_body):>11}")
+
+    tmp.cleanup()
+
+if __name__ == "__main__":
+    main()
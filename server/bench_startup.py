@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Cold start benchmark: import app.py and build the app in fresh interpreters
+Run with: python bench_startup.py [--runs 20] [--config production] [--output startup.json]
+      or: python bench_startup.py --compare baseline.json --output startup.json
+
+Each run is a new `python -X importtime` process, the way a freshly forked
+worker starts. The report has the median and best time from the first
+import to a built app, and the modules app.py imports directly with their
+median cumulative import time. --compare exits non-zero if the median start
+is slower than --threshold, or if a worker imports a module that should load
+later (see DEFERRED).
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+
+from bench_routes import git_revision
+
+# Only `flask db` and the first suggestion need these; worker start must not import them
+DEFERRED = ('alembic', 'flask_migrate', 'numpy', 'scipy')
+
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+create_app({config!r})
+elapsed = (time.perf_counter() - started) * 1000
+deferred = sorted({{name.split('.')[0] for name in sys.modules}} & set({deferred!r}))
+print(json.dumps({{"ms": elapsed, "deferred": deferred}}))
+"""
+
+def parse_importtime(stderr):
+    """Cumulative microseconds of each module imported directly by app.py"""
+    children = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        # A module's imports are listed before it, indented two more spaces
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            children[name.strip()] = int(cumulative)
+        elif depth == 0:
+            if name.strip() == "app":
+                return children
+            children = {}
+    return children
+
+def run_once(config, env):
+    child = CHILD.format(config=config, deferred=DEFERRED)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", child], env=env,
+                            capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    return json.loads(result.stdout.strip().splitlines()[-1]), parse_importtime(result.stderr)
+
+def measure(runs, config, env):
+    times, deferred, modules = [], set(), {}
+    for _ in range(runs):
+        result, imports = run_once(config, env)
+        times.append(result["ms"])
+        deferred.update(result["deferred"])
+        for name, micros in imports.items():
+            modules.setdefault(name, []).append(micros / 1000)
+    top = sorted(((name, statistics.median(samples)) for name, samples in modules.items()),
+                 key=lambda item: item[1], reverse=True)
+    return {
+        "median_ms": round(statistics.median(times), 2),
+        "min_ms": round(min(times), 2),
+        "deferred_imported": sorted(deferred),
+        "imports_ms": {name: round(ms, 2) for name, ms in top},
+    }
+
+def compare(previous, current, threshold):
+    """Print the change in median start time and return the list of problems"""
+    problems = []
+    before, after = previous["results"]["median_ms"], current["results"]["median_ms"]
+    ratio = after / before if before else 1.0
+    print(f"median start {before:.1f} -> {after:.1f} ms ({ratio:.2f}x)")
+    # Ignore jitter of a few milliseconds
+    if ratio > 1 + threshold and after - before > 5.0:
+        problems.append(f"REGRESSION median start {before:.1f} -> {after:.1f} ms ({ratio:.2f}x)")
+    if current["results"]["deferred_imported"]:
+        problems.append("REGRESSION workers import " + ", ".join(current["results"]["deferred_imported"]))
+    for problem in problems:
+        print(problem)
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20, help="fresh interpreters to start")
+    parser.add_argument("--config", default="production", help="app config to build")
+    parser.add_argument("--top", type=int, default=10, help="slowest direct imports to print")
+    parser.add_argument("--output", default="startup_results.json")
+    parser.add_argument("--compare", help="earlier results file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed median slowdown (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    env = {**os.environ, "DATABASE_URL": f"sqlite:///{os.path.join(tmp.name, 'startup.db')}"}
+    results = measure(args.runs, args.config, env)
+    tmp.cleanup()
+
+    print(f"app import + create_app('{args.config}'): median {results['median_ms']:.1f} ms, "
+          f"best {results['min_ms']:.1f} ms over {args.runs} runs")
+    for name, ms in list(results["imports_ms"].items())[:args.top]:
+        print(f"  {name:<24}{ms:>9.1f} ms")
+    if results["deferred_imported"]:
+        print("Imported at worker start: " + ", ".join(results["deferred_imported"]))
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "config": args.config,
+            "runs": args.runs,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            problems = compare(json.load(f), report, args.threshold)
+        sys.exit(1 if problems else 0)
+
+if __name__ == "__main__":
+    main()
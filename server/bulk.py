@@ -0,0 +1,53 @@
+from flask import jsonify, request
+from marshmallow import ValidationError
+from sqlalchemy import insert
+
+from models import db
+
+MAX_BULK_ITEMS = 1000
+
+def bulk_items():
+    """Read the request body as a non-empty JSON array of at most MAX_BULK_ITEMS items"""
+    return check_bulk_items(request.get_json(silent=True))
+
+def check_bulk_items(items):
+    if not isinstance(items, list) or not items:
+        raise ValidationError({"_schema": ["Request body must be a non-empty JSON array."]})
+    if len(items) > MAX_BULK_ITEMS:
+        raise ValidationError({"_schema": [f"At most {MAX_BULK_ITEMS} items can be created per request."]})
+    return items
+
+def load_many(schema, items):
+    """Validate the whole array in one many=True load.
+
+    Returns ({index: row} for valid items, {index: messages} for invalid ones)
+    so callers can insert what passed and report what didn't.
+    """
+    try:
+        return dict(enumerate(schema.load(items))), {}
+    except ValidationError as e:
+        errors = e.messages
+        rows = {i: row for i, row in enumerate(e.valid_data) if i not in errors}
+        return rows, errors
+
+def reject(rows, errors, index, field, message):
+    """Move a row that failed a set-based check into the per-item errors"""
+    rows.pop(index, None)
+    errors.setdefault(index, {}).setdefault(field, []).append(message)
+
+def bulk_insert(model, rows, session=None):
+    """Insert all rows with a single executemany INSERT ... RETURNING; caller commits"""
+    rows = list(rows)
+    if not rows:
+        return []
+    statement = insert(model).returning(model, sort_by_parameter_order=True)
+    return (session or db.session).scalars(statement, rows).all()
+
+def bulk_status(created, errors):
+    # 201 when everything went in, 207 for a partial batch, 400 when nothing did
+    if not created:
+        return 400
+    return 207 if errors else 201
+
+def bulk_response(created, errors):
+    return jsonify({"created": created, "errors": errors}), bulk_status(created, errors)
@@ -0,0 +1,194 @@
+import hashlib
+import threading
+from abc import ABC, abstractmethod
+import time
+from collections import OrderedDict
+from functools import wraps
+from urllib.parse import urlencode
+
+from flask import Response, current_app, make_response, request
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+
+from models import db, CacheTag
+
+class CacheBackend(ABC):
+    """Storage interface for ResponseCache. Subclass it to plug in a shared store (e.g. Redis)"""
+
+    @abstractmethod
+    def get(self, key):
+        pass
+
+    @abstractmethod
+    def set(self, key, value, ttl=None):
+        pass
+
+    @abstractmethod
+    def incr(self, key):
+        """Atomically increment an integer counter and return the new value"""
+
+    @abstractmethod
+    def clear(self):
+        pass
+
+class MemoryBackend(CacheBackend):
+    """In-process LRU with per-entry TTL"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        # Counters live outside the LRU so eviction can never reset them
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def clear(self):
+        # Counters are kept so versions seeded after a clear are still newer than any old snapshot
+        with self._lock:
+            self._data.clear()
+
+class ResponseCache:
+    """Caches GET responses keyed by path and query string, with strong ETags.
+
+    Every entry records the versions of the tags it depends on (for example
+    'workouts' or 'workout:3'). Write handlers call invalidate() with the tags
+    they touched, which bumps those versions so dependent entries stop matching.
+    A tag version that has been evicted is re-seeded from a global clock, so
+    eviction can only cause a miss, never a stale hit.
+
+    Tag versions live in the backend, which is private to each process unless
+    a shared one is configured. With RESPONSE_CACHE_SHARED_TAGS they live in
+    the cache_tags table instead: a cached GET reads its tags' versions there
+    and invalidate() bumps them in one commit, so every worker process (and
+    `flask import-logs`) sees every other's writes while the responses
+    themselves stay in each worker's backend.
+    """
+
+    # Response headers worth replaying from the cache besides the body
+    REPLAY_HEADERS = ('X-Next-Cursor', 'Link')
+
+    def __init__(self, backend=None):
+        self.backend = backend or MemoryBackend()
+        self.ttl = 60
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.config.setdefault('RESPONSE_CACHE_ENABLED', True)
+        app.config.setdefault('RESPONSE_CACHE_TTL', 60)
+        app.config.setdefault('RESPONSE_CACHE_MAX_ENTRIES', 1024)
+        app.config.setdefault('RESPONSE_CACHE_BACKEND', None)
+        app.config.setdefault('RESPONSE_CACHE_SHARED_TAGS', False)
+        self.ttl = app.config['RESPONSE_CACHE_TTL']
+        self.backend = app.config['RESPONSE_CACHE_BACKEND'] or MemoryBackend(app.config['RESPONSE_CACHE_MAX_ENTRIES'])
+
+    def _tag_versions(self, tags):
+        if current_app.config.get('RESPONSE_CACHE_SHARED_TAGS'):
+            # A tag never invalidated has no row yet
+            rows = dict(db.session.execute(select(CacheTag.tag, CacheTag.version).where(CacheTag.tag.in_(tags))).all())
+            return tuple(rows.get(tag, 0) for tag in tags)
+        versions = []
+        for tag in tags:
+            version = self.backend.get(f'tag:{tag}')
+            if version is None:
+                version = self.backend.incr('clock')
+                self.backend.set(f'tag:{tag}', version)
+            versions.append(version)
+        return tuple(versions)
+
+    def invalidate(self, *tags):
+        """Make cached responses depending on any of `tags` stale. Call after committing the write"""
+        if current_app.config.get('RESPONSE_CACHE_SHARED_TAGS'):
+            if tags:
+                statement = insert(CacheTag).values([{'tag': tag, 'version': 1} for tag in tags])
+                db.session.execute(statement.on_conflict_do_update(
+                    index_elements=[CacheTag.tag], set_={'version': CacheTag.version + 1}))
+                db.session.commit()
+            return
+        for tag in tags:
+            self.backend.set(f'tag:{tag}', self.backend.incr('clock'))
+
+    def invalidate_many(self, prefix, ids, group, limit=100):
+        """Invalidate f'{prefix}:{id}' for each id, or the whole `group` tag once there are more than `limit`"""
+        ids = set(ids)
+        if len(ids) > limit:
+            self.invalidate(group)
+        else:
+            self.invalidate(*(f'{prefix}:{id}' for id in ids))
+
+    def clear(self):
+        self.backend.clear()
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+    def cached(self, tags):
+        """Decorator for GET views. `tags` maps the view's kwargs to the tags it depends on"""
+        def decorator(f):
+            @wraps(f)
+            def wrapper(*args, **kwargs):
+                enabled = current_app.config.get('RESPONSE_CACHE_ENABLED', True)
+                key = f"response:{request.path}?{urlencode(sorted(request.args.items(multi=True)))}"
+                # Snapshot versions before running the view so a concurrent write invalidates this entry
+                versions = self._tag_versions(tags(**kwargs)) if enabled else None
+
+                entry = self.backend.get(key) if enabled else None
+                if entry is not None and entry['versions'] == versions:
+                    self._count(hit=True)
+                    response = Response(entry['body'], status=entry['status'], mimetype=entry['mimetype'])
+                    response.headers.extend(entry['headers'])
+                    response.headers['X-Cache'] = 'HIT'
+                else:
+                    response = make_response(f(*args, **kwargs))
+                    if response.status_code != 200 or response.is_streamed:
+                        return response
+                    body = response.get_data()
+                    response.set_etag(hashlib.blake2b(body, digest_size=16).hexdigest())
+                    if enabled:
+                        self._count(hit=False)
+                        response.headers['X-Cache'] = 'MISS'
+                        self.backend.set(key, {
+                            'versions': versions,
+                            'body': body,
+                            'status': response.status_code,
+                            'mimetype': response.mimetype,
+                            'headers': [(name, response.headers[name])
+                                        for name in ('ETag',) + self.REPLAY_HEADERS if name in response.headers],
+                        }, self.ttl)
+                return response.make_conditional(request)
+            return wrapper
+        return decorator
+
+response_cache = ResponseCache()
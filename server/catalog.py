@@ -0,0 +1,99 @@
+from bisect import bisect_right
+
+from sqlalchemy import select
+from werkzeug.exceptions import NotFound
+
+from models import db, CatalogVersion, Exercise
+from pagination import decode_cursor, encode_cursor, parse_fields, parse_limit, projection_schema
+from serializers import row_serializer
+
+class CatalogExercise:
+    """One exercises row, without an ORM instance's state and __dict__"""
+    __slots__ = ('id', 'name', 'category', 'equipment_needed')
+
+    def __init__(self, id, name, category, equipment_needed):
+        self.id = id
+        self.name = name
+        self.category = category
+        self.equipment_needed = equipment_needed
+
+class Catalog:
+    """Every exercise as of one catalog_version, indexed by id, name and category. Never modified"""
+    __slots__ = ('version', 'by_id', 'by_name', 'by_category')
+
+    def __init__(self, version, exercises):
+        self.version = version
+        self.by_id = {exercise.id: exercise for exercise in exercises}
+        self.by_name = {exercise.name: exercise for exercise in exercises}
+        members = {None: exercises}
+        for exercise in exercises:
+            members.setdefault(exercise.category, []).append(exercise)
+        # category (None for all) -> (exercises, their ids), both in id order for bisecting cursors
+        self.by_category = {category: (rows, [exercise.id for exercise in rows]) for category, rows in members.items()}
+
+    def get_or_404(self, id):
+        exercise = self.by_id.get(id)
+        if exercise is None:
+            raise NotFound()
+        return exercise
+
+    def page(self, limit, cursor=None, category=None):
+        """One page in id order, like a keyset page on ('id',), plus the next cursor"""
+        rows, ids = self.by_category.get(category, ((), ()))
+        start = bisect_right(ids, decode_cursor(cursor, [Exercise.id])[0]) if cursor else 0
+        page = rows[start:start + limit]
+        return page, encode_cursor([page[-1].id]) if start + limit < len(rows) else None
+
+VERSION = select(CatalogVersion.version).where(CatalogVersion.id == 1)
+
+# Its version is never equal to a stored one, so the first current() loads
+EMPTY = Catalog(object(), [])
+
+class ExerciseCatalog:
+    """Process-local, read-through copy of the exercises table.
+
+    current() reads catalog_version, which triggers bump on every exercise
+    write, and reloads the whole table when it has moved. A process never
+    serves an exercise that another one changed or deleted, and the check
+    costs one single-row read instead of the query it replaces.
+    """
+
+    def __init__(self):
+        self.catalog = EMPTY
+
+    def current(self, session=None):
+        """The Catalog as of the database's catalog_version, reloading it if needed"""
+        session = session or db.session
+        # Read before the rows: a write in between only costs one more reload. Core on the
+        # session's connection, routed like any read of the table (see RoutingSession)
+        version = session.connection(bind_arguments={'clause': VERSION}).execute(VERSION).scalar()
+        catalog = self.catalog
+        if version != catalog.version:
+            rows = session.execute(select(Exercise.id, Exercise.name, Exercise.category,
+                                          Exercise.equipment_needed).order_by(Exercise.id))
+            # Swapped in whole, so readers never see half a reload. No lock: it would be held
+            # across the query, and two threads loading at once only repeat a few-ms read
+            catalog = self.catalog = Catalog(version, [CatalogExercise(*row) for row in rows])
+        return catalog
+
+def app_catalog(app):
+    """The app's ExerciseCatalog, created on first use"""
+    catalog = app.extensions.get('exercise_catalog')
+    if catalog is None:
+        catalog = app.extensions.setdefault('exercise_catalog', ExerciseCatalog())
+    return catalog
+
+def exercise_page(catalog, schema_cls, args, filters, fast=False):
+    """paginate(Exercise, ...) served from a Catalog: (items, next_cursor) for GET /exercises.
+
+    Items are pre-encoded JSON bytes on the fast path, else a list of dumped
+    dicts, byte for byte what the SQL keyset page would give.
+    """
+    limit, only = parse_limit(args), parse_fields(args, schema_cls)
+    category = filters.get('category')
+    exercises, next_cursor = catalog.page(limit, args.get('cursor'), category.lower() if category else None)
+    serializer = row_serializer(schema_cls, only) if fast else None
+    if serializer:
+        names = serializer.names
+        return serializer.encode([tuple(getattr(exercise, name) for name in names) for exercise in exercises]), next_cursor
+    return projection_schema(schema_cls, only).dump(exercises), next_cursor
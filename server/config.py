@@ -0,0 +1,67 @@
+import os
+
+class Config:
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///app.db')
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+    # PRAGMAs run on every new SQLite connection (see database.py). Foreign keys are
+    # enforced so inserts can rely on them instead of checking parents first
+    SQLITE_PRAGMAS = {'foreign_keys': 'ON'}
+    # Engine for the queries of GET requests (see database.py): a replica URL, 'readonly'
+    # for read-only connections to the primary SQLite file, or None to read from the primary
+    SQLALCHEMY_READ_URI = os.environ.get('DATABASE_READ_URL')
+    RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', '1') == '1'
+    # Keep response cache tag versions in the cache_tags table (see cache.py), so a write in one
+    # worker process or in `flask import-logs` invalidates every worker's cached responses
+    RESPONSE_CACHE_SHARED_TAGS = os.environ.get('RESPONSE_CACHE_SHARED_TAGS', '1') == '1'
+    # Encode list pages straight from column tuples (see serializers.py); output is byte-identical
+    FAST_LIST_SERIALIZATION = os.environ.get('FAST_LIST_SERIALIZATION', '0') == '1'
+    # Log statements slower than this (ms) with their EXPLAIN QUERY PLAN; None disables
+    SLOW_QUERY_THRESHOLD_MS = float(os.environ['SLOW_QUERY_THRESHOLD_MS']) if 'SLOW_QUERY_THRESHOLD_MS' in os.environ else None
+    # Directory where each worker process shares its metrics so /metrics sums them (see metrics.py);
+    # None reports only the process that answers. gunicorn.conf.py sets one for its workers
+    METRICS_DIR = os.environ.get('METRICS_DIR')
+    # POST .../workout_exercises?mode=async (see writebehind.py): links waiting at most, links per
+    # group commit, and how long the writer waits to fill a group
+    WRITE_BEHIND_MAX_PENDING = int(os.environ.get('WRITE_BEHIND_MAX_PENDING', 10000))
+    WRITE_BEHIND_BATCH_SIZE = int(os.environ.get('WRITE_BEHIND_BATCH_SIZE', 500))
+    WRITE_BEHIND_FLUSH_MS = float(os.environ.get('WRITE_BEHIND_FLUSH_MS', 20))
+
+class DevelopmentConfig(Config):
+    DEBUG = True
+
+class ProductionConfig(Config):
+    FAST_LIST_SERIALIZATION = os.environ.get('FAST_LIST_SERIALIZATION', '1') == '1'
+    # Reads get their own pool of read-only connections instead of queueing with writes
+    SQLALCHEMY_READ_URI = os.environ.get('DATABASE_READ_URL', 'readonly')
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': 30,
+        'pool_recycle': 3600,
+        'pool_pre_ping': True,
+    }
+    # WAL lets readers proceed while a writer holds the lock; NORMAL sync is safe under WAL
+    SQLITE_PRAGMAS = {
+        **Config.SQLITE_PRAGMAS,
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+        'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    }
+
+class TestingConfig(Config):
+    TESTING = True
+    # Never inherit DATABASE_URL: the test fixtures drop every table
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    SQLALCHEMY_READ_URI = None
+    RESPONSE_CACHE_ENABLED = True
+    # One process: the in-memory versions keep the query counts tests check unchanged
+    RESPONSE_CACHE_SHARED_TAGS = False
+    METRICS_DIR = None
+
+config = {
+    'development': DevelopmentConfig,
+    'production': ProductionConfig,
+    'testing': TestingConfig,
+}
@@ -0,0 +1,75 @@
+import os
+
+from flask import current_app, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.sql.dml import UpdateBase
+
+# Requests whose queries can go to the read engine
+READ_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS'})
+
+def apply_sqlite_pragmas(engine, pragmas):
+    """Run `PRAGMA name=value` for each pragma on every new connection to a SQLite engine"""
+    if not pragmas or engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+def read_engine_url(app, primary_url):
+    """URL of the read engine for SQLALCHEMY_READ_URI, or None when reads stay on the primary.
+
+    'readonly' opens the primary's SQLite file again as a read-only URI; any
+    other value is a replica URL, with relative SQLite paths in the instance
+    folder like the primary's.
+    """
+    setting = app.config['SQLALCHEMY_READ_URI']
+    if not setting:
+        return None
+    if setting == 'readonly':
+        if primary_url.get_backend_name() != 'sqlite' or primary_url.database in (None, '', ':memory:'):
+            # An in-memory database can't be opened a second time
+            return None
+        return primary_url.set(database=f'file:{primary_url.database}', query={'mode': 'ro', 'uri': 'true'})
+    url = make_url(setting)
+    if url.get_backend_name() == 'sqlite' and url.database and url.database != ':memory:' and not os.path.isabs(url.database):
+        url = url.set(database=os.path.join(app.instance_path, url.database))
+    return url
+
+def init_read_engine(app, primary):
+    """Create the engine RoutingSession sends GET requests to, if one is configured"""
+    url = read_engine_url(app, primary.url)
+    if url is None:
+        return None
+    engine = create_engine(url, **app.config['SQLALCHEMY_ENGINE_OPTIONS'])
+    # journal_mode is a property of the file, set by the primary; query_only refuses stray writes
+    pragmas = {name: value for name, value in app.config['SQLITE_PRAGMAS'].items() if name != 'journal_mode'}
+    apply_sqlite_pragmas(engine, {**pragmas, 'query_only': 'ON'})
+    app.extensions['read_engine'] = engine
+    return engine
+
+class RoutingSession(Session):
+    """Sends the queries of GET requests to the read engine and everything else to the primary.
+
+    The first write in a request (a flush, an INSERT/UPDATE/DELETE, or a raw
+    connection()) pins the session to the primary for the rest of the
+    request, so it reads its own writes. Flask-SQLAlchemy scopes the session
+    to the request, so the next request starts on the read engine again.
+    Requests without a read engine, and work outside a request (CLI
+    commands, background jobs), always use the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self.info.get('wrote'):
+            if self._flushing or isinstance(clause, UpdateBase) or (mapper is None and clause is None):
+                self.info['wrote'] = True
+            elif has_request_context() and request.method in READ_METHODS:
+                engine = current_app.extensions.get('read_engine')
+                if engine is not None:
+                    return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
@@ -0,0 +1,73 @@
+from datetime import timedelta
+
+from sqlalchemy import delete, func, select, update
+
+from models import db, SyncState, Tombstone, WorkoutExercise
+from jobs import jobs, utcnow
+from summaries import refresh_records, remove_links
+
+# Children removed per transaction by background deletes
+DELETE_BATCH_SIZE = 5000
+# Tombstones are kept this long for GET /sync; older sync tokens need a full resync
+TOMBSTONE_RETENTION = timedelta(days=30)
+
+def delete_links(column, value, session=None):
+    """Delete every workout_exercises row where column == value in one statement.
+
+    Returns the other side's ids (exercise ids for a workout, workout ids for an
+    exercise) so the caller can invalidate exactly what changed. Runs in the
+    caller's transaction; the caller commits. Workout summaries and exercise
+    records are kept in step.
+    """
+    session = session or db.session
+    stale_records = remove_links(column == value, session)
+    other = WorkoutExercise.exercise_id if column is WorkoutExercise.workout_id else WorkoutExercise.workout_id
+    statement = (
+        delete(WorkoutExercise)
+        .where(column == value)
+        .returning(other)
+        .execution_options(synchronize_session=False)
+    )
+    other_ids = session.scalars(statement).all()
+    refresh_records(stale_records, session)
+    return other_ids
+
+def delete_links_in_batches(column, value, job=None, batch_size=None, session=None):
+    """Delete matching workout_exercises rows batch_size at a time, committing each batch.
+
+    Keeps every transaction (and the time the SQLite writer lock is held)
+    bounded no matter how many links there are. Returns the total deleted.
+    """
+    session = session or db.session
+    batch_size = batch_size or DELETE_BATCH_SIZE
+    total = 0
+    while True:
+        batch = select(WorkoutExercise.id).where(column == value).order_by(WorkoutExercise.id).limit(batch_size)
+        stale_records = remove_links(WorkoutExercise.id.in_(batch), session)
+        result = session.execute(
+            delete(WorkoutExercise)
+            .where(WorkoutExercise.id.in_(batch))
+            .execution_options(synchronize_session=False)
+        )
+        refresh_records(stale_records, session)
+        total += result.rowcount
+        if job is not None:
+            # In the batch's own transaction, so the stored progress never runs ahead of the deletes
+            jobs.update(job, session, progress=total)
+        session.commit()
+        if result.rowcount < batch_size:
+            return total
+
+def delete_row(model, id, session=None):
+    session = session or db.session
+    session.execute(delete(model).where(model.id == id).execution_options(synchronize_session=False))
+    prune_tombstones(session)
+
+def prune_tombstones(session=None):
+    """Delete tombstones older than TOMBSTONE_RETENTION and move sync_state.pruned_seq past them; caller commits"""
+    session = session or db.session
+    horizon = session.scalar(select(func.max(Tombstone.seq)).where(Tombstone.deleted_at < utcnow() - TOMBSTONE_RETENTION))
+    if horizon is None:
+        return
+    session.execute(update(SyncState).where(SyncState.id == 1).values(pruned_seq=func.max(SyncState.pruned_seq, horizon)))
+    session.execute(delete(Tombstone).where(Tombstone.seq <= horizon))
@@ -0,0 +1,30 @@
+from sqlalchemy import select
+
+from models import Exercise, Workout, WorkoutExercise
+
+def workout_filter_clauses(filters):
+    """Turn loaded WorkoutFilterSchema data into WHERE clauses on workouts.
+
+    Exercise and category filters are IN-subqueries on workout_exercises so
+    they use ix_workout_exercises_exercise_id and never duplicate workouts.
+    """
+    clauses = []
+    if 'from_date' in filters:
+        clauses.append(Workout.date >= filters['from_date'])
+    if 'to_date' in filters:
+        clauses.append(Workout.date <= filters['to_date'])
+    if 'min_duration' in filters:
+        clauses.append(Workout.duration_minutes >= filters['min_duration'])
+    if 'max_duration' in filters:
+        clauses.append(Workout.duration_minutes <= filters['max_duration'])
+    if 'exercise_id' in filters:
+        clauses.append(Workout.id.in_(
+            select(WorkoutExercise.workout_id).where(WorkoutExercise.exercise_id == filters['exercise_id'])
+        ))
+    if 'category' in filters:
+        clauses.append(Workout.id.in_(
+            select(WorkoutExercise.workout_id)
+            .join(WorkoutExercise.exercise)
+            .where(Exercise.category == filters['category'].lower())
+        ))
+    return clauses
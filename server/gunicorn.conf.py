@@ -0,0 +1,32 @@
+# Gunicorn settings for the production profile; picked up automatically when
+# `gunicorn` is started from the server/ directory.
+import glob
+import multiprocessing
+import os
+import tempfile
+
+wsgi_app = 'production:app'
+bind = os.environ.get('BIND', '0.0.0.0:5555')
+
+# Processes give CPU parallelism for serialization; threads overlap SQLite I/O.
+# With WAL, readers in every worker run concurrently with the single writer.
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_class = 'gthread'
+
+# Don't preload: each worker must open its own SQLite connections after the fork
+preload_app = False
+max_requests = 10000
+max_requests_jitter = 1000
+timeout = 30
+keepalive = 5
+accesslog = '-'
+
+# Each worker writes its metrics here and /metrics sums them all (see metrics.py). Set in the
+# master before workers start, so every worker, including replacements, shares the directory
+os.environ.setdefault('METRICS_DIR', tempfile.mkdtemp(prefix='workout-metrics-'))
+
+def on_starting(server):
+    # Counters start from zero with the server; exited workers' files are kept until then
+    for path in glob.glob(os.path.join(os.environ['METRICS_DIR'], '*.json')):
+        os.remove(path)
@@ -0,0 +1,311 @@
+import csv
+import itertools
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import insert, select
+
+from models import db, Workout, WorkoutExercise
+from schemas import workout_exercises_bulk_schema, workouts_bulk_schema
+from bulk import load_many
+from cache import response_cache
+from catalog import app_catalog
+from links import DUPLICATE, METRICS, NO_METRICS
+from summaries import add_links
+
+WORKOUT_FIELDS = ('date', 'duration_minutes', 'notes')
+# Added to each rejected row or object; ignored on input, so a fixed side file can be imported again
+ERRORS = 'errors'
+REJECTED_WITH_WORKOUT = "Rejected with the rest of its workout"
+
+# Workouts per validation task, and workouts per transaction
+DEFAULT_CHUNK_SIZE = 2000
+DEFAULT_BATCH_SIZE = 10000
+# This process reads and inserts, so it leaves one CPU for that; on one CPU validation runs inline
+DEFAULT_WORKERS = max((os.cpu_count() or 1) - 1, 0)
+# Workout ids per add_links() call, well under SQLite's bound parameter limit
+FOLD_IDS = 5000
+
+class Record:
+    """One workout read from the input: its fields, its exercise rows, and what to write if rejected"""
+    __slots__ = ('workout', 'exercises', 'source', 'rows')
+
+    def __init__(self, workout, exercises, source, rows):
+        self.workout = workout
+        self.exercises = exercises
+        self.source = source
+        self.rows = rows
+
+def present(row, fields):
+    # Empty CSV cells are absent values, not empty strings
+    return {name: row[name] for name in fields if row.get(name) not in (None, '')}
+
+def read_csv(file):
+    """Records from a CSV of one row per exercise performed.
+
+    Adjacent rows with the same `workout` value are one workout, which takes
+    its date, duration_minutes and notes from its first row. Without a
+    `workout` column every row is a workout of its own. A row with no
+    `exercise` adds no exercise, so a workout can have none.
+    """
+    reader = csv.DictReader(file)
+    group = (lambda row: row['workout']) if 'workout' in (reader.fieldnames or ()) else (lambda row: object())
+    for _, rows in itertools.groupby(reader, key=group):
+        rows = list(rows)
+        exercises = [{'exercise': row.get('exercise'), **present(row, METRICS)} for row in rows if row.get('exercise')]
+        yield Record(present(rows[0], WORKOUT_FIELDS), exercises, rows, len(rows))
+
+def read_jsonl(file):
+    """Records from JSON Lines: one workout per line, with its rows under "exercises"
+
+    {"date": "2024-03-01", "duration_minutes": 45, "exercises": [{"exercise": "Squat", "reps": 5, "sets": 5}]}
+    """
+    for line in file:
+        if not line.strip():
+            continue
+        try:
+            source = json.loads(line)
+        except ValueError:
+            source = line.rstrip('\n')
+        if not isinstance(source, dict):
+            yield Record(source, [], source, 1)
+            continue
+        workout = {key: value for key, value in source.items() if key not in ('exercises', ERRORS)}
+        yield Record(workout, source.get('exercises', []), source, 1)
+
+READERS = {'csv': read_csv, 'jsonl': read_jsonl}
+
+def input_format(path):
+    return 'csv' if path.lower().endswith('.csv') else 'jsonl'
+
+# Validation runs in worker processes; each gets the name -> id map once, at start
+exercise_ids = {}
+
+def init_worker(names):
+    global exercise_ids
+    exercise_ids = names
+
+def validate_chunk(chunk):
+    """Check a list of (workout, exercises) with the bulk endpoints' rules.
+
+    Returns, per workout, (workout row, link rows) ready to insert or
+    (None, errors). A workout is rejected whole if any of its rows fails,
+    so it can be fixed and imported again without duplicates.
+    """
+    workouts, workout_errors = load_many(workouts_bulk_schema, [workout for workout, _ in chunk])
+
+    # Every exercise row of the chunk in one load, each resolved to an id first
+    links, owners, link_errors = [], [], {}
+    for index, (_, exercises) in enumerate(chunk):
+        if not isinstance(exercises, list):
+            link_errors[index] = {'_schema': ["Must be a list."]}
+            continue
+        seen = set()
+        for position, exercise in enumerate(exercises):
+            row = dict(exercise) if isinstance(exercise, dict) else {}
+            name = row.pop('exercise', None)
+            exercise_id = exercise_ids.get(name.strip()) if isinstance(name, str) else None
+            if exercise_id is None:
+                if not isinstance(exercise, dict):
+                    message = "Must be an object."
+                else:
+                    message = f"Unknown exercise {name!r}" if name else "Missing data for required field."
+                link_errors.setdefault(index, {}).setdefault(position, {'exercise': [message]})
+                continue
+            if exercise_id in seen:
+                link_errors.setdefault(index, {}).setdefault(position, {'exercise': [DUPLICATE]})
+                continue
+            seen.add(exercise_id)
+            if not any(row.get(name) for name in METRICS):
+                link_errors.setdefault(index, {}).setdefault(position, {'_schema': [NO_METRICS]})
+                continue
+            links.append({**row, 'exercise_id': exercise_id})
+            owners.append((index, position))
+    rows, errors = load_many(workout_exercises_bulk_schema, links)
+    for link_index, messages in errors.items():
+        index, position = owners[link_index]
+        link_errors.setdefault(index, {})[position] = messages
+
+    results = [[workout, []] for workout in (workouts.get(index) for index in range(len(chunk)))]
+    for link_index, row in rows.items():
+        # Same keys in every row, for one executemany
+        results[owners[link_index][0]][1].append({name: row.get(name) for name in ('exercise_id', *METRICS)})
+    for index, result in enumerate(results):
+        problems = {}
+        if index in workout_errors:
+            problems['workout'] = workout_errors[index]
+        if index in link_errors:
+            problems['exercises'] = link_errors[index]
+        if problems:
+            results[index] = (None, problems)
+        else:
+            workout = result[0]
+            results[index] = ({'date': workout.get('date') or date.today(), 'duration_minutes': workout['duration_minutes'],
+                               'notes': workout.get('notes')}, result[1])
+    return results
+
+class RejectWriter:
+    """Side file of rejected input, in the input's format, opened on the first rejection"""
+
+    def __init__(self, path, kind, fieldnames):
+        self.path, self.kind, self.fieldnames = path, kind, fieldnames
+        self.file = self.writer = None
+        self.count = 0
+
+    def write(self, record, errors):
+        if self.file is None:
+            self.file = open(self.path, 'w', newline='' if self.kind == 'csv' else None)
+            if self.kind == 'csv':
+                self.writer = csv.DictWriter(self.file, [*self.fieldnames, ERRORS], extrasaction='ignore')
+                self.writer.writeheader()
+        self.count += record.rows
+        if self.kind == 'jsonl':
+            source = record.source if isinstance(record.source, dict) else {'line': record.source}
+            self.file.write(json.dumps({**source, ERRORS: errors}, default=str) + '\n')
+            return
+        workout_errors = errors.get('workout', {})
+        exercise_errors = errors.get('exercises', {})
+        # Positions count the workout's rows that name an exercise
+        positions = itertools.count()
+        for row in record.source:
+            own = exercise_errors.get(next(positions), {}) if row.get('exercise') else {}
+            messages = {**workout_errors, **own} or {'_workout': [REJECTED_WITH_WORKOUT]}
+            self.writer.writerow({**row, ERRORS: json.dumps(messages)})
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+def insert_workouts(accepted, session=None):
+    """Insert (workout, links) pairs with two executemany INSERTs and fold them into the summaries; caller commits"""
+    session = session or db.session
+    connection = session.connection()
+    # Plain executemany: SQLite can only keep RETURNING in parameter order one row per
+    # statement. After the INSERT this transaction holds the write lock and rowids only
+    # grow, so the newest len(accepted) ids are these workouts, in order
+    connection.execute(insert(Workout), [workout for workout, _ in accepted])
+    workout_ids = connection.execute(
+        select(Workout.id).order_by(Workout.id.desc()).limit(len(accepted))
+    ).scalars().all()[::-1]
+    links = [{**link, 'workout_id': workout_id} for workout_id, (_, rows) in zip(workout_ids, accepted) for link in rows]
+    if links:
+        connection.execute(insert(WorkoutExercise), links)
+        for start in range(0, len(workout_ids), FOLD_IDS):
+            add_links(WorkoutExercise.workout_id.in_(workout_ids[start:start + FOLD_IDS]), session)
+    return len(workout_ids), len(links)
+
+def chunks(records, size):
+    while True:
+        chunk = list(itertools.islice(records, size))
+        if not chunk:
+            return
+        yield chunk
+
+def import_logs(file, kind, rejects, workers=DEFAULT_WORKERS, chunk_size=DEFAULT_CHUNK_SIZE,
+                batch_size=DEFAULT_BATCH_SIZE, report=None):
+    """Stream workouts from an open file into the database; returns the totals.
+
+    Records are read and validated chunk_size workouts at a time, on a pool
+    of worker processes (workers=0 validates in this process), with at most
+    two chunks per worker in flight. Valid workouts are inserted in input
+    order and committed every batch_size; rejected ones go to rejects. Memory
+    stays bounded whatever the file size. report(totals) is called after
+    every commit.
+    """
+    names = {name: exercise.id for name, exercise in app_catalog(current_app).current().by_name.items()}
+    records = READERS[kind](file)
+    # The CSV header is read with the first record; cells past it (key None) and old errors are dropped
+    first = next(records, None)
+    header = first.source[0] if kind == 'csv' and first else ()
+    fieldnames = [name for name in header if name not in (None, ERRORS)]
+    rejected = RejectWriter(rejects, kind, fieldnames)
+    totals = {'rows': 0, 'workouts': 0, 'exercises': 0, 'rejected': 0, 'seconds': 0.0}
+    started = time.perf_counter()
+    pending = []
+
+    def flush():
+        if pending:
+            workouts, links = insert_workouts(pending)
+            db.session.commit()
+            # Bumped in cache_tags, so running servers stop serving pre-import responses (see cache.py)
+            response_cache.invalidate('workouts', 'stats', 'workout-details', 'exercise-details')
+            totals['workouts'] += workouts
+            totals['exercises'] += links
+            pending.clear()
+        totals['rejected'] = rejected.count
+        totals['seconds'] = time.perf_counter() - started
+        if report:
+            report(dict(totals))
+
+    def collect(chunk, results):
+        for record, (row, problems) in zip(chunk, results):
+            totals['rows'] += record.rows
+            if row is None:
+                rejected.write(record, problems)
+            else:
+                pending.append((row, problems))
+        if len(pending) >= batch_size:
+            flush()
+
+    source = chunks(itertools.chain([first] if first else [], records), chunk_size)
+    try:
+        if not workers:
+            init_worker(names)
+            for chunk in source:
+                collect(chunk, validate_chunk([(record.workout, record.exercises) for record in chunk]))
+        else:
+            # spawn: workers start clean instead of inheriting this process's open database connections
+            with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'),
+                                     initializer=init_worker, initargs=(names,)) as pool:
+                in_flight = deque()
+                for chunk in source:
+                    in_flight.append((chunk, pool.submit(validate_chunk, [(r.workout, r.exercises) for r in chunk])))
+                    if len(in_flight) >= 2 * workers:
+                        collect(*wait_oldest(in_flight))
+                while in_flight:
+                    collect(*wait_oldest(in_flight))
+        flush()
+    finally:
+        rejected.close()
+    return totals
+
+def wait_oldest(in_flight):
+    chunk, future = in_flight.popleft()
+    return chunk, future.result()
+
+def rate(totals):
+    return totals['rows'] / totals['seconds'] if totals['seconds'] else 0.0
+
+@click.command('import-logs')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'kind', type=click.Choice(sorted(READERS)),
+              help='Input format; by default csv for *.csv files, else JSON Lines.')
+@click.option('--rejects', type=click.Path(dir_okay=False),
+              help='Side file for rejected rows, with an "errors" field (default: PATH.rejected.csv/.jsonl).')
+@click.option('--workers', type=int, default=DEFAULT_WORKERS, show_default=True,
+              help='Validation processes; 0 validates in this process.')
+@click.option('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, show_default=True, help='Workouts per validation task.')
+@click.option('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, show_default=True, help='Workouts per transaction.')
+@with_appcontext
+def import_logs_command(path, kind, rejects, workers, chunk_size, batch_size):
+    """Import workouts and their exercises from a CSV or JSON Lines training log."""
+    kind = kind or input_format(path)
+    rejects = rejects or f"{os.path.splitext(path)[0]}.rejected.{kind}"
+
+    def report(totals):
+        click.echo(f"{totals['rows']:,} rows: {totals['workouts']:,} workouts, {totals['exercises']:,} exercises, "
+                   f"{totals['rejected']:,} rows rejected ({rate(totals):,.0f} rows/s)")
+
+    with open(path, newline='' if kind == 'csv' else None, encoding='utf-8') as file:
+        totals = import_logs(file, kind, rejects, workers, chunk_size, batch_size, report)
+    click.echo(f"Imported {totals['workouts']:,} workouts in {totals['seconds']:.1f}s ({rate(totals):,.0f} rows/s)")
+    if totals['rejected']:
+        click.echo(f"Wrote {totals['rejected']:,} rejected rows to {rejects}")
@@ -0,0 +1,121 @@
+import os
+import socket
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app
+from sqlalchemy import delete, insert, select, update
+
+from models import db, Job
+
+ACTIVE = ('queued', 'running')
+# Finished jobs are kept this long for polling, then pruned when a new job is created
+JOB_RETENTION = timedelta(days=7)
+INTERRUPTED = "Interrupted: the process running the job exited. Repeat the request to finish it."
+
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def process_owner():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def owner_exited(owner):
+    """Whether the process that ran a job is gone; only known for processes on this host"""
+    host, _, pid = owner.rpartition(':')
+    if host != socket.gethostname() or int(pid) == os.getpid():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
+
+class JobRegistry:
+    """Runs background jobs on a small thread pool; their status lives in the jobs table.
+
+    Any worker process can answer GET /jobs/<id>, and a job whose process
+    exited before finishing it (a worker recycled or killed mid-purge) is
+    reported as failed instead of running forever. Jobs run inside an app
+    context of the app that submitted them.
+    """
+
+    def __init__(self, max_workers=1):
+        # One worker by default: background deletes shouldn't compete with each other for the writer lock
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def create(self, kind, session=None):
+        """Store a queued job and commit it, for callers that run it themselves"""
+        session = session or db.session
+        now = utcnow()
+        session.execute(delete(Job).where(Job.status.notin_(ACTIVE), Job.updated_at < now - JOB_RETENTION))
+        job = {"id": uuid.uuid4().hex, "type": kind, "status": "queued", "progress": 0, "error": None}
+        session.execute(insert(Job).values(**job, owner=process_owner(), updated_at=now))
+        session.commit()
+        return job
+
+    def update(self, job, session=None, **changes):
+        """Apply changes to job and its row. The caller commits, so progress can share a batch's transaction"""
+        job.update(changes)
+        (session or db.session).execute(
+            update(Job).where(Job.id == job["id"]).values(**changes, owner=process_owner(), updated_at=utcnow())
+        )
+
+    def start(self, job, session=None):
+        session = session or db.session
+        self.update(job, session, status="running")
+        session.commit()
+
+    def finish(self, job, session=None, error=None):
+        session = session or db.session
+        if error is None:
+            self.update(job, session, status="done")
+        else:
+            # The job's own work is rolled back to its last committed batch first
+            session.rollback()
+            self.update(job, session, status="failed", error=str(error))
+        session.commit()
+
+    def submit(self, kind, fn, *args):
+        """Queue fn(job, *args); fn may record progress with update()"""
+        app = current_app._get_current_object()
+        job = self.create(kind)
+        with self._lock:
+            self._futures[job["id"]] = self._executor.submit(self._run, app, job, fn, args)
+        return dict(job)
+
+    def _run(self, app, job, fn, args):
+        with app.app_context():
+            self.start(job)
+            try:
+                fn(job, *args)
+            except Exception as e:
+                self.finish(job, error=e)
+            else:
+                self.finish(job)
+        with self._lock:
+            self._futures.pop(job["id"], None)
+
+    def get(self, job_id, session=None):
+        columns = [Job.id, Job.type, Job.status, Job.progress, Job.error]
+        row = (session or db.session).execute(select(*columns, Job.owner).where(Job.id == job_id)).first()
+        if row is None:
+            return None
+        job = {column.key: getattr(row, column.key) for column in columns}
+        if job["status"] in ACTIVE and owner_exited(row.owner):
+            job.update(status="failed", error=INTERRUPTED)
+        return job
+
+    def wait(self, job_id, timeout=None):
+        """Block until a job this process runs finishes (used by tests and shutdown hooks)"""
+        future = self._futures.get(job_id)
+        if future is not None:
+            future.result(timeout)
+        return self.get(job_id)
+
+jobs = JobRegistry()
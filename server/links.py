@@ -0,0 +1,135 @@
+from functools import lru_cache
+
+from marshmallow import ValidationError, fields
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from werkzeug.exceptions import NotFound
+
+from models import db, Exercise, Workout, WorkoutExercise
+from schemas import workout_exercise_metrics_schema
+from summaries import add_link
+
+METRICS = ('reps', 'sets', 'duration_seconds')
+DUPLICATE = "Exercise already added to this workout"
+NO_METRICS = "At least one of reps, sets, or duration_seconds must be provided"
+
+# Run on the session's connection: the ORM's bulk INSERT handling only adds overhead for one row
+INSERT_LINK = insert(WorkoutExercise).returning(WorkoutExercise.id)
+
+class LinkLoader:
+    """Precompiled loader for the body of POST .../workout_exercises.
+
+    Accepts and rejects exactly what workout_exercise_metrics_schema.load()
+    does, with the same messages, but without marshmallow's per-call field
+    dispatch (or marshmallow-sqlalchemy's per-load package metadata lookup).
+    The rules and messages are read from the schema once, here.
+    """
+
+    def __init__(self, schema):
+        self.fields = dict(schema.load_fields)
+        for name, field in self.fields.items():
+            if type(field) is not fields.Integer or field.validators:
+                raise ValueError(f"{name} is not a plain Integer field; load it with the schema instead")
+        self.validate = schema.validate_positive_numbers
+        self.invalid_type = schema.error_messages['type']
+        self.unknown = schema.error_messages['unknown']
+
+    def load(self, data):
+        """Return the row to insert; raise ValidationError like schema.load() would"""
+        if not isinstance(data, dict):
+            raise ValidationError({'_schema': [self.invalid_type]})
+        row, errors = {}, {}
+        for key, value in data.items():
+            field = self.fields.get(key)
+            if field is None:
+                errors[key] = [self.unknown]
+                continue
+            if value is None:
+                if field.allow_none:
+                    row[key] = None
+                else:
+                    errors[key] = [field.error_messages['null']]
+                continue
+            # Same coercion as fields.Integer(strict=False): int(value), but never a bool
+            try:
+                if value is True or value is False:
+                    raise ValueError
+                value = int(value)
+            except (TypeError, ValueError):
+                errors[key] = [field.error_messages['invalid']]
+                continue
+            except OverflowError:
+                errors[key] = [field.error_messages['too_large']]
+                continue
+            try:
+                self.validate(value)
+            except ValidationError as e:
+                errors[key] = e.messages
+                continue
+            row[key] = value
+        if errors:
+            raise ValidationError(errors)
+        return row
+
+@lru_cache(maxsize=None)
+def link_loader():
+    # Built on the first link rather than at import, like the schema it reads
+    return LinkLoader(workout_exercise_metrics_schema)
+
+def load_link(data):
+    """Validate a link body without a database round-trip or an ORM instance.
+
+    Returns (row, None), or (None, (body, 400)) with the response the old
+    per-step checks gave.
+    """
+    if isinstance(data, dict):
+        # The ids in the URL win over any in the body
+        data = {key: value for key, value in data.items() if key not in ('workout_id', 'exercise_id')}
+        if not any(data.get(name) for name in METRICS):
+            return None, ({"error": NO_METRICS}, 400)
+    try:
+        return link_loader().load(data), None
+    except ValidationError as e:
+        return None, ({"errors": e.messages}, 400)
+
+def create_link(workout_id, exercise_id, row, session=None):
+    """Insert one link with a single INSERT ... RETURNING and fold it into the summaries.
+
+    The foreign keys and unique_workout_exercise do the existence and
+    duplicate checks. Returns (link, None), or (None, conflict) after rolling
+    back when one of them fails. The caller commits.
+    """
+    session = session or db.session
+    values = {**row, 'workout_id': workout_id, 'exercise_id': exercise_id}
+    try:
+        link_id = session.connection().execute(INSERT_LINK, values).scalar_one()
+    except IntegrityError as e:
+        session.rollback()
+        conflict = integrity_conflict(e)
+        if conflict is None:
+            raise
+        return None, conflict
+    add_link(link_id, session)
+    return {'id': link_id, **dict.fromkeys(METRICS), **values}, None
+
+def integrity_conflict(error):
+    """'missing' for a foreign key failure, 'duplicate' for unique_workout_exercise, else None"""
+    message = str(error.orig).lower()
+    if 'foreign key' in message:
+        return 'missing'
+    if 'unique' in message:
+        return 'duplicate'
+    return None
+
+def link_conflict(workout_id, exercise_id, session=None):
+    """The conflict an INSERT would hit, found with SELECTs; only used on the error path"""
+    session = session or db.session
+    if session.get(Workout, workout_id) is None or session.get(Exercise, exercise_id) is None:
+        return 'missing'
+    duplicate = session.scalar(select(WorkoutExercise.id).filter_by(workout_id=workout_id, exercise_id=exercise_id))
+    return 'duplicate' if duplicate else None
+
+def conflict_response(conflict):
+    if conflict == 'missing':
+        raise NotFound()
+    return {"error": DUPLICATE}, 400
@@ -0,0 +1,256 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+log = logging.getLogger(__name__)
+slow_query_log = logging.getLogger('slow_query')
+
+# Latency histogram bucket upper bounds, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# How often a worker writes its totals to METRICS_DIR when they changed, in seconds
+FLUSH_INTERVAL = 1.0
+
+class Metrics:
+    """Per-request timing, SQL and serialization instrumentation.
+
+    Every request gets a latency observation labelled by method, route rule
+    and status, plus counters for the SQL statements it ran and the time
+    spent in marshmallow dumps. The totals are rendered as Prometheus text
+    by render() and summarised per response in a Server-Timing header.
+
+    The totals live in each worker process. With METRICS_DIR set, every
+    worker also writes them to its own file there (every FLUSH_INTERVAL
+    while they change, and on exit) and render() sums all the files, so
+    /metrics covers every worker whichever one answers it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.metrics_dir = None
+        self.counters = None
+        self._flusher = None
+        self._written = None
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.buckets = defaultdict(lambda: [0] * (len(BUCKETS) + 1))
+            self.latency_sum = defaultdict(float)
+            self.requests = defaultdict(int)
+            self.queries = defaultdict(int)
+            self.sql_seconds = defaultdict(float)
+            self.serialize_seconds = defaultdict(float)
+
+    def init_app(self, app, db, counters=None):
+        """`counters` returns (name, help, value) for plain counters reported next to the route metrics"""
+        app.config.setdefault('SLOW_QUERY_THRESHOLD_MS', None)
+        app.config.setdefault('SLOW_QUERY_EXPLAIN', True)
+        app.config.setdefault('METRICS_DIR', None)
+        self.slow_query_threshold = app.config['SLOW_QUERY_THRESHOLD_MS']
+        self.slow_query_explain = app.config['SLOW_QUERY_EXPLAIN']
+        self.counters = counters
+        self.set_metrics_dir(app.config['METRICS_DIR'])
+
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        with app.app_context():
+            engines = [*db.engines.values(), app.extensions.get('read_engine')]
+            for engine in filter(None, engines):
+                event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+                event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def _start_request(self):
+        g.metrics = {'start': time.perf_counter(), 'queries': 0, 'sql': 0.0, 'serialize': 0.0, 'dump_depth': 0}
+
+    def _finish_request(self, response):
+        timing = g.get('metrics')
+        if timing is None:
+            return response
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        key = (request.method, route, str(response.status_code))
+        if response.is_streamed:
+            # The body runs after this hook (GET /workouts/export): g.metrics stays in place to
+            # count its queries and dumps, and the request is recorded once the body is closed
+            response.call_on_close(lambda: self._record(key, timing))
+        else:
+            g.pop('metrics')
+            self._record(key, timing)
+
+        # A streamed body has not run yet, so its header covers the work before the first byte
+        response.headers['Server-Timing'] = (
+            f'app;dur={(time.perf_counter() - timing["start"]) * 1000:.2f}, '
+            f'db;dur={timing["sql"] * 1000:.2f};desc="{timing["queries"]} queries", '
+            f'serialize;dur={timing["serialize"] * 1000:.2f}'
+        )
+        return response
+
+    def _record(self, key, timing):
+        elapsed = time.perf_counter() - timing['start']
+        with self._lock:
+            buckets = self.buckets[key]
+            for i, bound in enumerate(BUCKETS):
+                if elapsed <= bound:
+                    buckets[i] += 1
+            buckets[-1] += 1
+            self.latency_sum[key] += elapsed
+            self.requests[key] += 1
+            self.queries[key[:2]] += timing['queries']
+            self.sql_seconds[key[:2]] += timing['sql']
+            self.serialize_seconds[key[:2]] += timing['serialize']
+        if self.metrics_dir is not None and self._flusher is None:
+            # Started on the first request, so it runs in the worker process that serves it
+            self._flusher = threading.Thread(target=self._flush_periodically, name='metrics-flush', daemon=True)
+            self._flusher.start()
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_start'].pop()
+        if has_request_context() and 'metrics' in g:
+            g.metrics['queries'] += 1
+            g.metrics['sql'] += elapsed
+        if self.slow_query_threshold is not None and elapsed * 1000 >= self.slow_query_threshold:
+            self._log_slow_query(conn, statement, parameters, executemany, elapsed)
+
+    def _log_slow_query(self, conn, statement, parameters, executemany, elapsed):
+        plan = ''
+        if self.slow_query_explain and not executemany and conn.dialect.name == 'sqlite':
+            try:
+                explain = conn.connection.dbapi_connection.cursor()
+                explain.execute(f'EXPLAIN QUERY PLAN {statement}', parameters)
+                plan = '\n  plan: ' + '; '.join(row[-1] for row in explain.fetchall())
+                explain.close()
+            except Exception as e:
+                plan = f'\n  plan unavailable: {e}'
+        route = request.path if has_request_context() else '-'
+        slow_query_log.warning('%.1fms %s\n  %s\n  params: %r%s', elapsed * 1000, route, statement, parameters, plan)
+
+    @contextmanager
+    def serialization(self):
+        """Time a marshmallow dump; nested dumps are counted once, by the outermost one"""
+        timing = g.get('metrics') if has_request_context() else None
+        if timing is None:
+            yield
+            return
+        timing['dump_depth'] += 1
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            timing['dump_depth'] -= 1
+            if timing['dump_depth'] == 0:
+                timing['serialize'] += time.perf_counter() - started
+
+    def set_metrics_dir(self, path):
+        """Share this process's totals through a file in `path`; None keeps them in memory only"""
+        self.metrics_dir = path
+        self._written = None
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+            # Unique per process even when a pid is reused, so a restarted worker never overwrites an exited one's totals
+            self._path = os.path.join(path, f'{os.getpid()}-{uuid.uuid4().hex[:8]}.json')
+
+    def snapshot(self):
+        """This process's totals as JSON-ready lists"""
+        with self._lock:
+            state = {
+                'requests': [[*key, buckets, self.latency_sum[key], self.requests[key]]
+                             for key, buckets in self.buckets.items()],
+                'routes': [[*key, self.queries[key], self.sql_seconds[key], self.serialize_seconds[key]]
+                           for key in self.queries],
+            }
+        state['counters'] = [list(counter) for counter in self.counters()] if self.counters else []
+        return state
+
+    def flush(self):
+        """Write this process's totals to its file in METRICS_DIR, unless they are already there"""
+        if self.metrics_dir is None:
+            return
+        state = json.dumps(self.snapshot())
+        if state == self._written:
+            return
+        tmp = f'{self._path}.{threading.get_ident()}.tmp'
+        with open(tmp, 'w') as f:
+            f.write(state)
+        os.replace(tmp, self._path)
+        self._written = state
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except Exception:
+                # A full disk or removed directory must not stop later flushes
+                log.exception('Could not write metrics to %s', self.metrics_dir)
+
+    def collect(self):
+        """Totals of every process sharing METRICS_DIR, exited ones included, or of this one alone"""
+        if self.metrics_dir is None:
+            return [self.snapshot()]
+        self.flush()
+        states = []
+        for name in os.listdir(self.metrics_dir):
+            if name.endswith('.json'):
+                try:
+                    with open(os.path.join(self.metrics_dir, name)) as f:
+                        states.append(json.load(f))
+                except (OSError, ValueError):
+                    # Removed since listing it, or not ours
+                    continue
+        return states
+
+    def render(self):
+        """Prometheus text exposition format"""
+        buckets = defaultdict(lambda: [0] * (len(BUCKETS) + 1))
+        latency_sum, requests = defaultdict(float), defaultdict(int)
+        routes = defaultdict(lambda: [0, 0.0, 0.0])
+        counters = {}
+        for state in self.collect():
+            for method, route, status, counts, total, count in state['requests']:
+                key = (method, route, status)
+                buckets[key] = [a + b for a, b in zip(buckets[key], counts)]
+                latency_sum[key] += total
+                requests[key] += count
+            for method, route, *values in state['routes']:
+                routes[method, route] = [a + b for a, b in zip(routes[method, route], values)]
+            for name, help_text, value in state['counters']:
+                counters[name] = (help_text, counters.get(name, (None, 0))[1] + value)
+
+        lines = [
+            '# HELP http_request_duration_seconds Request latency by route',
+            '# TYPE http_request_duration_seconds histogram',
+        ]
+        for (method, route, status), counts in sorted(buckets.items()):
+            labels = f'method="{method}",route="{route}",status="{status}"'
+            for bound, count in zip(BUCKETS + ('+Inf',), counts):
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'http_request_duration_seconds_sum{{{labels}}} {latency_sum[method, route, status]}')
+            lines.append(f'http_request_duration_seconds_count{{{labels}}} {requests[method, route, status]}')
+
+        for i, (name, help_text) in enumerate((
+            ('db_queries_total', 'SQL statements executed by route'),
+            ('db_query_duration_seconds_total', 'Time spent executing SQL by route'),
+            ('serialization_duration_seconds_total', 'Time spent in marshmallow dumps by route'),
+        )):
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+            for (method, route), values in sorted(routes.items()):
+                lines.append(f'{name}{{method="{method}",route="{route}"}} {values[i]}')
+
+        for name, (help_text, value) in counters.items():
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter', f'{name} {value}']
+        return '\n'.join(lines) + '\n'
+
+metrics = Metrics()
+# The last totals must reach METRICS_DIR when a worker exits
+atexit.register(metrics.flush)
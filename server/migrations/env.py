@@ -5,6 +5,8 @@ from flask import current_app
 
 from alembic import context
 
+from models import SEARCH_INDEXES
+
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 config = context.config
@@ -45,6 +47,17 @@ target_db = current_app.extensions['migrate'].db
 # ... etc.
 
 
+# FTS5 indexes and the shadow tables SQLite keeps for them are created with raw SQL
+# (see SEARCH_INDEXES in models.py), so autogenerate must not try to drop them
+FTS_SHADOW_SUFFIXES = ('', '_data', '_idx', '_docsize', '_config', '_content')
+
+
+def include_name(name, type_, parent_names):
+    if type_ == 'table':
+        return not any(name == index + suffix for index in SEARCH_INDEXES for suffix in FTS_SHADOW_SUFFIXES)
+    return True
+
+
 def get_metadata():
     if hasattr(target_db, 'metadatas'):
         return target_db.metadatas[None]
@@ -65,7 +78,8 @@ def run_migrations_offline():
     """
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
-        url=url, target_metadata=get_metadata(), literal_binds=True
+        url=url, target_metadata=get_metadata(), literal_binds=True,
+        include_name=include_name
     )
 
     with context.begin_transaction():
@@ -97,9 +111,15 @@ def run_migrations_online():
     connectable = get_engine()
 
     with connectable.connect() as connection:
+        if connection.dialect.name == 'sqlite':
+            # The app enforces foreign keys on every connection, but batch migrations
+            # rebuild tables by dropping and re-creating them, which that would reject
+            connection.exec_driver_sql('PRAGMA foreign_keys=OFF')
+            connection.commit()
         context.configure(
             connection=connection,
             target_metadata=get_metadata(),
+            include_name=include_name,
             **conf_args
         )
 
@@ -0,0 +1,118 @@
+"""add daily calendar rollups for the timeline
+
+Revision ID: 3c9e1d7a5b42
+Revises: 5faf431bcbba
+Create Date: 2026-10-17 16:41:09.532871
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c9e1d7a5b42'
+down_revision = '5faf431bcbba'
+branch_labels = None
+depends_on = None
+
+# daily_category_volume column -> value of one workout_exercises row; see rollup_trigger_ddl in models.py
+VOLUME = {
+    'exercise_count': '1',
+    'total_sets': 'coalesce({link}.sets, 0)',
+    'total_reps': 'coalesce({link}.reps, 0)',
+    'total_volume': 'coalesce({link}.reps * {link}.sets, 0)',
+    'total_duration_seconds': 'coalesce({link}.duration_seconds, 0)',
+}
+
+TRIGGERS = ['workouts_rollup_insert', 'workouts_rollup_delete', 'workouts_rollup_update', 'workouts_rollup_move',
+            'workout_exercises_rollup_insert', 'workout_exercises_rollup_delete', 'workout_exercises_rollup_update',
+            'exercises_rollup_move']
+
+
+def volume(link, day, category, source, where):
+    totals = ', '.join(f"sum({value.format(link=link)}) AS {name}" for name, value in VOLUME.items())
+    return (f"SELECT {day} AS day, {category} AS category, {totals} FROM {source} "
+            f"WHERE {where} AND {day} IS NOT NULL GROUP BY 1, 2")
+
+
+def add_volume(rows):
+    updates = ', '.join(f"{name} = {name} + excluded.{name}" for name in VOLUME)
+    return (f"INSERT INTO daily_category_volume (day, category, {', '.join(VOLUME)}) {rows} "
+            f"ON CONFLICT (day, category) DO UPDATE SET {updates};")
+
+
+def subtract_volume(rows):
+    updates = ', '.join(f"{name} = daily_category_volume.{name} - s.{name}" for name in VOLUME)
+    return (f"UPDATE daily_category_volume SET {updates} FROM ({rows}) AS s "
+            f"WHERE daily_category_volume.day = s.day AND daily_category_volume.category = s.category; "
+            f"DELETE FROM daily_category_volume WHERE exercise_count <= 0 "
+            f"AND (day, category) IN (SELECT day, category FROM ({rows}));")
+
+
+def upgrade():
+    op.create_table('daily_workout_totals',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('workout_count', sa.Integer(), nullable=False),
+    sa.Column('duration_minutes', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('day')
+    )
+    op.create_table('daily_category_volume',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('category', sa.String(length=50), nullable=False),
+    sa.Column('exercise_count', sa.Integer(), nullable=False),
+    sa.Column('total_sets', sa.Integer(), nullable=False),
+    sa.Column('total_reps', sa.Integer(), nullable=False),
+    sa.Column('total_volume', sa.Integer(), nullable=False),
+    sa.Column('total_duration_seconds', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('day', 'category')
+    )
+
+    # Backfill from the existing rows before the triggers take over
+    op.execute("INSERT INTO daily_workout_totals (day, workout_count, duration_minutes) "
+               "SELECT date, count(*), sum(duration_minutes) FROM workouts WHERE date IS NOT NULL GROUP BY date")
+    op.execute(f"INSERT INTO daily_category_volume (day, category, {', '.join(VOLUME)}) "
+               + volume('we', 'w.date', 'e.category',
+                        'workout_exercises we JOIN workouts w ON w.id = we.workout_id JOIN exercises e ON e.id = we.exercise_id',
+                        '1'))
+
+    def link_row(link):
+        return volume(link, 'w.date', 'e.category', 'workouts w, exercises e',
+                      f'w.id = {link}.workout_id AND e.id = {link}.exercise_id')
+
+    def workout_links(day):
+        return volume('we', day, 'e.category', 'workout_exercises we JOIN exercises e ON e.id = we.exercise_id',
+                      'we.workout_id = new.id')
+
+    def exercise_links(category):
+        return volume('we', 'w.date', category, 'workout_exercises we JOIN workouts w ON w.id = we.workout_id',
+                      'we.exercise_id = new.id')
+
+    add_workout = ("INSERT INTO daily_workout_totals (day, workout_count, duration_minutes) "
+                   "SELECT new.date, 1, new.duration_minutes WHERE new.date IS NOT NULL "
+                   "ON CONFLICT (day) DO UPDATE SET workout_count = workout_count + 1, "
+                   "duration_minutes = duration_minutes + excluded.duration_minutes;")
+    remove_workout = ("UPDATE daily_workout_totals SET workout_count = workout_count - 1, "
+                      "duration_minutes = duration_minutes - old.duration_minutes WHERE day = old.date; "
+                      "DELETE FROM daily_workout_totals WHERE day = old.date AND workout_count <= 0;")
+    op.execute(f"CREATE TRIGGER workouts_rollup_insert AFTER INSERT ON workouts BEGIN {add_workout} END")
+    op.execute(f"CREATE TRIGGER workouts_rollup_delete AFTER DELETE ON workouts BEGIN {remove_workout} END")
+    op.execute(f"CREATE TRIGGER workouts_rollup_update AFTER UPDATE OF date, duration_minutes ON workouts "
+               f"BEGIN {remove_workout} {add_workout} END")
+    op.execute(f"CREATE TRIGGER workouts_rollup_move AFTER UPDATE OF date ON workouts WHEN old.date IS NOT new.date "
+               f"BEGIN {subtract_volume(workout_links('old.date'))} {add_volume(workout_links('new.date'))} END")
+    op.execute(f"CREATE TRIGGER workout_exercises_rollup_insert AFTER INSERT ON workout_exercises "
+               f"BEGIN {add_volume(link_row('new'))} END")
+    op.execute(f"CREATE TRIGGER workout_exercises_rollup_delete AFTER DELETE ON workout_exercises "
+               f"BEGIN {subtract_volume(link_row('old'))} END")
+    op.execute(f"CREATE TRIGGER workout_exercises_rollup_update AFTER UPDATE OF workout_id, exercise_id, reps, sets, "
+               f"duration_seconds ON workout_exercises BEGIN {subtract_volume(link_row('old'))} {add_volume(link_row('new'))} END")
+    op.execute(f"CREATE TRIGGER exercises_rollup_move AFTER UPDATE OF category ON exercises "
+               f"WHEN old.category IS NOT new.category "
+               f"BEGIN {subtract_volume(exercise_links('old.category'))} {add_volume(exercise_links('new.category'))} END")
+
+
+def downgrade():
+    for trigger in TRIGGERS:
+        op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    op.drop_table('daily_category_volume')
+    op.drop_table('daily_workout_totals')
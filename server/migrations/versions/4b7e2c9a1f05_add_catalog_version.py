@@ -0,0 +1,40 @@
+"""add catalog version for the in-memory exercise catalog
+
+Revision ID: 4b7e2c9a1f05
+Revises: 9d2f4b8e6a13
+Create Date: 2026-10-17 21:04:37.518203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4b7e2c9a1f05'
+down_revision = '9d2f4b8e6a13'
+branch_labels = None
+depends_on = None
+
+TRIGGERS = ['exercises_catalog_insert', 'exercises_catalog_update', 'exercises_catalog_delete']
+
+
+def upgrade():
+    op.create_table('catalog_version',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute("INSERT INTO catalog_version (id, version) VALUES (1, 0)")
+
+    # Same SQL as catalog_trigger_ddl in models.py
+    bump = "UPDATE catalog_version SET version = version + 1 WHERE id = 1;"
+    op.execute(f"CREATE TRIGGER exercises_catalog_insert AFTER INSERT ON exercises BEGIN {bump} END")
+    op.execute(f"CREATE TRIGGER exercises_catalog_update AFTER UPDATE OF name, category, equipment_needed "
+               f"ON exercises BEGIN {bump} END")
+    op.execute(f"CREATE TRIGGER exercises_catalog_delete AFTER DELETE ON exercises BEGIN {bump} END")
+
+
+def downgrade():
+    for trigger in TRIGGERS:
+        op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    op.drop_table('catalog_version')
@@ -0,0 +1,83 @@
+"""add sync change feed, tombstones and idempotent requests
+
+Revision ID: 5faf431bcbba
+Revises: edc0db8c5e1f
+Create Date: 2026-10-17 14:03:27.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5faf431bcbba'
+down_revision = 'edc0db8c5e1f'
+branch_labels = None
+depends_on = None
+
+# synced table -> data columns whose updates take a new change_seq; see sync_trigger_ddl in models.py
+TABLES = {
+    'exercises': 'name, category, equipment_needed',
+    'workouts': 'date, duration_minutes, notes',
+    'workout_exercises': 'workout_id, exercise_id, reps, sets, duration_seconds',
+}
+
+NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+
+def upgrade():
+    op.create_table('sync_state',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('seq', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('tombstones',
+    sa.Column('seq', sa.Integer(), nullable=False),
+    sa.Column('table_name', sa.String(length=50), nullable=False),
+    sa.Column('row_id', sa.Integer(), nullable=False),
+    sa.Column('deleted_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('seq')
+    )
+    op.create_table('idempotent_requests',
+    sa.Column('key', sa.String(length=255), nullable=False),
+    sa.Column('request_hash', sa.String(length=64), nullable=False),
+    sa.Column('status', sa.Integer(), nullable=False),
+    sa.Column('response', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('key')
+    )
+    op.create_index(op.f('ix_idempotent_requests_created_at'), 'idempotent_requests', ['created_at'], unique=False)
+
+    # Existing rows get distinct sequence numbers, one table after another
+    offset = '0'
+    for table in TABLES:
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), nullable=True))
+        op.add_column(table, sa.Column('change_seq', sa.Integer(), nullable=True))
+        op.execute(f"UPDATE {table} SET change_seq = id + {offset}, updated_at = {NOW}")
+        op.create_index(op.f(f'ix_{table}_change_seq'), table, ['change_seq'], unique=False)
+        offset += f" + (SELECT coalesce(max(id), 0) FROM {table})"
+    op.execute(f"INSERT INTO sync_state (id, seq) VALUES (1, {offset})")
+
+    for table, data_columns in TABLES.items():
+        next_seq = "UPDATE sync_state SET seq = seq + 1 WHERE id = 1;"
+        stamp = (f"UPDATE {table} SET change_seq = (SELECT seq FROM sync_state WHERE id = 1), "
+                 f"updated_at = {NOW} WHERE id = new.id;")
+        tombstone = (f"INSERT INTO tombstones (seq, table_name, row_id, deleted_at) "
+                     f"VALUES ((SELECT seq FROM sync_state WHERE id = 1), '{table}', old.id, {NOW});")
+        op.execute(f"CREATE TRIGGER {table}_sync_insert AFTER INSERT ON {table} BEGIN {next_seq} {stamp} END")
+        op.execute(f"CREATE TRIGGER {table}_sync_update AFTER UPDATE OF {data_columns} ON {table} BEGIN {next_seq} {stamp} END")
+        op.execute(f"CREATE TRIGGER {table}_sync_delete AFTER DELETE ON {table} BEGIN {next_seq} {tombstone} END")
+
+
+def downgrade():
+    for table in TABLES:
+        for trigger in ('insert', 'update', 'delete'):
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_sync_{trigger}")
+        op.drop_index(op.f(f'ix_{table}_change_seq'), table_name=table)
+        # Native DROP COLUMN (SQLite 3.35+): batch mode would rebuild the table and lose its search triggers
+        op.execute(f"ALTER TABLE {table} DROP COLUMN change_seq")
+        op.execute(f"ALTER TABLE {table} DROP COLUMN updated_at")
+    op.drop_index(op.f('ix_idempotent_requests_created_at'), table_name='idempotent_requests')
+    op.drop_table('idempotent_requests')
+    op.drop_table('tombstones')
+    op.drop_table('sync_state')
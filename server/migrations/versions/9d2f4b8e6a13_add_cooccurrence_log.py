@@ -0,0 +1,59 @@
+"""add co-occurrence log for workout suggestions
+
+Revision ID: 9d2f4b8e6a13
+Revises: 3c9e1d7a5b42
+Create Date: 2026-10-17 18:12:44.301956
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d2f4b8e6a13'
+down_revision = '3c9e1d7a5b42'
+branch_labels = None
+depends_on = None
+
+# Newest log rows kept; see cooccurrence_trigger_ddl in models.py
+RETENTION = 100000
+
+TRIGGERS = ['workout_exercises_cooccurrence_insert', 'workout_exercises_cooccurrence_delete',
+            'workout_exercises_cooccurrence_update']
+
+
+def log_pairs(link, delta, exclude_self):
+    others = f" AND we.id != {link}.id" if exclude_self else ""
+    return (f"INSERT INTO cooccurrence_log (exercise_id, other_id, delta) "
+            f"SELECT {link}.exercise_id, we.exercise_id, {delta} FROM workout_exercises we "
+            f"WHERE we.workout_id = {link}.workout_id{others};")
+
+
+def upgrade():
+    op.create_table('cooccurrence_log',
+    sa.Column('seq', sa.Integer(), nullable=False),
+    sa.Column('exercise_id', sa.Integer(), nullable=False),
+    sa.Column('other_id', sa.Integer(), nullable=False),
+    sa.Column('delta', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('seq'),
+    sqlite_autoincrement=True
+    )
+
+    # No backfill: each process builds its matrix from workout_exercises on first use
+    prune = f"DELETE FROM cooccurrence_log WHERE seq <= (SELECT max(seq) FROM cooccurrence_log) - {RETENTION};"
+    unlog_old = ("INSERT INTO cooccurrence_log (exercise_id, other_id, delta) "
+                 "SELECT old.exercise_id, we.exercise_id, -1 FROM workout_exercises we "
+                 "WHERE we.workout_id = old.workout_id AND we.id != old.id;")
+    op.execute(f"CREATE TRIGGER workout_exercises_cooccurrence_insert AFTER INSERT ON workout_exercises "
+               f"BEGIN {log_pairs('new', 1, True)} {prune} END")
+    op.execute(f"CREATE TRIGGER workout_exercises_cooccurrence_delete AFTER DELETE ON workout_exercises "
+               f"BEGIN {log_pairs('old', -1, False)} END")
+    op.execute(f"CREATE TRIGGER workout_exercises_cooccurrence_update AFTER UPDATE OF workout_id, exercise_id "
+               f"ON workout_exercises WHEN old.workout_id IS NOT new.workout_id OR old.exercise_id IS NOT new.exercise_id "
+               f"BEGIN {unlog_old} {log_pairs('new', 1, True)} END")
+
+
+def downgrade():
+    for trigger in TRIGGERS:
+        op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    op.drop_table('cooccurrence_log')
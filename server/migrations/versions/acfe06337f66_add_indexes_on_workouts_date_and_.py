@@ -0,0 +1,33 @@
+"""Add indexes on workouts.date and workout_exercises.exercise_id
+
+Revision ID: acfe06337f66
+Revises: f6c627d7ec4d
+Create Date: 2026-10-17 03:48:28.845161
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'acfe06337f66'
+down_revision = 'f6c627d7ec4d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Indexes only: the autogenerated nullability changes would rebuild both tables
+    # and drop NOT NULL from workouts.date
+    with op.batch_alter_table('workout_exercises', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_workout_exercises_exercise_id'), ['exercise_id'], unique=False)
+
+    with op.batch_alter_table('workouts', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_workouts_date'), ['date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('workouts', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_workouts_date'))
+
+    with op.batch_alter_table('workout_exercises', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_workout_exercises_exercise_id'))
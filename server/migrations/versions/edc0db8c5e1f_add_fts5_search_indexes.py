@@ -0,0 +1,43 @@
+"""add fts5 search indexes over exercise names and workout notes
+
+Revision ID: edc0db8c5e1f
+Revises: 8abc7b209feb
+Create Date: 2026-10-17 09:12:41.503318
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'edc0db8c5e1f'
+down_revision = '8abc7b209feb'
+branch_labels = None
+depends_on = None
+
+# index name -> (content table, indexed column); see SEARCH_INDEXES in models.py
+INDEXES = {
+    'exercises_fts': ('exercises', 'name'),
+    'workouts_fts': ('workouts', 'notes'),
+}
+
+
+def upgrade():
+    for index, (table, column) in INDEXES.items():
+        insert = f"INSERT INTO {index}(rowid, {column}) VALUES (new.id, new.{column});"
+        delete = f"INSERT INTO {index}({index}, rowid, {column}) VALUES ('delete', old.id, old.{column});"
+        op.execute(
+            f"CREATE VIRTUAL TABLE {index} USING fts5({column}, content='{table}', content_rowid='id', "
+            f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+        op.execute(f"CREATE TRIGGER {index}_insert AFTER INSERT ON {table} BEGIN {insert} END")
+        op.execute(f"CREATE TRIGGER {index}_delete AFTER DELETE ON {table} BEGIN {delete} END")
+        op.execute(f"CREATE TRIGGER {index}_update AFTER UPDATE OF {column} ON {table} BEGIN {delete} {insert} END")
+        # Index the rows that already exist
+        op.execute(f"INSERT INTO {index}({index}) VALUES ('rebuild')")
+
+
+def downgrade():
+    for index, (table, column) in INDEXES.items():
+        for trigger in ('insert', 'delete', 'update'):
+            op.execute(f"DROP TRIGGER IF EXISTS {index}_{trigger}")
+        op.execute(f"DROP TABLE IF EXISTS {index}")
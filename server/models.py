@@ -1,8 +1,12 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import DDL, event
 from sqlalchemy.orm import validates
 from datetime import date
 
-db = SQLAlchemy()
+from database import RoutingSession
+
+# GET requests read through a separate engine when one is configured (see database.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 # Define allowed categories as a constant
 ALLOWED_CATEGORIES = ['strength', 'cardio', 'flexibility', 'balance', 'sports']
@@ -13,7 +17,10 @@ class Exercise(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False, unique=True)
     category = db.Column(db.String(50), nullable=False)
-    equipment_needed = db.Column(db.Boolean, default=False)
+    equipment_needed = db.Column(db.Boolean, nullable=False, default=False)
+    # Set by the sync triggers on every insert and update (see SYNC_COLUMNS)
+    updated_at = db.Column(db.DateTime)
+    change_seq = db.Column(db.Integer, index=True)
     
     # Simplified relationships
     workout_exercises = db.relationship('WorkoutExercise', back_populates='exercise', cascade='all, delete-orphan')
@@ -37,9 +44,12 @@ class Workout(db.Model):
     __tablename__ = 'workouts'
     
     id = db.Column(db.Integer, primary_key=True)
-    date = db.Column(db.Date, default=date.today)
+    # NOT NULL, as in the initial migration: GET /workouts pages on (date, id)
+    date = db.Column(db.Date, nullable=False, default=date.today, index=True)
     duration_minutes = db.Column(db.Integer, nullable=False)
     notes = db.Column(db.Text)
+    updated_at = db.Column(db.DateTime)
+    change_seq = db.Column(db.Integer, index=True)
     
     __table_args__ = (
         db.CheckConstraint('duration_minutes > 0', name='positive_duration'),
@@ -68,10 +78,13 @@ class WorkoutExercise(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     workout_id = db.Column(db.Integer, db.ForeignKey('workouts.id'), nullable=False)
-    exercise_id = db.Column(db.Integer, db.ForeignKey('exercises.id'), nullable=False)
+    # Indexed separately: the unique constraint leads with workout_id, so it can't serve exercise-side lookups
+    exercise_id = db.Column(db.Integer, db.ForeignKey('exercises.id'), nullable=False, index=True)
     reps = db.Column(db.Integer)
     sets = db.Column(db.Integer)
     duration_seconds = db.Column(db.Integer)
+    updated_at = db.Column(db.DateTime)
+    change_seq = db.Column(db.Integer, index=True)
     
     __table_args__ = (
         db.UniqueConstraint('workout_id', 'exercise_id', name='unique_workout_exercise'),
@@ -82,4 +95,334 @@ class WorkoutExercise(db.Model):
     exercise = db.relationship('Exercise', back_populates='workout_exercises')
 
     def __repr__(self):
-        return f'<WorkoutExercise {self.id}: Workout {self.workout_id}, Exercise {self.exercise_id}>'
\ No newline at end of file
+        return f'<WorkoutExercise {self.id}: Workout {self.workout_id}, Exercise {self.exercise_id}>'
+
+# Materialized summaries maintained by summaries.py; rebuild with `flask summaries rebuild`
+class WorkoutSummary(db.Model):
+    __tablename__ = 'workout_summaries'
+
+    workout_id = db.Column(db.Integer, db.ForeignKey('workouts.id'), primary_key=True)
+    exercise_count = db.Column(db.Integer, nullable=False, default=0)
+    total_sets = db.Column(db.Integer, nullable=False, default=0)
+    total_reps = db.Column(db.Integer, nullable=False, default=0)
+    total_volume = db.Column(db.Integer, nullable=False, default=0)
+    total_duration_seconds = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<WorkoutSummary {self.workout_id}: {self.exercise_count} exercises>'
+
+class ExerciseRecord(db.Model):
+    __tablename__ = 'exercise_records'
+
+    exercise_id = db.Column(db.Integer, db.ForeignKey('exercises.id'), primary_key=True)
+    # Each record keeps the workout that set it so deletes know when to recompute
+    max_reps = db.Column(db.Integer)
+    max_reps_date = db.Column(db.Date)
+    max_reps_workout_id = db.Column(db.Integer)
+    max_volume = db.Column(db.Integer)
+    max_volume_date = db.Column(db.Date)
+    max_volume_workout_id = db.Column(db.Integer)
+    max_duration_seconds = db.Column(db.Integer)
+    max_duration_seconds_date = db.Column(db.Date)
+    max_duration_seconds_workout_id = db.Column(db.Integer)
+
+    def __repr__(self):
+        return f'<ExerciseRecord {self.exercise_id}>'
+
+# FTS5 full-text indexes queried by search.py: index name -> (content table, indexed column).
+# They are external-content tables, so the text is stored once, in the content
+# table; triggers keep the index in step with every insert, update and delete.
+SEARCH_INDEXES = {
+    'exercises_fts': (Exercise.__table__, 'name'),
+    'workouts_fts': (Workout.__table__, 'notes'),
+}
+
+def search_index_ddl(index, table, column):
+    """CREATE statements for one FTS5 index and its sync triggers (the Alembic migration inlines the same SQL)"""
+    insert = f"INSERT INTO {index}(rowid, {column}) VALUES (new.id, new.{column});"
+    delete = f"INSERT INTO {index}({index}, rowid, {column}) VALUES ('delete', old.id, old.{column});"
+    return [
+        # prefix='2 3' adds prefix indexes so short `term*` queries don't scan the whole term list
+        f"CREATE VIRTUAL TABLE {index} USING fts5({column}, content='{table}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        f"CREATE TRIGGER {index}_insert AFTER INSERT ON {table} BEGIN {insert} END",
+        f"CREATE TRIGGER {index}_delete AFTER DELETE ON {table} BEGIN {delete} END",
+        f"CREATE TRIGGER {index}_update AFTER UPDATE OF {column} ON {table} BEGIN {delete} {insert} END",
+    ]
+
+# Keep db.create_all()/drop_all() (tests, benchmarks) in line with the migrations
+for index, (table, column) in SEARCH_INDEXES.items():
+    for statement in search_index_ddl(index, table.name, column):
+        event.listen(table, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+    # Dropping the content table drops its triggers, but not the index
+    event.listen(table, 'before_drop', DDL(f'DROP TABLE IF EXISTS {index}').execute_if(dialect='sqlite'))
+
+# Change feed for GET /sync (see sync.py). Every insert, update and delete on the
+# synced tables takes the next value of one counter, so a client that has seen
+# everything up to N only needs rows with change_seq > N and tombstones with seq > N.
+SYNC_COLUMNS = ('updated_at', 'change_seq')
+SYNCED_TABLES = (Exercise.__table__, Workout.__table__, WorkoutExercise.__table__)
+
+class SyncState(db.Model):
+    __tablename__ = 'sync_state'
+
+    # A single row holding the last change sequence number handed out
+    id = db.Column(db.Integer, primary_key=True)
+    seq = db.Column(db.Integer, nullable=False, default=0)
+    # Tombstones up to this seq have been pruned (see deletes.py), so a client whose sync
+    # token is older may have missed deletions and has to sync again from the start
+    pruned_seq = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+class Tombstone(db.Model):
+    __tablename__ = 'tombstones'
+
+    seq = db.Column(db.Integer, primary_key=True)
+    table_name = db.Column(db.String(50), nullable=False)
+    row_id = db.Column(db.Integer, nullable=False)
+    # Indexed so expired tombstones can be found without a scan
+    deleted_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<Tombstone {self.seq}: {self.table_name} {self.row_id}>'
+
+class IdempotentRequest(db.Model):
+    __tablename__ = 'idempotent_requests'
+
+    # Responses of applied POST /sync batches, replayed when a client retries with the same key
+    key = db.Column(db.String(255), primary_key=True)
+    request_hash = db.Column(db.String(64), nullable=False)
+    status = db.Column(db.Integer, nullable=False)
+    response = db.Column(db.Text, nullable=False)
+    # Indexed so expired keys can be pruned without a scan
+    created_at = db.Column(db.DateTime, nullable=False, index=True)
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+
+    # Background job status (see jobs.py). Stored here, not in the process running the
+    # job, so a poll answered by any worker process sees it
+    id = db.Column(db.String(32), primary_key=True)
+    type = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    progress = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text)
+    # host:pid of the process running the job, to tell a job cut off by its process exiting
+    owner = db.Column(db.String(255), nullable=False)
+    # Indexed so finished jobs can be pruned without a scan
+    updated_at = db.Column(db.DateTime, nullable=False, index=True)
+
+class LinkReceipt(db.Model):
+    __tablename__ = 'link_receipts'
+
+    # Outcome of each ?mode=async link (see writebehind.py), written in the group commit
+    # that decides it, so a receipt poll answered by any worker process sees it
+    id = db.Column(db.String(32), primary_key=True)
+    status = db.Column(db.String(20), nullable=False)
+    workout_id = db.Column(db.Integer, nullable=False)
+    exercise_id = db.Column(db.Integer, nullable=False)
+    # No foreign keys: a receipt may name rows that never existed or outlive its link
+    workout_exercise_id = db.Column(db.Integer)
+    error = db.Column(db.Text)
+    # Indexed so old receipts can be pruned without a scan
+    created_at = db.Column(db.DateTime, nullable=False, index=True)
+
+# Same text format SQLAlchemy's DateTime uses on SQLite
+SQLITE_NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+def sync_trigger_ddl(table):
+    """CREATE statements for the triggers that stamp one synced table's rows (the Alembic migration inlines the same SQL)"""
+    name = table.name
+    data_columns = ', '.join(column.name for column in table.columns if column.name not in ('id', *SYNC_COLUMNS))
+    next_seq = "UPDATE sync_state SET seq = seq + 1 WHERE id = 1;"
+    stamp = (f"UPDATE {name} SET change_seq = (SELECT seq FROM sync_state WHERE id = 1), "
+             f"updated_at = {SQLITE_NOW} WHERE id = new.id;")
+    tombstone = (f"INSERT INTO tombstones (seq, table_name, row_id, deleted_at) "
+                 f"VALUES ((SELECT seq FROM sync_state WHERE id = 1), '{name}', old.id, {SQLITE_NOW});")
+    return [
+        f"CREATE TRIGGER {name}_sync_insert AFTER INSERT ON {name} BEGIN {next_seq} {stamp} END",
+        # Only data columns: the stamping UPDATE itself must not fire it again
+        f"CREATE TRIGGER {name}_sync_update AFTER UPDATE OF {data_columns} ON {name} BEGIN {next_seq} {stamp} END",
+        f"CREATE TRIGGER {name}_sync_delete AFTER DELETE ON {name} BEGIN {next_seq} {tombstone} END",
+    ]
+
+for table in SYNCED_TABLES:
+    for statement in sync_trigger_ddl(table):
+        # DDL() %-formats its text, so escape strftime's % signs
+        event.listen(table, 'after_create', DDL(statement.replace('%', '%%')).execute_if(dialect='sqlite'))
+event.listen(SyncState.__table__, 'after_create', DDL("INSERT INTO sync_state (id, seq) VALUES (1, 0)"))
+
+# Calendar rollups for GET /stats/timeline (see timeline.py): per-day workout totals and
+# per-day, per-category workout_exercise totals. Triggers keep them current on every
+# write path; rebuild with `flask timeline rebuild`.
+class DailyWorkoutTotals(db.Model):
+    __tablename__ = 'daily_workout_totals'
+
+    day = db.Column(db.Date, primary_key=True)
+    workout_count = db.Column(db.Integer, nullable=False, default=0)
+    duration_minutes = db.Column(db.Integer, nullable=False, default=0)
+
+class DailyCategoryVolume(db.Model):
+    __tablename__ = 'daily_category_volume'
+
+    day = db.Column(db.Date, primary_key=True)
+    category = db.Column(db.String(50), primary_key=True)
+    exercise_count = db.Column(db.Integer, nullable=False, default=0)
+    total_sets = db.Column(db.Integer, nullable=False, default=0)
+    total_reps = db.Column(db.Integer, nullable=False, default=0)
+    total_volume = db.Column(db.Integer, nullable=False, default=0)
+    total_duration_seconds = db.Column(db.Integer, nullable=False, default=0)
+
+# daily_category_volume column -> value of one workout_exercises row (alias {link})
+CATEGORY_VOLUME = {
+    'exercise_count': '1',
+    'total_sets': 'coalesce({link}.sets, 0)',
+    'total_reps': 'coalesce({link}.reps, 0)',
+    'total_volume': 'coalesce({link}.reps * {link}.sets, 0)',
+    'total_duration_seconds': 'coalesce({link}.duration_seconds, 0)',
+}
+
+def category_volume(link, day, category, source, where):
+    """SELECT the (day, category, totals...) rows that workout_exercises rows contribute"""
+    totals = ', '.join(f"sum({value.format(link=link)}) AS {name}" for name, value in CATEGORY_VOLUME.items())
+    return (f"SELECT {day} AS day, {category} AS category, {totals} FROM {source} "
+            f"WHERE {where} AND {day} IS NOT NULL GROUP BY 1, 2")
+
+def add_volume(rows):
+    names = ', '.join(CATEGORY_VOLUME)
+    updates = ', '.join(f"{name} = {name} + excluded.{name}" for name in CATEGORY_VOLUME)
+    return (f"INSERT INTO daily_category_volume (day, category, {names}) {rows} "
+            f"ON CONFLICT (day, category) DO UPDATE SET {updates};")
+
+def subtract_volume(rows):
+    updates = ', '.join(f"{name} = daily_category_volume.{name} - s.{name}" for name in CATEGORY_VOLUME)
+    return (f"UPDATE daily_category_volume SET {updates} FROM ({rows}) AS s "
+            f"WHERE daily_category_volume.day = s.day AND daily_category_volume.category = s.category; "
+            f"DELETE FROM daily_category_volume WHERE exercise_count <= 0 "
+            f"AND (day, category) IN (SELECT day, category FROM ({rows}));")
+
+def rollup_trigger_ddl():
+    """table -> CREATE TRIGGER statements keeping the calendar rollups current (the Alembic migration inlines the same SQL)"""
+    def link_row(link):
+        return category_volume(link, 'w.date', 'e.category', 'workouts w, exercises e',
+                               f'w.id = {link}.workout_id AND e.id = {link}.exercise_id')
+
+    def workout_links(day):
+        return category_volume('we', day, 'e.category', 'workout_exercises we JOIN exercises e ON e.id = we.exercise_id',
+                               'we.workout_id = new.id')
+
+    def exercise_links(category):
+        return category_volume('we', 'w.date', category, 'workout_exercises we JOIN workouts w ON w.id = we.workout_id',
+                               'we.exercise_id = new.id')
+
+    add_workout = ("INSERT INTO daily_workout_totals (day, workout_count, duration_minutes) "
+                   "SELECT new.date, 1, new.duration_minutes WHERE new.date IS NOT NULL "
+                   "ON CONFLICT (day) DO UPDATE SET workout_count = workout_count + 1, "
+                   "duration_minutes = duration_minutes + excluded.duration_minutes;")
+    remove_workout = ("UPDATE daily_workout_totals SET workout_count = workout_count - 1, "
+                      "duration_minutes = duration_minutes - old.duration_minutes WHERE day = old.date; "
+                      "DELETE FROM daily_workout_totals WHERE day = old.date AND workout_count <= 0;")
+    return {
+        'workouts': [
+            f"CREATE TRIGGER workouts_rollup_insert AFTER INSERT ON workouts BEGIN {add_workout} END",
+            f"CREATE TRIGGER workouts_rollup_delete AFTER DELETE ON workouts BEGIN {remove_workout} END",
+            f"CREATE TRIGGER workouts_rollup_update AFTER UPDATE OF date, duration_minutes ON workouts "
+            f"BEGIN {remove_workout} {add_workout} END",
+            # A new date moves the workout's exercise volume to the new day
+            f"CREATE TRIGGER workouts_rollup_move AFTER UPDATE OF date ON workouts WHEN old.date IS NOT new.date "
+            f"BEGIN {subtract_volume(workout_links('old.date'))} {add_volume(workout_links('new.date'))} END",
+        ],
+        'workout_exercises': [
+            f"CREATE TRIGGER workout_exercises_rollup_insert AFTER INSERT ON workout_exercises "
+            f"BEGIN {add_volume(link_row('new'))} END",
+            f"CREATE TRIGGER workout_exercises_rollup_delete AFTER DELETE ON workout_exercises "
+            f"BEGIN {subtract_volume(link_row('old'))} END",
+            f"CREATE TRIGGER workout_exercises_rollup_update AFTER UPDATE OF workout_id, exercise_id, reps, sets, "
+            f"duration_seconds ON workout_exercises BEGIN {subtract_volume(link_row('old'))} {add_volume(link_row('new'))} END",
+        ],
+        'exercises': [
+            f"CREATE TRIGGER exercises_rollup_move AFTER UPDATE OF category ON exercises "
+            f"WHEN old.category IS NOT new.category "
+            f"BEGIN {subtract_volume(exercise_links('old.category'))} {add_volume(exercise_links('new.category'))} END",
+        ],
+    }
+
+for table_name, statements in rollup_trigger_ddl().items():
+    for statement in statements:
+        event.listen(db.metadata.tables[table_name], 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+
+# Pair deltas of the exercise co-occurrence matrix behind GET /workouts/<id>/suggestions
+# (see suggestions.py). Triggers append one row per affected pair on every link write,
+# so each process can bring its in-memory matrix up to date by reading the new rows.
+COOCCURRENCE_LOG_RETENTION = 100_000
+
+class CooccurrenceChange(db.Model):
+    __tablename__ = 'cooccurrence_log'
+    # AUTOINCREMENT: seq never goes back, even after pruning the newest rows
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    seq = db.Column(db.Integer, primary_key=True)
+    exercise_id = db.Column(db.Integer, nullable=False)
+    other_id = db.Column(db.Integer, nullable=False)
+    delta = db.Column(db.Integer, nullable=False)
+
+def cooccurrence_trigger_ddl():
+    """CREATE TRIGGER statements logging co-occurrence changes (the Alembic migration inlines the same SQL)"""
+    def log_pairs(link, delta, exclude_self):
+        others = f" AND we.id != {link}.id" if exclude_self else ""
+        return (f"INSERT INTO cooccurrence_log (exercise_id, other_id, delta) "
+                f"SELECT {link}.exercise_id, we.exercise_id, {delta} FROM workout_exercises we "
+                f"WHERE we.workout_id = {link}.workout_id{others};")
+
+    # Keep the newest rows only; a process further behind rebuilds its matrix
+    prune = (f"DELETE FROM cooccurrence_log WHERE seq <= "
+             f"(SELECT max(seq) FROM cooccurrence_log) - {COOCCURRENCE_LOG_RETENTION};")
+    # After the update, the row's old workout no longer contains it
+    unlog_old = ("INSERT INTO cooccurrence_log (exercise_id, other_id, delta) "
+                 "SELECT old.exercise_id, we.exercise_id, -1 FROM workout_exercises we "
+                 "WHERE we.workout_id = old.workout_id AND we.id != old.id;")
+    return [
+        f"CREATE TRIGGER workout_exercises_cooccurrence_insert AFTER INSERT ON workout_exercises "
+        f"BEGIN {log_pairs('new', 1, True)} {prune} END",
+        f"CREATE TRIGGER workout_exercises_cooccurrence_delete AFTER DELETE ON workout_exercises "
+        f"BEGIN {log_pairs('old', -1, False)} END",
+        f"CREATE TRIGGER workout_exercises_cooccurrence_update AFTER UPDATE OF workout_id, exercise_id "
+        f"ON workout_exercises WHEN old.workout_id IS NOT new.workout_id OR old.exercise_id IS NOT new.exercise_id "
+        f"BEGIN {unlog_old} {log_pairs('new', 1, True)} END",
+    ]
+
+for statement in cooccurrence_trigger_ddl():
+    event.listen(WorkoutExercise.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+
+# Version of each response cache tag (see cache.py). Kept in the database rather than
+# in a worker's memory, so an invalidation by any worker process or CLI command makes
+# every worker's cached responses for that tag stale.
+class CacheTag(db.Model):
+    __tablename__ = 'cache_tags'
+
+    tag = db.Column(db.String(255), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+# Version of the exercises table for the in-memory catalog (see catalog.py). Triggers
+# bump it on every insert, delete and data update, whichever process or path makes
+# them, so a process knows its copy is current by reading this one row.
+class CatalogVersion(db.Model):
+    __tablename__ = 'catalog_version'
+
+    # A single row
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+def catalog_trigger_ddl():
+    """CREATE TRIGGER statements bumping catalog_version (the Alembic migration inlines the same SQL)"""
+    bump = "UPDATE catalog_version SET version = version + 1 WHERE id = 1;"
+    return [
+        f"CREATE TRIGGER exercises_catalog_insert AFTER INSERT ON exercises BEGIN {bump} END",
+        # Not change_seq/updated_at: the sync stamp alone changes nothing the catalog holds
+        f"CREATE TRIGGER exercises_catalog_update AFTER UPDATE OF name, category, equipment_needed "
+        f"ON exercises BEGIN {bump} END",
+        f"CREATE TRIGGER exercises_catalog_delete AFTER DELETE ON exercises BEGIN {bump} END",
+    ]
+
+for statement in catalog_trigger_ddl():
+    event.listen(Exercise.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+event.listen(CatalogVersion.__table__, 'after_create', DDL("INSERT INTO catalog_version (id, version) VALUES (1, 0)"))
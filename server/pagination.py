@@ -0,0 +1,151 @@
+import base64
+import json
+from datetime import date
+from functools import lru_cache
+from typing import NamedTuple
+from urllib.parse import urlencode
+
+from flask import current_app, jsonify, request
+from marshmallow import ValidationError
+from sqlalchemy import Select, select, tuple_
+
+from models import db
+from serializers import fast_path_enabled, row_serializer
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+def parse_limit(args, default=DEFAULT_LIMIT, maximum=MAX_LIMIT):
+    """Read ?limit= and clamp it to maximum"""
+    raw = args.get('limit', default)
+    try:
+        limit = int(raw)
+    except (TypeError, ValueError):
+        raise ValidationError({"limit": ["Limit must be an integer."]})
+    if limit < 1:
+        raise ValidationError({"limit": ["Limit must be at least 1."]})
+    return min(limit, maximum)
+
+def parse_fields(args, schema_cls):
+    """Read ?fields=a,b,c and check every name against the schema"""
+    raw = args.get('fields')
+    if not raw:
+        return None
+    requested = tuple(dict.fromkeys(f.strip() for f in raw.split(',') if f.strip()))
+    unknown = [f for f in requested if f not in schema_cls._declared_fields]
+    if unknown:
+        raise ValidationError({"fields": [f"Unknown field(s): {', '.join(unknown)}"]})
+    return requested or None
+
+def encode_cursor(values):
+    payload = json.dumps([v.isoformat() if isinstance(v, date) else v for v in values])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(token, columns):
+    """Turn an opaque cursor back into typed values for the given key columns"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError
+        decoded = []
+        for column, value in zip(columns, values):
+            if value is None:
+                raise ValueError
+            python_type = column.type.python_type
+            decoded.append(date.fromisoformat(value) if python_type is date else python_type(value))
+        return decoded
+    except (ValueError, TypeError):
+        raise ValidationError({"cursor": ["Invalid cursor."]})
+
+@lru_cache(maxsize=None)
+def projection_schema(schema_cls, only):
+    # Schemas are built once per (schema, field set) rather than per request
+    return schema_cls(many=True, only=only)
+
+class Page(NamedTuple):
+    """A built keyset page query plus what's needed to turn its rows into a response"""
+    statement: Select
+    schema_cls: type
+    keys: tuple
+    limit: int
+    only: tuple
+    serializer: object
+
+def build_page(model, schema_cls, keys, args, filters=(), fast=False):
+    """Build the query for one keyset page of `model` ordered by `keys`.
+
+    `filters` are extra WHERE clauses applied before the cursor and limit.
+
+    Only the requested ?fields= columns are selected; the key columns are
+    always fetched so the next cursor can be built from the last row. With
+    `fast`, the page selects raw column tuples for the precompiled serializer.
+    """
+    limit = parse_limit(args)
+    only = parse_fields(args, schema_cls)
+    key_columns = [getattr(model, key) for key in keys]
+    # A row tuple with a NULL key never compares greater than a cursor, so it would be skipped
+    nullable = [key for key, column in zip(keys, key_columns) if column.nullable]
+    if nullable:
+        raise ValueError(f"Keyset columns must be NOT NULL: {', '.join(nullable)}")
+
+    serializer = row_serializer(schema_cls, only) if fast else None
+    if serializer:
+        extra_keys = [column for key, column in zip(keys, key_columns) if key not in serializer.names]
+        statement = select(*serializer.columns, *extra_keys)
+    elif only:
+        names = only + tuple(key for key in keys if key not in only)
+        statement = select(*(getattr(model, name) for name in names))
+    else:
+        statement = select(model)
+
+    statement = statement.where(*filters)
+
+    cursor = args.get('cursor')
+    if cursor:
+        statement = statement.where(tuple_(*key_columns) > tuple_(*decode_cursor(cursor, key_columns)))
+
+    statement = statement.order_by(*key_columns).limit(limit + 1)
+    return Page(statement, schema_cls, keys, limit, only, serializer)
+
+def page_items(page, result):
+    """Turn the executed page query into (items, next_cursor).
+
+    Items are pre-encoded JSON bytes on the fast path, else a list of dumped dicts.
+    """
+    rows = result.all() if page.serializer or page.only else result.scalars().all()
+
+    next_cursor = None
+    if len(rows) > page.limit:
+        rows = rows[:page.limit]
+        next_cursor = encode_cursor([getattr(rows[-1], key) for key in page.keys])
+
+    if page.serializer:
+        return page.serializer.encode(rows), next_cursor
+    return projection_schema(page.schema_cls, page.only).dump(rows), next_cursor
+
+def paginate(model, schema_cls, keys, filters=()):
+    """Return one keyset page of `model` for the current request plus the next cursor.
+
+    With FAST_LIST_SERIALIZATION on, the page is returned as pre-encoded JSON
+    bytes built from raw column tuples instead of a list of dumped dicts.
+    """
+    page = build_page(model, schema_cls, keys, request.args, filters, fast_path_enabled())
+    return page_items(page, db.session.execute(page.statement))
+
+def next_page_headers(path, args, next_cursor):
+    """X-Next-Cursor and Link headers pointing at the page after this one"""
+    if not next_cursor:
+        return {}
+    args = args.to_dict()
+    args['cursor'] = next_cursor
+    return {'X-Next-Cursor': next_cursor, 'Link': f'<{path}?{urlencode(args)}>; rel="next"'}
+
+def paginated_response(items, next_cursor):
+    """Keep the body a plain list and advertise the next page in headers"""
+    if isinstance(items, bytes):
+        response = current_app.response_class(items, mimetype='application/json')
+    else:
+        response = jsonify(items)
+    response.headers.update(next_page_headers(request.path, request.args, next_cursor))
+    return response
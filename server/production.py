@@ -0,0 +1,9 @@
+"""
+WSGI entry point for production serving
+Run with: gunicorn (settings are read from gunicorn.conf.py in this directory)
+      or: gunicorn --workers 4 --threads 4 --bind 0.0.0.0:5555 production:app
+"""
+
+from app import create_app
+
+app = create_app('production')
@@ -1,12 +1,53 @@
-from marshmallow import fields, validates, ValidationError
-from marshmallow_sqlalchemy import SQLAlchemyAutoSchema
-from models import Exercise, Workout, WorkoutExercise, ALLOWED_CATEGORIES
+from marshmallow import EXCLUDE, Schema, fields, pre_load, validate, validates, validates_schema, ValidationError
+from marshmallow_sqlalchemy import SQLAlchemyAutoSchema, auto_field
+from models import db, Exercise, Workout, WorkoutExercise, ALLOWED_CATEGORIES, SYNC_COLUMNS
 from datetime import date
 
-class ExerciseSchema(SQLAlchemyAutoSchema):
+from bulk import MAX_BULK_ITEMS
+from metrics import metrics
+
+class LazySchema:
+    """A module-level schema instance that is only constructed on first use.
+
+    Building every instance at import slows down the cold start of each
+    worker, and most workers only ever use a handful of them.
+    """
+    __slots__ = ('_args', '_schema')
+
+    def __init__(self, schema_cls, **kwargs):
+        self._args = (schema_cls, kwargs)
+        self._schema = None
+
+    def __getattr__(self, name):
+        if self._schema is None:
+            schema_cls, kwargs = self._args
+            self._schema = schema_cls(**kwargs)
+        return getattr(self._schema, name)
+
+class TimedDumpMixin:
+    """Reports dump() time to the per-request metrics"""
+    def dump(self, obj, *, many=None):
+        with metrics.serialization():
+            return super().dump(obj, many=many)
+
+class ExerciseSchema(TimedDumpMixin, SQLAlchemyAutoSchema):
     class Meta:
         model = Exercise
+        # Sync bookkeeping is only exposed through GET /sync
+        exclude = SYNC_COLUMNS
         load_instance = True
+        sqla_session = db.session
+    
+    @pre_load
+    def normalize(self, data, **kwargs):
+        # Mirror the model validators so bulk loads (which skip the model) store the same values
+        if isinstance(data, dict):
+            data = dict(data)
+            if isinstance(data.get('name'), str):
+                data['name'] = data['name'].strip()
+            if isinstance(data.get('category'), str):
+                data['category'] = data['category'].lower()
+        return data
         
     @validates('name')
     def validate_name(self, value, **kwargs):
@@ -19,10 +60,16 @@ class ExerciseSchema(SQLAlchemyAutoSchema):
         if value.lower() not in ALLOWED_CATEGORIES:
             raise ValidationError(f"Category must be one of: {', '.join(ALLOWED_CATEGORIES)}")
 
-class WorkoutSchema(SQLAlchemyAutoSchema):
+class WorkoutSchema(TimedDumpMixin, SQLAlchemyAutoSchema):
     class Meta:
         model = Workout
+        exclude = SYNC_COLUMNS
         load_instance = True
+        sqla_session = db.session
+
+    # Optional, but never null: GET /workouts, the rollups and the summaries key on it.
+    # Covers sync updates, which load with partial=True
+    date = auto_field(allow_none=False)
     
     @validates('duration_minutes')
     def validate_duration(self, value, **kwargs):
@@ -34,24 +81,35 @@ class WorkoutSchema(SQLAlchemyAutoSchema):
         if value and value > date.today():
             raise ValidationError("Workout date cannot be in the future.")
 
-class WorkoutExerciseSchema(SQLAlchemyAutoSchema):
+class WorkoutExerciseSchema(TimedDumpMixin, SQLAlchemyAutoSchema):
     class Meta:
         model = WorkoutExercise
+        exclude = SYNC_COLUMNS
         load_instance = True
+        include_fk = True
+        sqla_session = db.session
     
     @validates('reps', 'sets', 'duration_seconds')
     def validate_positive_numbers(self, value, **kwargs):
         if value is not None and value <= 0:
             raise ValidationError("Value must be a positive number.")
 
-# Schema instances - simplified
-exercise_schema = ExerciseSchema()
-exercises_schema = ExerciseSchema(many=True)
+# Schema instances, built on first use (see LazySchema)
+exercise_schema = LazySchema(ExerciseSchema)
+exercises_schema = LazySchema(ExerciseSchema, many=True)
+
+workout_schema = LazySchema(WorkoutSchema)
+workouts_schema = LazySchema(WorkoutSchema, many=True)
 
-workout_schema = WorkoutSchema()  
-workouts_schema = WorkoutSchema(many=True)
+workout_exercise_schema = LazySchema(WorkoutExerciseSchema)
+workout_exercises_schema = LazySchema(WorkoutExerciseSchema, many=True)
 
-workout_exercise_schema = WorkoutExerciseSchema()
+# Bulk schemas load plain dicts for a single executemany INSERT instead of ORM instances
+exercises_bulk_schema = LazySchema(ExerciseSchema, many=True, load_instance=False, exclude=('id',))
+workouts_bulk_schema = LazySchema(WorkoutSchema, many=True, load_instance=False, exclude=('id',))
+workout_exercises_bulk_schema = LazySchema(WorkoutExerciseSchema, many=True, load_instance=False, exclude=('id', 'workout_id'))
+# The body of POST .../workout_exercises; the ids come from the URL (see links.py)
+workout_exercise_metrics_schema = LazySchema(WorkoutExerciseSchema, load_instance=False, exclude=('id', 'workout_id', 'exercise_id'))
 
 # Detail schemas with nested relationships
 class WorkoutDetailSchema(WorkoutSchema):
@@ -60,5 +118,185 @@ class WorkoutDetailSchema(WorkoutSchema):
 class ExerciseDetailSchema(ExerciseSchema):
     workout_exercises = fields.Nested(WorkoutExerciseSchema, many=True)
 
-workout_detail_schema = WorkoutDetailSchema()
-exercise_detail_schema = ExerciseDetailSchema()
\ No newline at end of file
+workout_detail_schema = LazySchema(WorkoutDetailSchema)
+exercise_detail_schema = LazySchema(ExerciseDetailSchema)
+
+# Query-string filters for GET /workouts
+class WorkoutFilterSchema(Schema):
+    class Meta:
+        # Pagination parameters (limit, cursor, fields) share the query string
+        unknown = EXCLUDE
+    
+    from_date = fields.Date(data_key='from')
+    to_date = fields.Date(data_key='to')
+    exercise_id = fields.Integer()
+    category = fields.String()
+    min_duration = fields.Integer()
+    max_duration = fields.Integer()
+    
+    @validates('category')
+    def validate_category(self, value, **kwargs):
+        if value.lower() not in ALLOWED_CATEGORIES:
+            raise ValidationError(f"Category must be one of: {', '.join(ALLOWED_CATEGORIES)}")
+    
+    @validates_schema
+    def validate_ranges(self, data, **kwargs):
+        if 'from_date' in data and 'to_date' in data and data['from_date'] > data['to_date']:
+            raise ValidationError("'from' must not be after 'to'.", 'from')
+        if 'min_duration' in data and 'max_duration' in data and data['min_duration'] > data['max_duration']:
+            raise ValidationError("min_duration must not be greater than max_duration.", 'min_duration')
+
+workout_filter_schema = LazySchema(WorkoutFilterSchema)
+
+# Query-string filters for GET /exercises
+class ExerciseFilterSchema(Schema):
+    class Meta:
+        unknown = EXCLUDE
+    
+    category = fields.String()
+    
+    @validates('category')
+    def validate_category(self, value, **kwargs):
+        if value.lower() not in ALLOWED_CATEGORIES:
+            raise ValidationError(f"Category must be one of: {', '.join(ALLOWED_CATEGORIES)}")
+
+exercise_filter_schema = LazySchema(ExerciseFilterSchema)
+
+# Aggregate schemas - computed by SQL GROUP BY in stats.py, dump only
+class WeeklyVolumeSchema(TimedDumpMixin, Schema):
+    week_start = fields.Date()
+    volume = fields.Integer()
+    duration_seconds = fields.Integer()
+    session_count = fields.Integer()
+
+class ExerciseStatsSchema(TimedDumpMixin, Schema):
+    exercise_id = fields.Integer()
+    total_volume = fields.Integer()
+    total_duration_seconds = fields.Integer()
+    session_count = fields.Integer()
+    first_workout_date = fields.Date()
+    last_workout_date = fields.Date()
+    weekly = fields.Nested(WeeklyVolumeSchema, many=True)
+
+exercise_stats_schema = LazySchema(ExerciseStatsSchema)
+exercises_stats_schema = LazySchema(ExerciseStatsSchema, many=True)
+
+class RecordSchema(TimedDumpMixin, Schema):
+    value = fields.Integer()
+    date = fields.Date()
+    workout_id = fields.Integer()
+
+class ExerciseRecordsSchema(TimedDumpMixin, Schema):
+    exercise_id = fields.Integer()
+    max_reps = fields.Nested(RecordSchema, allow_none=True)
+    max_volume = fields.Nested(RecordSchema, allow_none=True)
+    max_duration_seconds = fields.Nested(RecordSchema, allow_none=True)
+
+class WorkoutSummarySchema(TimedDumpMixin, Schema):
+    workout_id = fields.Integer()
+    date = fields.Date()
+    duration_minutes = fields.Integer()
+    exercise_count = fields.Integer()
+    total_sets = fields.Integer()
+    total_reps = fields.Integer()
+    total_volume = fields.Integer()
+    total_duration_seconds = fields.Integer()
+
+exercise_records_schema = LazySchema(ExerciseRecordsSchema)
+workout_summary_schema = LazySchema(WorkoutSummarySchema)
+
+# GET /search query string and results (see search.py)
+class SearchSchema(Schema):
+    class Meta:
+        unknown = EXCLUDE
+
+    q = fields.String(required=True)
+    type = fields.String(validate=validate.OneOf(['exercise', 'workout']))
+
+class SearchResultSchema(TimedDumpMixin, Schema):
+    type = fields.String()
+    id = fields.Integer()
+    score = fields.Float()
+    snippet = fields.String()
+    # Only the key matching `type` is present
+    exercise = fields.Nested(ExerciseSchema)
+    workout = fields.Nested(WorkoutSchema)
+
+class SuggestionSchema(TimedDumpMixin, Schema):
+    exercise = fields.Nested(ExerciseSchema)
+    score = fields.Integer()
+
+search_schema = LazySchema(SearchSchema)
+search_results_schema = LazySchema(SearchResultSchema, many=True)
+suggestions_schema = LazySchema(SuggestionSchema, many=True)
+
+# GET /sync: full rows, including the sync bookkeeping the regular schemas leave out
+class ExerciseChangeSchema(ExerciseSchema):
+    class Meta(ExerciseSchema.Meta):
+        exclude = ()
+
+class WorkoutChangeSchema(WorkoutSchema):
+    class Meta(WorkoutSchema.Meta):
+        exclude = ()
+
+class WorkoutExerciseChangeSchema(WorkoutExerciseSchema):
+    class Meta(WorkoutExerciseSchema.Meta):
+        exclude = ()
+
+exercise_changes_schema = LazySchema(ExerciseChangeSchema, many=True)
+workout_changes_schema = LazySchema(WorkoutChangeSchema, many=True)
+workout_exercise_changes_schema = LazySchema(WorkoutExerciseChangeSchema, many=True)
+
+# POST /sync body (see sync.py); `data` is loaded per type once refs are resolved
+class MutationSchema(Schema):
+    op = fields.String(required=True, validate=validate.OneOf(['create', 'update', 'delete']))
+    type = fields.String(required=True, validate=validate.OneOf(['exercise', 'workout', 'workout_exercise']))
+    # A server id, or the ref of a create earlier in the same batch
+    id = fields.Raw()
+    ref = fields.String(validate=validate.Length(min=1, max=100))
+    data = fields.Dict(load_default=dict)
+
+    @validates_schema
+    def validate_target(self, data, **kwargs):
+        if data['op'] == 'create':
+            if 'id' in data:
+                raise ValidationError("New rows get their id from the server; use ref to refer to them.", 'id')
+        else:
+            if 'id' not in data:
+                raise ValidationError("Required for update and delete.", 'id')
+            if 'ref' in data:
+                raise ValidationError("Only creates take a ref.", 'ref')
+
+class SyncBatchSchema(Schema):
+    mutations = fields.List(fields.Nested(MutationSchema), required=True,
+                            validate=validate.Length(min=1, max=MAX_BULK_ITEMS))
+
+sync_batch_schema = LazySchema(SyncBatchSchema)
+# Per-type loaders for mutation data; updates load with partial=True
+exercise_mutation_schema = LazySchema(ExerciseSchema, load_instance=False, exclude=('id',))
+workout_mutation_schema = LazySchema(WorkoutSchema, load_instance=False, exclude=('id',))
+
+# GET /stats/timeline query string and buckets (see timeline.py)
+class TimelineSchema(Schema):
+    class Meta:
+        unknown = EXCLUDE
+
+    bucket = fields.String(load_default='week', validate=validate.OneOf(['day', 'week', 'month']))
+    from_date = fields.Date(data_key='from')
+    to_date = fields.Date(data_key='to')
+
+class CategoryVolumeSchema(TimedDumpMixin, Schema):
+    exercise_count = fields.Integer()
+    total_sets = fields.Integer()
+    total_reps = fields.Integer()
+    total_volume = fields.Integer()
+    total_duration_seconds = fields.Integer()
+
+class TimelineBucketSchema(TimedDumpMixin, Schema):
+    start = fields.Date()
+    workout_count = fields.Integer()
+    duration_minutes = fields.Integer()
+    categories = fields.Dict(keys=fields.String(), values=fields.Nested(CategoryVolumeSchema))
+
+timeline_schema = LazySchema(TimelineSchema)
+timeline_buckets_schema = LazySchema(TimelineBucketSchema, many=True)
@@ -0,0 +1,95 @@
+import re
+
+from marshmallow import ValidationError
+from sqlalchemy import Float, Integer, String, column, func, literal, select, table, tuple_, union_all
+
+from models import db, Exercise, Workout
+from pagination import decode_cursor, encode_cursor, parse_limit
+
+# Words, optionally ending in * for a prefix match ("squ*" finds "Squats")
+TERM = re.compile(r'\w+\*?')
+
+def fts(index):
+    # The hidden column named after the table stands for the whole row in MATCH and bm25()
+    return table(index, column('rowid', Integer), column(index))
+
+# type -> (FTS5 index, model); the index's rowid is the model's id
+SEARCHABLE = {
+    'exercise': (fts('exercises_fts'), Exercise),
+    'workout': (fts('workouts_fts'), Workout),
+}
+
+# Highlight markers and context size for snippet()
+SNIPPET_MARKERS = ('<mark>', '</mark>', '…')
+SNIPPET_TOKENS = 12
+
+def match_expression(q):
+    """Turn free text into an FTS5 query: every word must match, `word*` matches as a prefix.
+
+    Each word is quoted, so FTS5 operators and punctuation in user input are
+    treated as plain text instead of raising syntax errors.
+    """
+    terms = TERM.findall(q)
+    if not terms:
+        raise ValidationError({"q": ["Search query must contain at least one word."]})
+    return ' '.join(f'"{term[:-1]}"*' if term.endswith('*') else f'"{term}"' for term in terms)
+
+def ranked(kind, match):
+    """(type, id, rank) for every row of one index matching the query; lower bm25 ranks first"""
+    index, _ = SEARCHABLE[kind]
+    return (
+        select(
+            literal(kind, String).label('type'),
+            index.c.rowid.label('id'),
+            func.bm25(index.c[index.name], type_=Float).label('rank'),
+        )
+        .where(index.c[index.name].op('MATCH')(match))
+    )
+
+def load_hits(kind, match, ids, session):
+    """{id: (instance, snippet)} for one page's worth of hits; snippets are only built for these rows"""
+    index, model = SEARCHABLE[kind]
+    snippet = func.snippet(index.c[index.name], 0, *SNIPPET_MARKERS, SNIPPET_TOKENS)
+    rows = session.execute(
+        select(model, snippet)
+        .join(index, model.id == index.c.rowid)
+        .where(index.c[index.name].op('MATCH')(match), index.c.rowid.in_(ids))
+    )
+    return {instance.id: (instance, text) for instance, text in rows}
+
+def search(params, args, session=None):
+    """One keyset page of matches across exercise names and workout notes, best first.
+
+    `params` is loaded SearchSchema data; `args` supplies ?limit= and ?cursor=.
+    Ranking runs over the FTS5 indexes alone, ordered by (rank, type, id) so
+    pages are stable; the page's rows and their snippets are loaded after,
+    one query per type. Returns (results, next_cursor).
+    """
+    session = session or db.session
+    match = match_expression(params['q'])
+    limit = parse_limit(args)
+
+    kinds = [params['type']] if 'type' in params else list(SEARCHABLE)
+    arms = [ranked(kind, match) for kind in kinds]
+    hits = (union_all(*arms) if len(arms) > 1 else arms[0]).subquery()
+    keys = (hits.c.rank, hits.c.type, hits.c.id)
+    statement = select(*keys)
+    cursor = args.get('cursor')
+    if cursor:
+        statement = statement.where(tuple_(*keys) > tuple_(*decode_cursor(cursor, keys)))
+    rows = session.execute(statement.order_by(*keys).limit(limit + 1)).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(list(rows[-1]))
+
+    loaded = {
+        kind: load_hits(kind, match, [row.id for row in rows if row.type == kind], session)
+        for kind in {row.type for row in rows}
+    }
+    results = []
+    for row in rows:
+        instance, snippet = loaded[row.type][row.id]
+        results.append({'type': row.type, 'id': row.id, 'score': -row.rank, 'snippet': snippet, row.type: instance})
+    return results, next_cursor
@@ -1,17 +1,38 @@
 #!/usr/bin/env python3
+"""
+Seed the database
+Run with: python seed.py                       (small example data set)
+      or: python seed.py --workouts 1_000_000 --exercises 5000 --links-per-workout 6
+"""
 
-from app import app
+import argparse
+import itertools
+import random
+import time
+
+from app import create_app
 from models import *
+from summaries import rebuild
+from timeline import rebuild as rebuild_timeline
 from datetime import date, timedelta
 
-with app.app_context():
-    
-    # Clear existing data
+NOTE_PHRASES = [
+    "Felt strong today", "Quick session before work", "Focus on form", "New personal best",
+    "Recovery pace", "Legs were sore", "Great upper body workout", "Tempo intervals",
+    "Stretched afterwards", "Tired but finished", "Deload week", "Outdoor session",
+]
+
+def clear_data():
     print("Clearing existing data...")
+    WorkoutSummary.query.delete()
+    ExerciseRecord.query.delete()
     WorkoutExercise.query.delete()
     Exercise.query.delete()
     Workout.query.delete()
     db.session.commit()
+
+def seed_examples():
+    clear_data()
     
     # Create sample exercises
     print("Creating exercises...")
@@ -110,4 +131,127 @@ with app.app_context():
     print(f"First workout has {len(first_workout.workout_exercises)} exercise relationships")
     
     first_exercise = Exercise.query.first()
-    print(f"First exercise appears in {len(first_exercise.workout_exercises)} workout relationships")
\ No newline at end of file
+    print(f"First exercise appears in {len(first_exercise.workout_exercises)} workout relationships")
+
+def generate(connection, workouts, exercises, links_per_workout, days=5 * 365, batch_size=50_000, seed=42):
+    """Insert synthetic rows with batched executemany inside the caller's transaction.
+
+    Tables must be empty: ids are assigned from 1. Values respect every model
+    and schema rule, so the generated data is valid input for the API. The
+    secondary indexes and the search, sync, calendar rollup and co-occurrence
+    log triggers are dropped for the load and everything they maintain is rebuilt afterwards,
+    which is much cheaper than maintaining it row by row; rows are stamped
+    with change sequence numbers directly, continuing from sync_state.
+    """
+    if links_per_workout > exercises:
+        raise ValueError("links_per_workout cannot exceed the number of exercises")
+    rng = random.Random(seed)
+    rand = rng.random
+    today = date.today()
+    dates = [(today - timedelta(days=offset)).isoformat() for offset in range(days)]
+    # Each workout takes links_per_workout exercises spaced `stride` apart from a random start, so they never repeat
+    stride = exercises // links_per_workout
+    indexes = [index for model in (Workout, WorkoutExercise) for index in model.__table__.indexes]
+
+    connection.exec_driver_sql("PRAGMA cache_size=-262144")
+    for index in indexes:
+        index.drop(connection, checkfirst=True)
+    search_ddl = {index: search_index_ddl(index, table.name, column) for index, (table, column) in SEARCH_INDEXES.items()}
+    for index in search_ddl:
+        for trigger in ('insert', 'delete', 'update'):
+            connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS {index}_{trigger}")
+    for table in SYNCED_TABLES:
+        for trigger in ('insert', 'update', 'delete'):
+            connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS {table.name}_sync_{trigger}")
+    rollup_ddl = rollup_trigger_ddl()
+    for statement in (*(statement for statements in rollup_ddl.values() for statement in statements),
+                      *cooccurrence_trigger_ddl()):
+        # "CREATE TRIGGER <name> ..."
+        connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS {statement.split()[2]}")
+    seq = itertools.count(connection.exec_driver_sql("SELECT seq FROM sync_state WHERE id = 1").scalar_one() + 1)
+    now = connection.exec_driver_sql(f"SELECT {SQLITE_NOW}").scalar_one()
+
+    connection.exec_driver_sql(
+        "INSERT INTO exercises (id, name, category, equipment_needed, updated_at, change_seq) VALUES (?, ?, ?, ?, ?, ?)",
+        [(i, f"Exercise {i}", ALLOWED_CATEGORIES[i % len(ALLOWED_CATEGORIES)], i % 3 == 0, now, next(seq))
+         for i in range(1, exercises + 1)],
+    )
+    for start in range(1, workouts + 1, batch_size):
+        ids = range(start, min(start + batch_size, workouts + 1))
+        connection.exec_driver_sql(
+            "INSERT INTO workouts (id, date, duration_minutes, notes, updated_at, change_seq) VALUES (?, ?, ?, ?, ?, ?)",
+            [(i, dates[int(rand() * days)], 5 + int(rand() * 116), NOTE_PHRASES[i % len(NOTE_PHRASES)], now, next(seq))
+             for i in ids],
+        )
+        links = []
+        for i in ids:
+            first = int(rand() * exercises)
+            for j in range(links_per_workout):
+                r = rand()
+                links.append((
+                    i,
+                    (first + j * stride) % exercises + 1,
+                    1 + int(r * 20),
+                    1 + int(r * 97) % 5,
+                    30 + int(r * 1771) if r > 0.7 else None,
+                    now,
+                    next(seq),
+                ))
+        connection.exec_driver_sql(
+            "INSERT INTO workout_exercises (workout_id, exercise_id, reps, sets, duration_seconds, updated_at, change_seq) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            links,
+        )
+
+    for index in indexes:
+        index.create(connection)
+    for index, statements in search_ddl.items():
+        # statements[0] creates the FTS5 table itself, which is kept
+        for statement in statements[1:]:
+            connection.exec_driver_sql(statement)
+        connection.exec_driver_sql(f"INSERT INTO {index}({index}) VALUES ('rebuild')")
+    for table in SYNCED_TABLES:
+        for statement in sync_trigger_ddl(table):
+            connection.exec_driver_sql(statement)
+    connection.exec_driver_sql("UPDATE sync_state SET seq = ? WHERE id = 1", (next(seq) - 1,))
+    for statements in rollup_ddl.values():
+        for statement in statements:
+            connection.exec_driver_sql(statement)
+    rebuild_timeline(connection)
+    # An emptied log makes every process rebuild its co-occurrence matrix from the links
+    connection.exec_driver_sql("DELETE FROM cooccurrence_log")
+    for statement in cooccurrence_trigger_ddl():
+        connection.exec_driver_sql(statement)
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed the database with example or synthetic data")
+    parser.add_argument("--workouts", type=int, help="generate this many synthetic workouts instead of the examples")
+    parser.add_argument("--exercises", type=int, default=500)
+    parser.add_argument("--links-per-workout", type=int, default=4)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        if args.workouts is None:
+            seed_examples()
+            rebuild()
+            db.session.commit()
+            return
+
+        clear_data()
+        print(f"Generating {args.exercises:,} exercises, {args.workouts:,} workouts "
+              f"and {args.workouts * args.links_per_workout:,} workout-exercise relationships...")
+        started = time.perf_counter()
+        # One transaction for the whole load
+        with db.engine.begin() as connection:
+            generate(connection, args.workouts, args.exercises, args.links_per_workout)
+        print(f"Done in {time.perf_counter() - started:.1f}s")
+
+        print("Building workout summaries and exercise records...")
+        started = time.perf_counter()
+        rebuild()
+        db.session.commit()
+        print(f"Done in {time.perf_counter() - started:.1f}s")
+
+if __name__ == '__main__':
+    main()
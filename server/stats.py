@@ -0,0 +1,78 @@
+from datetime import date, timedelta
+
+from marshmallow import ValidationError
+from sqlalchemy import func, select
+
+from models import db, Exercise, Workout, WorkoutExercise
+
+DEFAULT_TREND_WEEKS = 12
+MAX_TREND_WEEKS = 520
+
+def parse_weeks(args):
+    """Read ?weeks= (how many weekly trend buckets to return)"""
+    raw = args.get('weeks', DEFAULT_TREND_WEEKS)
+    try:
+        weeks = int(raw)
+    except (TypeError, ValueError):
+        raise ValidationError({"weeks": ["Weeks must be an integer."]})
+    if not (1 <= weeks <= MAX_TREND_WEEKS):
+        raise ValidationError({"weeks": [f"Weeks must be between 1 and {MAX_TREND_WEEKS}."]})
+    return weeks
+
+def week_start(column):
+    # SQLite: jump to the coming Sunday, then back six days to that week's Monday
+    return func.date(column, 'weekday 0', '-6 days', type_=db.Date)
+
+def exercise_stats(exercise_id=None, weeks=DEFAULT_TREND_WEEKS, session=None):
+    """Aggregate workout_exercises per exercise in the database.
+
+    Returns one dict per exercise with lifetime totals and a `weekly` list
+    covering the last `weeks` weeks (only weeks with sessions are included).
+    """
+    session = session or db.session
+    volume = func.coalesce(func.sum(WorkoutExercise.reps * WorkoutExercise.sets), 0)
+    duration = func.coalesce(func.sum(WorkoutExercise.duration_seconds), 0)
+    sessions = func.count(WorkoutExercise.id)
+
+    totals = (
+        select(
+            Exercise.id.label('exercise_id'),
+            volume.label('total_volume'),
+            duration.label('total_duration_seconds'),
+            sessions.label('session_count'),
+            func.min(Workout.date).label('first_workout_date'),
+            func.max(Workout.date).label('last_workout_date'),
+        )
+        .select_from(Exercise)
+        .outerjoin(Exercise.workout_exercises)
+        .outerjoin(WorkoutExercise.workout)
+        .group_by(Exercise.id)
+        .order_by(Exercise.id)
+    )
+
+    today = date.today()
+    since = today - timedelta(days=today.weekday(), weeks=weeks - 1)
+    bucket = week_start(Workout.date).label('week_start')
+    trend = (
+        select(
+            WorkoutExercise.exercise_id,
+            bucket,
+            volume.label('volume'),
+            duration.label('duration_seconds'),
+            sessions.label('session_count'),
+        )
+        .join(WorkoutExercise.workout)
+        .where(Workout.date >= since)
+        .group_by(WorkoutExercise.exercise_id, bucket)
+        .order_by(WorkoutExercise.exercise_id, bucket)
+    )
+
+    if exercise_id is not None:
+        totals = totals.where(Exercise.id == exercise_id)
+        trend = trend.where(WorkoutExercise.exercise_id == exercise_id)
+
+    stats = {row.exercise_id: {**row._asdict(), 'weekly': []} for row in session.execute(totals)}
+    for row in session.execute(trend):
+        week = row._asdict()
+        stats[week.pop('exercise_id')]['weekly'].append(week)
+    return list(stats.values())
@@ -0,0 +1,156 @@
+import itertools
+import threading
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy import func, literal, select, union_all
+
+from models import db, CooccurrenceChange, Exercise, WorkoutExercise
+
+DEFAULT_SUGGESTIONS = 10
+MAX_SUGGESTIONS = 50
+
+# Pending pair deltas folded into the CSR matrix once there are this many
+FOLD_AT = 50_000
+
+def cooccurrence_matrix(workout_ids, exercise_ids):
+    """CSR matrix of how many workouts each pair of exercises shares, indexed by exercise id"""
+    size = int(exercise_ids.max()) + 1 if len(exercise_ids) else 1
+    workouts = np.unique(workout_ids, return_inverse=True)[1]
+    # workouts x exercises incidence; its Gram matrix counts shared workouts
+    incidence = sparse.csr_array((np.ones(len(exercise_ids), dtype=np.int32), (workouts, exercise_ids)),
+                                 shape=(int(workouts.max()) + 1 if len(workouts) else 0, size))
+    matrix = (incidence.T @ incidence).tocsr()
+    matrix.setdiag(0)
+    matrix.eliminate_zeros()
+    return matrix
+
+class CoOccurrence:
+    """In-memory exercise x exercise co-occurrence counts for one database.
+
+    Entry (a, b) is the number of workouts containing both exercises a and b,
+    indexed directly by exercise id. The matrix is built from workout_exercises
+    on first use with one sparse product, then kept current from
+    cooccurrence_log: every request first applies the pair deltas the
+    triggers logged since the last one, whichever process or path wrote them.
+    Deltas collect in a small dict and are folded into the CSR matrix in bulk.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self.matrix = None
+            self.seq = 0
+            # exercise id -> {other exercise id: count delta}
+            self.pending = {}
+            self.pending_count = 0
+
+    def build(self, connection):
+        """Count every pair from scratch, as of the newest cooccurrence_log row"""
+        # One statement, so the links and the log position come from the same snapshot.
+        # SQLite returns the log position row first
+        snapshot = union_all(
+            select(literal(-1), func.coalesce(func.max(CooccurrenceChange.seq), 0)),
+            select(WorkoutExercise.workout_id, WorkoutExercise.exercise_id),
+        )
+        # Flattened straight into an array: numpy is slow to convert a list of Rows
+        values = np.fromiter(itertools.chain.from_iterable(connection.execute(snapshot)), dtype=np.int64)
+        self.matrix = cooccurrence_matrix(values[2::2], values[3::2])
+        self.seq, self.pending, self.pending_count = int(values[1]), {}, 0
+
+    def catch_up(self, connection):
+        """Apply the logged pair deltas after self.seq, rebuilding if the log no longer has them"""
+        if self.matrix is None:
+            return self.build(connection)
+        # Also read the last applied row: if it's gone, the log was pruned past us or recreated
+        changes = connection.execute(
+            select(CooccurrenceChange.seq, CooccurrenceChange.exercise_id, CooccurrenceChange.other_id,
+                   CooccurrenceChange.delta)
+            .where(CooccurrenceChange.seq >= self.seq)
+            .order_by(CooccurrenceChange.seq)
+        ).all()
+        expected = self.seq if self.seq else 1
+        if changes and changes[0].seq != expected or not changes and self.seq:
+            return self.build(connection)
+        for seq, exercise_id, other_id, delta in changes:
+            if seq == self.seq:
+                continue
+            for row, column in ((exercise_id, other_id), (other_id, exercise_id)):
+                deltas = self.pending.setdefault(row, {})
+                deltas[column] = deltas.get(column, 0) + delta
+            self.pending_count += 2
+            self.seq = seq
+        if self.pending_count >= FOLD_AT:
+            self.fold()
+
+    def fold(self):
+        if not self.pending:
+            return
+        rows, columns, deltas = [], [], []
+        for row, changes in self.pending.items():
+            rows.extend([row] * len(changes))
+            columns.extend(changes)
+            deltas.extend(changes.values())
+        size = max(self.matrix.shape[0], max(rows) + 1, max(columns) + 1)
+        self.matrix.resize((size, size))
+        self.matrix = (self.matrix + sparse.csr_array((deltas, (rows, columns)), shape=(size, size))).tocsr()
+        self.matrix.eliminate_zeros()
+        self.pending, self.pending_count = {}, 0
+
+    def scores(self, exercise_ids):
+        """Summed counts over the rows of exercise_ids, as a dense vector indexed by exercise id"""
+        matrix = self.matrix
+        columns, counts = [], []
+        for i in exercise_ids:
+            if i < matrix.shape[0]:
+                columns.append(matrix.indices[matrix.indptr[i]:matrix.indptr[i + 1]])
+                counts.append(matrix.data[matrix.indptr[i]:matrix.indptr[i + 1]])
+            if i in self.pending:
+                columns.append(np.fromiter(self.pending[i], dtype=np.int64))
+                counts.append(np.fromiter(self.pending[i].values(), dtype=np.int64))
+        if not columns:
+            return np.zeros(0, dtype=np.int64)
+        # Thousands of exercises: a dense bincount beats sorting the candidates
+        return np.bincount(np.concatenate(columns), weights=np.concatenate(counts)).astype(np.int64)
+
+    def suggest(self, connection, exercise_ids, limit):
+        """Up to limit (exercise id, score) pairs, best first, excluding exercise_ids"""
+        with self._lock:
+            self.catch_up(connection)
+            scores = self.scores(exercise_ids)
+        scores[[i for i in exercise_ids if i < len(scores)]] = 0
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > limit:
+            # Everything scoring at least the limit-th best, so ties at the cut are all kept
+            cut = np.partition(scores[candidates], len(candidates) - limit)[len(candidates) - limit]
+            candidates = candidates[scores[candidates] >= cut]
+        # Highest score first, ties to the lower id
+        order = np.lexsort((candidates, -scores[candidates]))[:limit]
+        return [(int(candidates[i]), int(scores[candidates[i]])) for i in order]
+
+def app_matrix(app):
+    """The app's CoOccurrence, created on first use"""
+    matrix = app.extensions.get('cooccurrence')
+    if matrix is None:
+        matrix = app.extensions.setdefault('cooccurrence', CoOccurrence())
+    return matrix
+
+def suggestions(matrix, workout_id, limit, session=None):
+    """Exercises that most often share a workout with this workout's exercises, best first.
+
+    A candidate's score is the number of workouts it shares with each of the
+    workout's exercises, summed. Returns a list of {exercise, score}.
+    """
+    session = session or db.session
+    exercise_ids = session.scalars(select(WorkoutExercise.exercise_id).where(WorkoutExercise.workout_id == workout_id)).all()
+    if not exercise_ids:
+        return []
+    # Route like any other read of workout_exercises (see RoutingSession)
+    connection = session.connection(bind_arguments={'clause': select(WorkoutExercise)})
+    scored = matrix.suggest(connection, exercise_ids, limit)
+    exercises = {exercise.id: exercise for exercise in
+                 session.scalars(select(Exercise).where(Exercise.id.in_([id for id, _ in scored])))}
+    return [{'exercise': exercises[id], 'score': score} for id, score in scored if id in exercises]
@@ -0,0 +1,250 @@
+import click
+from flask.cli import AppGroup
+from sqlalchemy import and_, bindparam, case, delete, func, or_, select, true, tuple_, union, update
+from sqlalchemy.dialects.sqlite import insert
+
+from models import db, ExerciseRecord, Workout, WorkoutExercise, WorkoutSummary
+
+# Personal records per exercise: name -> value of one workout_exercises row
+RECORD_METRICS = {
+    'max_reps': WorkoutExercise.reps,
+    'max_volume': WorkoutExercise.reps * WorkoutExercise.sets,
+    'max_duration_seconds': WorkoutExercise.duration_seconds,
+}
+
+# Per-workout totals: name -> value summed over the workout's rows
+SUMMARY_TOTALS = {
+    'total_sets': WorkoutExercise.sets,
+    'total_reps': WorkoutExercise.reps,
+    'total_volume': WorkoutExercise.reps * WorkoutExercise.sets,
+    'total_duration_seconds': WorkoutExercise.duration_seconds,
+}
+SUMMARY_COLUMNS = ('exercise_count', *SUMMARY_TOTALS)
+
+# Rows that can hold at least one record (volume needs reps), so every stored record has a holder
+HAS_RECORD = or_(WorkoutExercise.reps.isnot(None), WorkoutExercise.duration_seconds.isnot(None))
+
+RECORD_HOLDERS = [getattr(ExerciseRecord, f'{name}_workout_id') for name in RECORD_METRICS]
+
+def summary_totals(criteria):
+    """Per-workout totals over the workout_exercises rows matching criteria"""
+    return (
+        select(
+            WorkoutExercise.workout_id,
+            func.count().label('exercise_count'),
+            *(func.coalesce(func.sum(value), 0).label(name) for name, value in SUMMARY_TOTALS.items()),
+        )
+        .where(criteria)
+        .group_by(WorkoutExercise.workout_id)
+    )
+
+def best_records(criteria):
+    """Recompute records for every exercise with a row matching criteria.
+
+    Ties go to the earliest workout (by date, then id), the same order the
+    incremental upsert in add_links() uses. All three rankings come from one
+    pass over the rows.
+    """
+    ranked = (
+        select(
+            WorkoutExercise.exercise_id,
+            WorkoutExercise.workout_id,
+            Workout.date,
+            *(value.label(name) for name, value in RECORD_METRICS.items()),
+            *(
+                func.row_number().over(
+                    partition_by=WorkoutExercise.exercise_id,
+                    order_by=(value.desc(), Workout.date, WorkoutExercise.workout_id),
+                ).label(f'{name}_rank')
+                for name, value in RECORD_METRICS.items()
+            ),
+        )
+        .join(WorkoutExercise.workout)
+        .where(criteria, HAS_RECORD)
+        .subquery()
+    )
+    columns = [ranked.c.exercise_id]
+    for name in RECORD_METRICS:
+        # NULLs sort last, so rank 1 is only NULL when the exercise has no value for this metric
+        best = and_(ranked.c[f'{name}_rank'] == 1, ranked.c[name].isnot(None))
+        columns += [
+            func.max(case((best, ranked.c[name]))).label(name),
+            func.max(case((best, ranked.c.date))).label(f'{name}_date'),
+            func.max(case((best, ranked.c.workout_id))).label(f'{name}_workout_id'),
+        ]
+    return select(*columns).group_by(ranked.c.exercise_id)
+
+def record_candidates(criteria):
+    """One candidate record row per workout_exercises row matching criteria"""
+    columns = [WorkoutExercise.exercise_id]
+    for name, value in RECORD_METRICS.items():
+        held = value.isnot(None)
+        columns += [
+            value.label(name),
+            case((held, Workout.date)).label(f'{name}_date'),
+            case((held, WorkoutExercise.workout_id)).label(f'{name}_workout_id'),
+        ]
+    return select(*columns).join(WorkoutExercise.workout).where(criteria, HAS_RECORD)
+
+def add_links_statements(criteria):
+    """The two upserts that fold workout_exercises rows matching criteria into the summaries"""
+    totals = summary_totals(criteria)
+    statement = insert(WorkoutSummary).from_select(['workout_id', *SUMMARY_COLUMNS], totals)
+    add_totals = statement.on_conflict_do_update(
+        index_elements=[WorkoutSummary.workout_id],
+        set_={name: getattr(WorkoutSummary, name) + statement.excluded[name] for name in SUMMARY_COLUMNS},
+    )
+
+    candidates = record_candidates(criteria)
+    statement = insert(ExerciseRecord).from_select([column.name for column in candidates.selected_columns], candidates)
+    update_values = {}
+    for name in RECORD_METRICS:
+        new = [statement.excluded[column] for column in (name, f'{name}_date', f'{name}_workout_id')]
+        current = [getattr(ExerciseRecord, column) for column in (name, f'{name}_date', f'{name}_workout_id')]
+        beats = and_(new[0].isnot(None), or_(
+            current[0].is_(None),
+            new[0] > current[0],
+            and_(new[0] == current[0], tuple_(new[1], new[2]) < tuple_(current[1], current[2])),
+        ))
+        for new_column, current_column in zip(new, current):
+            update_values[current_column.key] = case((beats, new_column), else_=current_column)
+    add_records = statement.on_conflict_do_update(
+        index_elements=[ExerciseRecord.exercise_id],
+        set_=update_values,
+    )
+    return add_totals, add_records
+
+def add_links(criteria, session=None):
+    """Fold newly inserted workout_exercises rows matching criteria into the summaries.
+
+    Runs in the caller's transaction after the rows are flushed; the caller commits.
+    """
+    session = session or db.session
+    for statement in add_links_statements(criteria):
+        session.execute(statement)
+
+# Built once for the single-link create path, where building them per call costs more than running them
+ADD_LINK = add_links_statements(WorkoutExercise.id == bindparam('link_id'))
+
+def add_link(link_id, session=None):
+    """add_links() for one row by id, using the prebuilt statements"""
+    # Core execution: the ORM would read {'link_id': ...} as rows for a bulk INSERT
+    connection = (session or db.session).connection()
+    for statement in ADD_LINK:
+        connection.execute(statement, {'link_id': link_id})
+
+def remove_links(criteria, session=None):
+    """Take workout_exercises rows matching criteria out of the summaries before they are deleted.
+
+    Totals are decremented in place. Returns the exercise ids whose records
+    were held by one of these rows; pass them to refresh_records() once the
+    rows are gone.
+    """
+    session = session or db.session
+    removed = summary_totals(criteria).subquery()
+    session.execute(
+        update(WorkoutSummary)
+        .where(WorkoutSummary.workout_id == removed.c.workout_id)
+        .values({name: getattr(WorkoutSummary, name) - removed.c[name] for name in SUMMARY_COLUMNS})
+        .execution_options(synchronize_session=False)
+    )
+    session.execute(
+        delete(WorkoutSummary)
+        .where(
+            WorkoutSummary.workout_id.in_(select(WorkoutExercise.workout_id).where(criteria)),
+            WorkoutSummary.exercise_count <= 0,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    return session.scalars(
+        select(ExerciseRecord.exercise_id)
+        .join(WorkoutExercise, and_(
+            WorkoutExercise.exercise_id == ExerciseRecord.exercise_id,
+            WorkoutExercise.workout_id.in_(RECORD_HOLDERS),
+        ))
+        .where(criteria)
+        .distinct()
+    ).all()
+
+def refresh_records(exercise_ids, session=None):
+    """Recompute records for these exercises from their remaining rows"""
+    session = session or db.session
+    if not exercise_ids:
+        return
+    session.execute(
+        delete(ExerciseRecord)
+        .where(ExerciseRecord.exercise_id.in_(exercise_ids))
+        .execution_options(synchronize_session=False)
+    )
+    records = best_records(WorkoutExercise.exercise_id.in_(exercise_ids))
+    session.execute(insert(ExerciseRecord).from_select([column.name for column in records.selected_columns], records))
+
+def rebuild():
+    """Recompute both summary tables from scratch; the caller commits"""
+    db.session.execute(delete(WorkoutSummary).execution_options(synchronize_session=False))
+    db.session.execute(delete(ExerciseRecord).execution_options(synchronize_session=False))
+    totals = summary_totals(true())
+    db.session.execute(insert(WorkoutSummary).from_select(['workout_id', *SUMMARY_COLUMNS], totals))
+    records = best_records(true())
+    db.session.execute(insert(ExerciseRecord).from_select([column.name for column in records.selected_columns], records))
+
+def drift():
+    """Count stored summary rows that differ from a fresh computation, per table"""
+    def mismatched(stored, computed):
+        # Keys of rows that are missing, extra or different on either side
+        only_stored, only_computed = stored.except_(computed).subquery(), computed.except_(stored).subquery()
+        keys = union(select(only_stored.c[0]), select(only_computed.c[0])).subquery()
+        return db.session.scalar(select(func.count()).select_from(keys))
+
+    records = best_records(true())
+    return {
+        'workout_summaries': mismatched(
+            select(WorkoutSummary.workout_id, *(getattr(WorkoutSummary, name) for name in SUMMARY_COLUMNS)),
+            summary_totals(true()),
+        ),
+        'exercise_records': mismatched(
+            select(*(getattr(ExerciseRecord, column.name) for column in records.selected_columns)),
+            records,
+        ),
+    }
+
+def exercise_records(exercise_id, session=None):
+    session = session or db.session
+    record = session.get(ExerciseRecord, exercise_id)
+    result = {'exercise_id': exercise_id}
+    for name in RECORD_METRICS:
+        value = getattr(record, name) if record else None
+        result[name] = None if value is None else {
+            'value': value,
+            'date': getattr(record, f'{name}_date'),
+            'workout_id': getattr(record, f'{name}_workout_id'),
+        }
+    return result
+
+def workout_summary(workout, session=None):
+    session = session or db.session
+    summary = session.get(WorkoutSummary, workout.id)
+    return {
+        'workout_id': workout.id,
+        'date': workout.date,
+        'duration_minutes': workout.duration_minutes,
+        **{name: getattr(summary, name) if summary else 0 for name in SUMMARY_COLUMNS},
+    }
+
+summaries_cli = AppGroup('summaries', help='Maintain the workout summary and exercise record tables.')
+
+@summaries_cli.command('rebuild')
+@click.option('--check', is_flag=True, help='Only compare the stored tables with a fresh computation.')
+def rebuild_command(check):
+    """Recompute workout summaries and exercise records from workout_exercises and verify them."""
+    before = drift()
+    click.echo(', '.join(f'{table}: {count} rows differ' for table, count in before.items()))
+    if check:
+        raise SystemExit(1 if any(before.values()) else 0)
+
+    rebuild()
+    db.session.commit()
+    after = drift()
+    if any(after.values()):
+        raise click.ClickException(f'Rebuilt summaries still differ from a fresh computation: {after}')
+    click.echo('Rebuilt and verified workout_summaries and exercise_records.')
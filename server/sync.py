@@ -0,0 +1,299 @@
+import hashlib
+import json
+from datetime import datetime, timedelta, timezone
+
+from marshmallow import ValidationError
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Exercise, IdempotentRequest, SyncState, Tombstone, Workout, WorkoutExercise
+from schemas import (
+    exercise_changes_schema, exercise_mutation_schema, sync_batch_schema,
+    workout_changes_schema, workout_exercise_changes_schema, workout_mutation_schema,
+)
+from pagination import decode_cursor, encode_cursor, parse_limit
+from deletes import delete_links, delete_row, prune_tombstones
+from links import DUPLICATE, METRICS, NO_METRICS, create_link, integrity_conflict, link_loader, load_link
+from summaries import add_links, refresh_records, remove_links
+
+# Changes per GET /sync page
+DEFAULT_SYNC_LIMIT = 500
+MAX_SYNC_LIMIT = 5000
+# How long a POST /sync response is kept for replay to a retrying client
+IDEMPOTENCY_TTL = timedelta(hours=24)
+MAX_KEY_LENGTH = 255
+
+# Mutation type -> model
+SYNC_TYPES = {
+    'exercise': Exercise,
+    'workout': Workout,
+    'workout_exercise': WorkoutExercise,
+}
+
+# Feed key (the table name, as stored in tombstones) -> (table, schema for its rows)
+CHANGE_FEEDS = {
+    model.__tablename__: (model.__table__, schema)
+    for model, schema in (
+        (Exercise, exercise_changes_schema),
+        (Workout, workout_changes_schema),
+        (WorkoutExercise, workout_exercise_changes_schema),
+    )
+}
+
+RESYNC_REQUIRED = "Sync token is older than the deletions this server keeps; sync again from the start."
+
+class ResyncRequired(Exception):
+    """The since-token predates pruned tombstones, so deletions since then can't be listed"""
+
+# Foreign keys of a new workout_exercise -> the type they point at
+LINK_PARENTS = {'workout_id': 'workout', 'exercise_id': 'exercise'}
+
+def utcnow():
+    # Naive UTC, like the timestamps the sync triggers write
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def sync_bounds(session):
+    """(last seq handed out, last seq whose tombstones were pruned)"""
+    return session.execute(select(SyncState.seq, SyncState.pruned_seq).where(SyncState.id == 1)).one()
+
+def decode_since(token):
+    if not token:
+        return 0
+    try:
+        since, = decode_cursor(token, [SyncState.__table__.c.seq])
+    except ValidationError:
+        since = -1
+    if since < 0:
+        raise ValidationError({"since": ["Invalid sync token."]})
+    return since
+
+def changes_since(args, session=None):
+    """One page of the change feed after ?since=, oldest change first.
+
+    Every insert, update and delete takes the next sync_state.seq (see the
+    triggers in models.py). The page covers (since, high], where high is read
+    first, so changes committed while the page is built wait for the next
+    call. Each table and the tombstones are read in seq order with limit + 1
+    rows, merged, and cut to the limit; `next` is the last seq included, or
+    high once the client is caught up. Raises ResyncRequired when tombstones
+    after `since` have already been pruned.
+    """
+    session = session or db.session
+    limit = parse_limit(args, DEFAULT_SYNC_LIMIT, MAX_SYNC_LIMIT)
+    since = decode_since(args.get('since'))
+    high, pruned = sync_bounds(session)
+    if since > high:
+        raise ValidationError({"since": ["Sync token is ahead of this server; sync again from the start."]})
+    if 0 < since < pruned:
+        raise ResyncRequired(RESYNC_REQUIRED)
+
+    # (seq, feed, row) for changed rows and (seq, feed, id) for deletions
+    entries = []
+    for name, (table, _) in CHANGE_FEEDS.items():
+        seq = table.c.change_seq
+        # Core rows: the identity map could hold older copies of ORM instances
+        rows = session.execute(select(table).where(seq > since, seq <= high).order_by(seq).limit(limit + 1))
+        entries += [(row.change_seq, name, row) for row in rows]
+    tombstones = session.execute(
+        select(Tombstone.seq, Tombstone.table_name, Tombstone.row_id)
+        .where(Tombstone.seq > since, Tombstone.seq <= high)
+        .order_by(Tombstone.seq)
+        .limit(limit + 1)
+    )
+    entries += list(tombstones)
+    entries.sort(key=lambda entry: entry[0])
+
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    next_seq = entries[-1][0] if has_more else high
+
+    changed = {name: [] for name in CHANGE_FEEDS}
+    deleted = {name: [] for name in CHANGE_FEEDS}
+    for _, name, row in entries:
+        (deleted if isinstance(row, int) else changed)[name].append(row)
+    for name, ids in deleted.items():
+        # SQLite can reuse the id of a deleted row; the later insert in the same page wins
+        live = {row.id for row in changed[name]}
+        deleted[name] = [id for id in ids if id not in live]
+
+    return {
+        "changes": {name: CHANGE_FEEDS[name][1].dump(rows) for name, rows in changed.items()},
+        "deleted": deleted,
+        "next": encode_cursor([next_seq]),
+        "has_more": has_more,
+    }
+
+def sync_batch(key, payload, session=None):
+    """Apply a POST /sync batch at most once per Idempotency-Key.
+
+    All mutations run in one transaction together with the row that stores
+    the response, so a batch is either applied and recorded, or neither. A
+    retry with the same key and body gets the stored response back; the same
+    key with a different body is refused. Failed batches are rolled back and
+    not stored, so the client can fix them and retry. Commits on success.
+    Returns (body, status, replayed).
+    """
+    session = session or db.session
+    if not key:
+        raise ValidationError({"Idempotency-Key": ["Header is required."]})
+    if len(key) > MAX_KEY_LENGTH:
+        raise ValidationError({"Idempotency-Key": [f"At most {MAX_KEY_LENGTH} characters."]})
+    request_hash = hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+    stored = session.get(IdempotentRequest, key)
+    if stored is not None:
+        return replay(stored, request_hash)
+
+    mutations = sync_batch_schema.load(payload)['mutations']
+    try:
+        body = {"results": apply_mutations(mutations, session)}
+        now = utcnow()
+        session.execute(
+            delete(IdempotentRequest)
+            .where(IdempotentRequest.created_at < now - IDEMPOTENCY_TTL)
+            .execution_options(synchronize_session=False)
+        )
+        prune_tombstones(session)
+        session.add(IdempotentRequest(key=key, request_hash=request_hash, status=200,
+                                      response=json.dumps(body), created_at=now))
+        try:
+            session.commit()
+        except IntegrityError:
+            # A concurrent request with the same key committed first
+            session.rollback()
+            return replay(session.get(IdempotentRequest, key), request_hash)
+    except Exception:
+        session.rollback()
+        raise
+    return body, 200, False
+
+def replay(stored, request_hash):
+    if stored.request_hash != request_hash:
+        return {"error": "Idempotency-Key was already used with a different request body"}, 422, False
+    return json.loads(stored.response), stored.status, True
+
+def apply_mutations(mutations, session):
+    """Apply loaded mutations in order; the first failure raises with its index"""
+    refs, results = {}, []
+    for index, mutation in enumerate(mutations):
+        try:
+            row_id = APPLY[mutation['op']](mutation, refs, session)
+        except ValidationError as e:
+            raise ValidationError({"mutations": {index: e.messages}})
+        result = {"op": mutation['op'], "type": mutation['type'], "id": row_id}
+        if 'ref' in mutation:
+            result['ref'] = mutation['ref']
+        results.append(result)
+    return results
+
+def resolve(value, kind, refs, *path):
+    """An id given directly, or the id of an earlier create's ref of the same type"""
+    if isinstance(value, str):
+        if refs.get(value, (None,))[0] != kind:
+            raise invalid(f"No {kind} was created with ref '{value}' earlier in this batch.", *path)
+        return refs[value][1]
+    if value is None:
+        raise invalid("Missing data for required field.", *path)
+    if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+        raise invalid("Must be an id or the ref of a create earlier in this batch.", *path)
+    return value
+
+def invalid(message, *path):
+    messages = [message]
+    for key in reversed(path):
+        messages = {key: messages}
+    return ValidationError(messages)
+
+def load_data(mutation, partial=False):
+    """Validate a mutation's data for its type; the ids of a workout_exercise are handled by the caller"""
+    kind, data = mutation['type'], mutation['data']
+    try:
+        if kind == 'workout_exercise':
+            return link_loader().load(data)
+        schema = exercise_mutation_schema if kind == 'exercise' else workout_mutation_schema
+        return schema.load(data, partial=partial)
+    except ValidationError as e:
+        raise ValidationError({"data": e.messages})
+
+def exists(model, id, session):
+    if session.scalar(select(model.id).where(model.id == id)) is None:
+        raise invalid(f"{model.__name__} {id} not found.", 'id')
+
+def create(mutation, refs, session):
+    kind = mutation['type']
+    if 'ref' in mutation and mutation['ref'] in refs:
+        raise invalid("Already used by a create earlier in this batch.", 'ref')
+
+    if kind == 'workout_exercise':
+        data = mutation['data']
+        ids = {field: resolve(data.get(field), parent, refs, 'data', field) for field, parent in LINK_PARENTS.items()}
+        row, error = load_link(data)
+        if error:
+            body, _ = error
+            raise ValidationError({"data": body.get('errors') or {"_schema": [body['error']]}})
+        link, conflict = create_link(ids['workout_id'], ids['exercise_id'], row, session)
+        if conflict == 'missing':
+            raise invalid("Workout or exercise not found.", 'data', '_schema')
+        if conflict:
+            raise invalid(DUPLICATE, 'data', '_schema')
+        row_id = link['id']
+    else:
+        model = SYNC_TYPES[kind]
+        try:
+            row_id = session.connection().execute(insert(model).returning(model.id), load_data(mutation)).scalar_one()
+        except IntegrityError as e:
+            raise name_taken(e)
+
+    if 'ref' in mutation:
+        refs[mutation['ref']] = (kind, row_id)
+    return row_id
+
+def name_taken(error):
+    # The only unique column an exercise create or update can hit
+    if integrity_conflict(error) != 'duplicate':
+        raise error
+    return invalid("Exercise name already exists.", 'data', 'name')
+
+def update_row(mutation, refs, session):
+    kind = mutation['type']
+    model = SYNC_TYPES[kind]
+    id = resolve(mutation['id'], kind, refs, 'id')
+    exists(model, id, session)
+    row = load_data(mutation, partial=True)
+    if not row:
+        raise invalid("Nothing to update.", 'data')
+
+    # Changes that move a row's contribution to the summaries: take it out, update, fold it back in
+    criteria = None
+    if kind == 'workout_exercise':
+        criteria = WorkoutExercise.id == id
+    elif kind == 'workout' and 'date' in row:
+        criteria = WorkoutExercise.workout_id == id
+    stale_records = remove_links(criteria, session) if criteria is not None else []
+
+    try:
+        session.execute(update(model).where(model.id == id).values(row).execution_options(synchronize_session=False))
+    except IntegrityError as e:
+        raise name_taken(e)
+    if kind == 'workout_exercise':
+        metrics = session.execute(select(*(getattr(WorkoutExercise, name) for name in METRICS)).where(criteria)).one()
+        if not any(metrics):
+            raise invalid(NO_METRICS, 'data', '_schema')
+    if criteria is not None:
+        add_links(criteria, session)
+        refresh_records(stale_records, session)
+    return id
+
+def delete_mutation(mutation, refs, session):
+    kind = mutation['type']
+    model = SYNC_TYPES[kind]
+    id = resolve(mutation['id'], kind, refs, 'id')
+    exists(model, id, session)
+    if kind == 'workout_exercise':
+        delete_links(WorkoutExercise.id, id, session)
+        return id
+    delete_links(WorkoutExercise.workout_id if kind == 'workout' else WorkoutExercise.exercise_id, id, session)
+    delete_row(model, id, session)
+    return id
+
+APPLY = {'create': create, 'update': update_row, 'delete': delete_mutation}
@@ -0,0 +1,152 @@
+import calendar
+from datetime import date, timedelta
+
+import click
+from flask.cli import AppGroup
+from marshmallow import ValidationError
+from sqlalchemy import delete, func, insert, null, select, union, union_all
+
+from models import db, CATEGORY_VOLUME, DailyCategoryVolume, DailyWorkoutTotals, Exercise, Workout, WorkoutExercise
+from stats import week_start
+
+# Default span when ?from= is left out: a year-long heatmap ending at ?to=
+DEFAULT_TIMELINE_DAYS = 365
+MAX_TIMELINE_DAYS = 10 * 366
+
+WORKOUT_TOTALS = ('workout_count', 'duration_minutes')
+
+def bucket_range(bucket, from_date, to_date):
+    """Widen [from_date, to_date] to whole buckets so the first and last aren't partial"""
+    if bucket == 'week':
+        return from_date - timedelta(days=from_date.weekday()), to_date + timedelta(days=6 - to_date.weekday())
+    if bucket == 'month':
+        last_day = calendar.monthrange(to_date.year, to_date.month)[1]
+        return from_date.replace(day=1), to_date.replace(day=last_day)
+    return from_date, to_date
+
+def bucket_start(bucket, column):
+    if bucket == 'week':
+        return week_start(column)
+    if bucket == 'month':
+        return func.date(column, 'start of month', type_=db.Date)
+    return column
+
+def timeline(params, session=None):
+    """Workout and per-category exercise totals per day, week or month, oldest first.
+
+    `params` is loaded TimelineSchema data. Both rollup tables are read with
+    one statement: a primary key range scan each, grouped into buckets.
+    Only buckets with workouts are returned.
+    """
+    session = session or db.session
+    bucket = params['bucket']
+    to_date = params.get('to_date') or date.today()
+    from_date = params.get('from_date') or to_date - timedelta(days=DEFAULT_TIMELINE_DAYS - 1)
+    if from_date > to_date:
+        raise ValidationError({"from": ["'from' must not be after 'to'."]})
+    if (to_date - from_date).days >= MAX_TIMELINE_DAYS:
+        raise ValidationError({"from": [f"The range can cover at most {MAX_TIMELINE_DAYS} days."]})
+    first, last = bucket_range(bucket, from_date, to_date)
+
+    start = bucket_start(bucket, DailyWorkoutTotals.day).label('start')
+    workouts = (
+        select(
+            start,
+            null().label('category'),
+            *(func.sum(getattr(DailyWorkoutTotals, name)).label(name) for name in WORKOUT_TOTALS),
+            *(null().label(name) for name in CATEGORY_VOLUME),
+        )
+        .where(DailyWorkoutTotals.day.between(first, last))
+        .group_by(start)
+    )
+    start = bucket_start(bucket, DailyCategoryVolume.day).label('start')
+    volume = (
+        select(
+            start,
+            DailyCategoryVolume.category,
+            *(null().label(name) for name in WORKOUT_TOTALS),
+            *(func.sum(getattr(DailyCategoryVolume, name)).label(name) for name in CATEGORY_VOLUME),
+        )
+        .where(DailyCategoryVolume.day.between(first, last))
+        .group_by(start, DailyCategoryVolume.category)
+    )
+    rows = union_all(workouts, volume).subquery()
+    statement = select(rows).order_by(rows.c.start, rows.c.category.is_not(None), rows.c.category)
+
+    buckets = {}
+    for row in session.execute(statement):
+        if row.category is None:
+            buckets[row.start] = {'start': row.start, **{name: getattr(row, name) for name in WORKOUT_TOTALS},
+                                  'categories': {}}
+        elif row.start in buckets:
+            buckets[row.start]['categories'][row.category] = {name: getattr(row, name) for name in CATEGORY_VOLUME}
+    return list(buckets.values())
+
+def workout_totals():
+    """Per-day workout totals computed from the workouts table"""
+    return (
+        select(
+            Workout.date.label('day'),
+            func.count().label('workout_count'),
+            func.sum(Workout.duration_minutes).label('duration_minutes'),
+        )
+        .where(Workout.date.is_not(None))
+        .group_by(Workout.date)
+    )
+
+def category_totals():
+    """Per-day, per-category workout_exercise totals computed from the base tables"""
+    values = {
+        'exercise_count': func.count(),
+        'total_sets': func.sum(func.coalesce(WorkoutExercise.sets, 0)),
+        'total_reps': func.sum(func.coalesce(WorkoutExercise.reps, 0)),
+        'total_volume': func.sum(func.coalesce(WorkoutExercise.reps * WorkoutExercise.sets, 0)),
+        'total_duration_seconds': func.sum(func.coalesce(WorkoutExercise.duration_seconds, 0)),
+    }
+    return (
+        select(Workout.date.label('day'), Exercise.category, *(value.label(name) for name, value in values.items()))
+        .join(WorkoutExercise.workout)
+        .join(WorkoutExercise.exercise)
+        .where(Workout.date.is_not(None))
+        .group_by(Workout.date, Exercise.category)
+    )
+
+def rebuild(session=None):
+    """Recompute both rollup tables from scratch on a session or connection; the caller commits"""
+    session = session or db.session
+    for model, totals in ((DailyWorkoutTotals, workout_totals()), (DailyCategoryVolume, category_totals())):
+        session.execute(delete(model).execution_options(synchronize_session=False))
+        session.execute(insert(model).from_select([column.name for column in totals.selected_columns], totals))
+
+def drift():
+    """Count stored rollup rows that differ from a fresh computation, per table"""
+    def mismatched(model, computed):
+        stored = select(*(getattr(model, column.name) for column in computed.selected_columns))
+        only_stored, only_computed = stored.except_(computed).subquery(), computed.except_(stored).subquery()
+        # Compare on the primary key, so a row that differs counts once
+        width = len(model.__table__.primary_key)
+        keys = union(select(*list(only_stored.c)[:width]), select(*list(only_computed.c)[:width])).subquery()
+        return db.session.scalar(select(func.count()).select_from(keys))
+
+    return {
+        'daily_workout_totals': mismatched(DailyWorkoutTotals, workout_totals()),
+        'daily_category_volume': mismatched(DailyCategoryVolume, category_totals()),
+    }
+
+timeline_cli = AppGroup('timeline', help='Maintain the calendar rollup tables behind GET /stats/timeline.')
+
+@timeline_cli.command('rebuild')
+@click.option('--check', is_flag=True, help='Only compare the stored tables with a fresh computation.')
+def rebuild_command(check):
+    """Backfill the daily rollups from workouts and workout_exercises and verify them."""
+    before = drift()
+    click.echo(', '.join(f'{table}: {count} rows differ' for table, count in before.items()))
+    if check:
+        raise SystemExit(1 if any(before.values()) else 0)
+
+    rebuild()
+    db.session.commit()
+    after = drift()
+    if any(after.values()):
+        raise click.ClickException(f'Rebuilt rollups still differ from a fresh computation: {after}')
+    click.echo('Rebuilt and verified daily_workout_totals and daily_category_volume.')
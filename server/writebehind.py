@@ -0,0 +1,284 @@
+import atexit
+import queue
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Exercise, LinkReceipt, Workout, WorkoutExercise
+from schemas import workout_exercise_schema, workout_exercises_schema
+from bulk import bulk_insert
+from cache import response_cache
+from links import DUPLICATE, create_link
+from summaries import add_links
+from jobs import utcnow
+
+NOT_FOUND = "Workout or exercise not found"
+# Decided receipts are kept this long, then pruned by a later group commit
+RECEIPT_RETENTION = timedelta(days=1)
+# How long the writer waits before retrying receipts it could not store, in seconds
+RETRY_SECONDS = 1.0
+
+# Queued after the last link by close(): the writer flushes everything before it and exits
+STOP = object()
+
+WRITERS_LOCK = threading.Lock()
+
+class QueueFull(Exception):
+    """The write-behind queue can't take another link right now"""
+
+class LinkWriter:
+    """Write-behind queue for POST .../workout_exercises?mode=async.
+
+    Requests validate the body, queue the row and return a receipt without
+    touching the database. One writer thread per process takes links off the
+    queue and commits them in groups: up to batch_size links, or whatever
+    arrived within flush_seconds of the first. A burst then costs one
+    transaction, and one wait for SQLite's writer lock, per group instead of
+    per link. Missing parents and duplicates are found with set-based
+    lookups per group and reported on the receipt.
+
+    Each group's receipts are stored in link_receipts in the same commit, so
+    any worker process can report them once the group is decided; until
+    then only the accepting process knows the receipt. Receipts decided
+    outside a group commit (links retried one by one, or a group whose
+    commit failed) are stored in a commit of their own, retried every
+    RETRY_SECONDS while it fails; the accepting process answers them from
+    memory meanwhile. Memory is bounded: at most max_pending links wait
+    (enqueue() raises QueueFull beyond that), and as many receipts wait to
+    be stored.
+    close() stops taking links and returns once everything already queued
+    is committed.
+    """
+
+    def __init__(self, app, max_pending=10000, batch_size=500, flush_seconds=0.02):
+        self.app = app
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self._queue = queue.Queue(maxsize=max_pending)
+        # Receipts not yet stored in link_receipts, by id; stored ones are read from there
+        self._receipts = {}
+        # (receipt, link, error) decided outside a group commit or whose commit failed, to store
+        self._unstored = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        self.written = self.failed = self.commits = 0
+
+    def enqueue(self, workout_id, exercise_id, row):
+        """Queue one validated link and return its receipt; raise QueueFull if it can't be taken"""
+        receipt = {"id": uuid.uuid4().hex, "status": "queued", "workout_id": workout_id,
+                   "exercise_id": exercise_id, "workout_exercise": None, "error": None}
+        with self._lock:
+            if self._closed:
+                raise QueueFull("Write-behind queue is shutting down")
+            try:
+                self._queue.put_nowait((receipt, workout_id, exercise_id, row))
+            except queue.Full:
+                raise QueueFull("Write-behind queue is full") from None
+            self._receipts[receipt["id"]] = receipt
+            if self._thread is None:
+                # Started on the first link, so it runs in the worker process that serves it
+                self._thread = threading.Thread(target=self._run, name='link-writer', daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+        return dict(receipt)
+
+    def get(self, receipt_id):
+        """A receipt this process accepted and has not stored yet"""
+        receipt = self._receipts.get(receipt_id)
+        return dict(receipt) if receipt else None
+
+    def join(self):
+        """Block until every link queued so far is committed or failed (used by tests)"""
+        self._queue.join()
+
+    def close(self, timeout=None):
+        """Stop taking links and wait for the queued ones to be written"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            if self._thread is None:
+                return
+            # Blocks only while the queue is full, and the writer is emptying it
+            self._queue.put(STOP)
+        self._thread.join(timeout)
+
+    def stats(self):
+        return {"pending": self._queue.qsize(), "written": self.written, "failed": self.failed, "commits": self.commits}
+
+    def _run(self):
+        stop = False
+        while not stop:
+            batch, stop = self._next_batch()
+            try:
+                if batch:
+                    with self.app.app_context():
+                        self._write(batch)
+            except Exception as e:
+                # Keep the writer alive; only this group's unfinished links fail
+                for receipt, *_ in batch:
+                    if receipt["status"] == "queued":
+                        receipt.update(status="failed", error=str(e))
+                        self._unstored.append((receipt, None, str(e)))
+                        self.failed += 1
+            if self._unstored:
+                with self.app.app_context():
+                    self._store_unstored(db.session)
+            for _ in range(len(batch) + stop):
+                self._queue.task_done()
+
+    def _next_batch(self):
+        """Up to batch_size links, waiting at most flush_seconds after the first; and whether to stop"""
+        try:
+            # With receipts left to store, wake up to retry them even if no link arrives
+            item = self._queue.get(timeout=RETRY_SECONDS if self._unstored else None)
+        except queue.Empty:
+            return [], False
+        if item is STOP:
+            return [], True
+        batch, deadline = [item], time.monotonic() + self.flush_seconds
+        while len(batch) < self.batch_size:
+            try:
+                item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            if item is STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _write(self, batch):
+        session = db.session
+        stored = False
+        try:
+            try:
+                results = self._insert_batch(batch, session)
+                store_receipts(results, session)
+                session.commit()
+                self.commits += 1
+                stored = True
+            except IntegrityError:
+                # Another process added a link or deleted a parent since the lookups
+                session.rollback()
+                results = self._insert_each(batch, session)
+        except Exception as e:
+            session.rollback()
+            results = [(receipt, None, str(e)) for receipt, *_ in batch]
+
+        for receipt, link, error in results:
+            receipt.update(workout_exercise=link, error=error, status='failed' if error else 'done')
+            if stored:
+                self._receipts.pop(receipt["id"], None)
+        if not stored:
+            # Stored by _run, in their own commit; get() answers them from memory until then
+            self._unstored.extend(results)
+        created = [link for _, link, _ in results if link]
+        self.written += len(created)
+        self.failed += len(results) - len(created)
+        if created:
+            response_cache.invalidate('workouts', 'stats')
+            response_cache.invalidate_many('workout', {link['workout_id'] for link in created}, group='workout-details')
+            response_cache.invalidate_many('exercise', {link['exercise_id'] for link in created}, group='exercise-details')
+
+    def _store_unstored(self, session):
+        """Store the receipts no group commit stored; on failure keep them for the next try"""
+        try:
+            store_receipts(self._unstored, session)
+            session.commit()
+        except Exception:
+            session.rollback()
+            # Bounded like the queue: past that the oldest receipts are dropped and answer 404
+            while len(self._unstored) > self._queue.maxsize:
+                self._receipts.pop(self._unstored.pop(0)[0]["id"], None)
+            return
+        for receipt, *_ in self._unstored:
+            self._receipts.pop(receipt["id"], None)
+        self._unstored = []
+
+    def _insert_batch(self, batch, session):
+        """Insert the group with one executemany INSERT and one pass over the summaries; caller commits"""
+        workout_ids = {workout_id for _, workout_id, _, _ in batch}
+        exercise_ids = {exercise_id for _, _, exercise_id, _ in batch}
+        workouts = set(session.scalars(select(Workout.id).where(Workout.id.in_(workout_ids))))
+        exercises = set(session.scalars(select(Exercise.id).where(Exercise.id.in_(exercise_ids))))
+        linked = set(map(tuple, session.execute(
+            select(WorkoutExercise.workout_id, WorkoutExercise.exercise_id)
+            .where(WorkoutExercise.workout_id.in_(workouts), WorkoutExercise.exercise_id.in_(exercises))
+        )))
+
+        results, rows, accepted = [], [], []
+        for receipt, workout_id, exercise_id, row in batch:
+            if workout_id not in workouts or exercise_id not in exercises:
+                results.append((receipt, None, NOT_FOUND))
+            elif (workout_id, exercise_id) in linked:
+                results.append((receipt, None, DUPLICATE))
+            else:
+                linked.add((workout_id, exercise_id))
+                rows.append({**row, 'workout_id': workout_id, 'exercise_id': exercise_id})
+                accepted.append(receipt)
+
+        inserted = bulk_insert(WorkoutExercise, rows, session)
+        if inserted:
+            add_links(WorkoutExercise.id.in_([link.id for link in inserted]), session)
+        # Dumped before the commit expires them
+        results += [(receipt, link, None) for receipt, link in zip(accepted, workout_exercises_schema.dump(inserted))]
+        return results
+
+    def _insert_each(self, batch, session):
+        """One transaction per link, for a group that lost a race with another writer"""
+        results = []
+        for receipt, workout_id, exercise_id, row in batch:
+            try:
+                link, conflict = create_link(workout_id, exercise_id, row, session)
+                if conflict:
+                    results.append((receipt, None, NOT_FOUND if conflict == 'missing' else DUPLICATE))
+                    continue
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                results.append((receipt, None, str(e)))
+                continue
+            self.commits += 1
+            results.append((receipt, workout_exercise_schema.dump(link), None))
+        return results
+
+def store_receipts(results, session):
+    """Record decided links in link_receipts and prune expired ones; caller commits"""
+    now = utcnow()
+    session.execute(delete(LinkReceipt).where(LinkReceipt.created_at < now - RECEIPT_RETENTION))
+    session.execute(insert(LinkReceipt), [
+        {"id": receipt["id"], "status": 'failed' if error else 'done', "workout_id": receipt["workout_id"],
+         "exercise_id": receipt["exercise_id"], "workout_exercise_id": link["id"] if link else None,
+         "error": error, "created_at": now}
+        for receipt, link, error in results
+    ])
+
+def stored_receipt(receipt_id, session=None):
+    """A decided receipt from link_receipts, in the shape enqueue() returns, or None"""
+    session = session or db.session
+    row = session.get(LinkReceipt, receipt_id)
+    if row is None:
+        return None
+    link = session.get(WorkoutExercise, row.workout_exercise_id) if row.workout_exercise_id else None
+    return {"id": row.id, "status": row.status, "workout_id": row.workout_id, "exercise_id": row.exercise_id,
+            "workout_exercise": workout_exercise_schema.dump(link) if link else None, "error": row.error}
+
+def link_writer(app):
+    """The app's LinkWriter, created on first use from the WRITE_BEHIND_* settings"""
+    writer = app.extensions.get('link_writer')
+    if writer is None:
+        with WRITERS_LOCK:
+            writer = app.extensions.get('link_writer')
+            if writer is None:
+                writer = app.extensions['link_writer'] = LinkWriter(
+                    app,
+                    max_pending=app.config['WRITE_BEHIND_MAX_PENDING'],
+                    batch_size=app.config['WRITE_BEHIND_BATCH_SIZE'],
+                    flush_seconds=app.config['WRITE_BEHIND_FLUSH_MS'] / 1000,
+                )
+    return writer
@@ -0,0 +1,163 @@
+"""
+ASGI app tests: the async variant must answer exactly like the WSGI app.
+Run with: python -m pytest test_async.py
+"""
+
+import asyncio
+import json
+import threading
+
+from async_app import create_async_app
+from models import db
+
+# Replayed against both apps from empty databases; every response must match
+SCRIPT = [
+    ('POST', '/exercises', {"name": "Squat", "category": "Strength"}),
+    ('POST', '/exercises/bulk', [{"name": "Run", "category": "cardio"}, {"name": "Row", "category": "cardio"},
+                                 {"name": "Squat", "category": "strength"}]),
+    ('POST', '/exercises', {"name": "x", "category": "cardio"}),
+    ('POST', '/workouts', {"duration_minutes": 45, "date": "2024-03-01", "notes": "legs"}),
+    ('POST', '/workouts/bulk', [{"duration_minutes": 30, "date": "2024-03-02"}, {"duration_minutes": 1},
+                                {"duration_minutes": 60, "date": "2024-02-28"}]),
+    ('POST', '/workouts/1/exercises/1/workout_exercises', {"reps": 10, "sets": 5}),
+    ('POST', '/workouts/1/exercises/1/workout_exercises', {"reps": 12}),
+    ('POST', '/workouts/1/exercises/2/workout_exercises', {}),
+    ('POST', '/workouts/9/exercises/2/workout_exercises', {"reps": 1}),
+    ('POST', '/workouts/2/workout_exercises/bulk', [{"exercise_id": 1, "reps": 12, "sets": 3},
+                                                    {"exercise_id": 2, "duration_seconds": 900},
+                                                    {"exercise_id": 99, "reps": 1}]),
+    ('POST', '/workouts/3/workout_exercises/bulk', [{"exercise_id": 3, "reps": 20, "sets": 2}]),
+    ('GET', '/workouts?limit=2', None),
+    ('GET', '/workouts?limit=2&exercise_id=1&fields=id,date', None),
+    ('GET', '/workouts?from=tomorrow', None),
+    ('GET', '/workouts/1', None),
+    ('GET', '/workouts/2/summary', None),
+    ('GET', '/workouts/export', None),
+    ('GET', '/workouts/export?exercise_id=1&from=2024-03-01', None),
+    ('GET', '/workouts/export?min_duration=50&max_duration=10', None),
+    ('GET', '/exercises?limit=2', None),
+    ('GET', '/exercises?category=Cardio&limit=1', None),
+    ('GET', '/exercises?category=chess', None),
+    ('GET', '/exercises/1', None),
+    ('GET', '/exercises/stats?weeks=520', None),
+    ('GET', '/exercises/1/stats?weeks=520', None),
+    ('GET', '/exercises/1/records', None),
+    ('GET', '/workouts/1/suggestions?limit=2', None),
+    ('GET', '/stats/timeline?bucket=day&from=2024-01-01&to=2024-12-31', None),
+    ('GET', '/exercises/42/records', None),
+    ('GET', '/search?q=squ*&limit=1', None),
+    ('GET', '/search?q=legs', None),
+    ('GET', '/search?q=%22', None),
+    ('DELETE', '/workouts/2', None),
+    ('GET', '/exercises/1/records', None),
+    ('DELETE', '/exercises/3', None),
+    ('GET', '/workouts/3/summary', None),
+    ('DELETE', '/exercises/3', None),
+    # Without an Idempotency-Key header
+    ('POST', '/sync', {"mutations": [{"op": "delete", "type": "workout", "id": 1}]}),
+]
+
+def parse(body):
+    """JSON or NDJSON body; None for error pages, whose HTML differs between frameworks"""
+    lines = body.decode().splitlines()
+    try:
+        return [json.loads(line) for line in lines] if len(lines) > 1 else json.loads(lines[0])
+    except ValueError:
+        return None
+
+async def create_tables(app):
+    async with app.extensions['async_engine'].begin() as connection:
+        await connection.run_sync(db.metadata.create_all)
+
+def replay_async(script):
+    async def run():
+        app = create_async_app('testing')
+        await create_tables(app)
+        client = app.test_client()
+        responses = []
+        for method, url, body in script:
+            response = await client.open(url, method=method, json=body)
+            responses.append((response.status_code, response.headers.get('X-Next-Cursor'), parse(await response.get_data())))
+        return responses
+    return asyncio.run(run())
+
+def test_async_app_matches_wsgi(client):
+    """Test every route in the script returns the same status, cursor and body from both apps"""
+    expected = []
+    for method, url, body in SCRIPT:
+        response = client.open(url, method=method, json=body)
+        expected.append((response.status_code, response.headers.get('X-Next-Cursor'), parse(response.get_data())))
+
+    for (method, url, _), wsgi, asgi in zip(SCRIPT, expected, replay_async(SCRIPT)):
+        assert asgi == wsgi, f"{method} {url}"
+
+def test_async_delete_job():
+    """Test ?mode=async runs the batched delete on the event loop and reports it through /jobs"""
+    async def run():
+        app = create_async_app('testing')
+        await create_tables(app)
+        client = app.test_client()
+        await client.post('/exercises', json={"name": "Squat", "category": "strength"})
+        for _ in range(3):
+            workout = await (await client.post('/workouts', json={"duration_minutes": 30})).get_json()
+            await client.post(f"/workouts/{workout['id']}/exercises/1/workout_exercises", json={"reps": 5})
+
+        async with app.test_app():
+            response = await client.delete('/exercises/1?mode=async')
+            assert response.status_code == 202
+            assert (await response.get_json())['status'] == 'queued'
+            # Wait for the purge before polling: a poll during it would share the in-memory
+            # database's one connection with the purge and roll back its open batch
+            await asyncio.gather(*app.background_tasks)
+            job = await (await client.get(response.headers['Location'])).get_json()
+            assert job['status'] == 'done', job
+            assert job['progress'] == 3
+            assert (await client.get('/exercises/1')).status_code == 404
+            assert (await (await client.get('/workouts/1/summary')).get_json())['exercise_count'] == 0
+
+    asyncio.run(run())
+
+def test_async_sync():
+    """Test a POST /sync batch is applied once and shows up in the change feed"""
+    async def run():
+        app = create_async_app('testing')
+        await create_tables(app)
+        client = app.test_client()
+        batch = {"mutations": [
+            {"op": "create", "type": "exercise", "ref": "e", "data": {"name": "Squat", "category": "strength"}},
+            {"op": "create", "type": "workout", "ref": "w", "data": {"duration_minutes": 30}},
+            {"op": "create", "type": "workout_exercise", "data": {"workout_id": "w", "exercise_id": "e", "reps": 5}},
+        ]}
+        for replayed in (None, 'true'):
+            response = await client.post('/sync', json=batch, headers={'Idempotency-Key': 'k'})
+            assert response.status_code == 200
+            assert response.headers.get('Idempotent-Replayed') == replayed
+
+        page = await (await client.get('/sync')).get_json()
+        assert {name: len(rows) for name, rows in page['changes'].items()} == {
+            "exercises": 1, "workouts": 1, "workout_exercises": 1}
+        assert (await (await client.get('/workouts/1/summary')).get_json())['total_reps'] == 5
+
+    asyncio.run(run())
+
+def test_async_concurrent_suggestions():
+    """Test concurrent suggestion requests on one loop all finish"""
+    async def run():
+        app = create_async_app('testing')
+        await create_tables(app)
+        client = app.test_client()
+        for name in ('Squat', 'Run', 'Row'):
+            await client.post('/exercises', json={"name": name, "category": "strength"})
+        for workout_id in (1, 2):
+            await client.post('/workouts', json={"duration_minutes": 30})
+            for exercise_id in (1, 2, 3):
+                await client.post(f'/workouts/{workout_id}/exercises/{exercise_id}/workout_exercises', json={"reps": 5})
+        responses = await asyncio.gather(*(client.get(f'/workouts/{i % 2 + 1}/suggestions') for i in range(10)))
+        statuses.extend(response.status_code for response in responses)
+
+    # A deadlock would block the loop itself, so wait from another thread
+    statuses = []
+    thread = threading.Thread(target=asyncio.run, args=(run(),), daemon=True)
+    thread.start()
+    thread.join(30)
+    assert statuses == [200] * 10
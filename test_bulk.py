@@ -0,0 +1,81 @@
+"""
+Bulk create tests: valid items go in with one INSERT, invalid ones are
+reported by index and never inserted.
+Run with: python -m pytest test_bulk.py
+"""
+
+from bulk import MAX_BULK_ITEMS
+from models import Exercise, Workout, WorkoutExercise
+from test_queries import add_exercises, add_workouts
+
+def test_workouts_batch(client):
+    """Test a fully valid batch is created in order with 201"""
+    response = client.post('/workouts/bulk', json=[{"date": "2024-03-01", "duration_minutes": 30},
+                                                   {"duration_minutes": 45, "notes": "Intervals"}])
+    assert response.status_code == 201
+    assert response.json['errors'] == {}
+    assert [(row['id'], row['duration_minutes']) for row in response.json['created']] == [(1, 30), (2, 45)]
+    assert Workout.query.count() == 2
+
+def test_exercises_partial_batch(client):
+    """Test invalid items, including names taken before or earlier in the batch, come back by index"""
+    add_exercises(1)
+    response = client.post('/exercises/bulk', json=[
+        {"name": "Rowing", "category": "cardio"},
+        {"name": "Exercise 0", "category": "strength"},
+        {"name": "Rowing", "category": "cardio"},
+        {"name": "Chess", "category": "board games"},
+    ])
+    assert response.status_code == 207
+    assert [row['name'] for row in response.json['created']] == ["Rowing"]
+    assert response.json['errors'] == {
+        "1": {"name": ["Exercise name already exists."]},
+        "2": {"name": ["Exercise name already exists."]},
+        "3": {"category": ["Category must be one of: strength, cardio, flexibility, balance, sports"]},
+    }
+    assert Exercise.query.count() == 2
+
+def test_invalid_batch_inserts_nothing(client):
+    """Test a batch with no valid item is a 400 with every item's errors and no rows"""
+    response = client.post('/workouts/bulk', json=[{"duration_minutes": 2}, {"date": "2024-03-01"}])
+    assert response.status_code == 400
+    assert response.json == {"created": [], "errors": {
+        "0": {"duration_minutes": ["Workout duration must be between 5 and 600 minutes."]},
+        "1": {"duration_minutes": ["Missing data for required field."]},
+    }}
+    assert Workout.query.count() == 0
+
+def test_batch_size_limit(client):
+    """Test an empty body or one over MAX_BULK_ITEMS is rejected before anything is validated"""
+    response = client.post('/workouts/bulk', json=[{"duration_minutes": 30}] * (MAX_BULK_ITEMS + 1))
+    assert response.status_code == 400
+    assert response.json == {"errors": {"_schema": [f"At most {MAX_BULK_ITEMS} items can be created per request."]}}
+    assert client.post('/workouts/bulk', json=[]).json == {
+        "errors": {"_schema": ["Request body must be a non-empty JSON array."]}}
+    assert Workout.query.count() == 0
+
+def test_workout_exercises_checks(client):
+    """Test the set-based exercise, duplicate and metrics checks, and a 404 for an unknown workout"""
+    workout = add_workouts(1)[0]
+    exercises = add_exercises(2)
+    client.post(f'/workouts/{workout.id}/exercises/{exercises[0].id}/workout_exercises', json={"reps": 5})
+    response = client.post(f'/workouts/{workout.id}/workout_exercises/bulk', json=[
+        {"exercise_id": exercises[1].id, "reps": 10, "sets": 3},
+        {"exercise_id": 999, "reps": 10},
+        {"exercise_id": exercises[0].id, "reps": 10},
+        {"exercise_id": exercises[1].id, "sets": 1},
+        {"exercise_id": exercises[1].id},
+    ])
+    assert response.status_code == 207
+    assert [row['exercise_id'] for row in response.json['created']] == [exercises[1].id]
+    assert response.json['errors'] == {
+        "1": {"exercise_id": ["Exercise 999 not found"]},
+        "2": {"exercise_id": ["Exercise already added to this workout"]},
+        "3": {"exercise_id": ["Exercise already added to this workout"]},
+        "4": {"_schema": ["At least one of reps, sets, or duration_seconds must be provided"]},
+    }
+    assert WorkoutExercise.query.count() == 2
+    assert client.get(f'/workouts/{workout.id}/summary').json['total_reps'] == 15
+
+    response = client.post('/workouts/999/workout_exercises/bulk', json=[{"exercise_id": exercises[0].id, "reps": 1}])
+    assert response.status_code == 404
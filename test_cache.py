@@ -0,0 +1,95 @@
+"""
+Response cache tests: ETag/304 handling and invalidation from write handlers,
+including writes made by another process sharing the database.
+Run with: python -m pytest test_cache.py
+"""
+
+import os
+import subprocess
+import sys
+from datetime import date, timedelta
+
+import pytest
+
+from cache import CacheBackend, MemoryBackend
+from models import db, Exercise, Workout
+
+SERVER = os.path.join(os.path.dirname(__file__), 'server')
+
+def seed():
+    workout = Workout(date=date.today() - timedelta(days=1), duration_minutes=30)
+    exercise = Exercise(name="Push-ups", category="strength")
+    db.session.add_all([workout, exercise])
+    db.session.commit()
+    return workout.id, exercise.id
+
+def test_repeat_get_is_served_from_cache(client):
+    """Test a second identical GET is a cache hit with the same ETag"""
+    seed()
+    first = client.get('/workouts')
+    second = client.get('/workouts')
+    assert first.headers['X-Cache'] == 'MISS'
+    assert second.headers['X-Cache'] == 'HIT'
+    assert second.headers['ETag'] == first.headers['ETag']
+    assert second.json == first.json
+
+def test_if_none_match_returns_304(client):
+    """Test a matching If-None-Match gets 304 with an empty body"""
+    workout_id, _ = seed()
+    etag = client.get(f'/workouts/{workout_id}').headers['ETag']
+    response = client.get(f'/workouts/{workout_id}', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+
+def test_adding_exercise_invalidates_workout_and_exercise(client):
+    """Test POST workout_exercises invalidates both detail pages it changes"""
+    workout_id, exercise_id = seed()
+    workout_etag = client.get(f'/workouts/{workout_id}').headers['ETag']
+    exercise_etag = client.get(f'/exercises/{exercise_id}').headers['ETag']
+
+    response = client.post(f'/workouts/{workout_id}/exercises/{exercise_id}/workout_exercises', json={'reps': 10})
+    assert response.status_code == 201
+
+    workout = client.get(f'/workouts/{workout_id}', headers={'If-None-Match': workout_etag})
+    exercise = client.get(f'/exercises/{exercise_id}', headers={'If-None-Match': exercise_etag})
+    assert workout.status_code == 200 and len(workout.json['workout_exercises']) == 1
+    assert exercise.status_code == 200 and len(exercise.json['workout_exercises']) == 1
+
+def test_delete_exercise_invalidates_exercise_list(client):
+    """Test deleting an exercise drops it from cached exercise lists"""
+    _, exercise_id = seed()
+    assert len(client.get('/exercises').json) == 1
+    client.delete(f'/exercises/{exercise_id}')
+    response = client.get('/exercises')
+    assert response.headers['X-Cache'] == 'MISS'
+    assert response.json == []
+
+def test_incomplete_backend_fails_at_construction():
+    """Test a backend missing part of the interface cannot be instantiated"""
+    class GetOnly(CacheBackend):
+        def get(self, key):
+            return None
+
+    with pytest.raises(TypeError, match='incr'):
+        GetOnly()
+    assert isinstance(MemoryBackend(), CacheBackend)
+
+def test_write_in_another_process_invalidates(shared_app, tmp_path):
+    """Test a DELETE handled by another worker process makes this process's cached responses stale"""
+    seed()
+    client = shared_app.test_client()
+    client.get('/workouts/1')
+    assert client.get('/workouts/1').headers['X-Cache'] == 'HIT'
+    assert client.get('/workouts').headers['X-Cache'] == 'MISS'
+
+    result = subprocess.run([sys.executable, '-c', """
+from app import create_app
+print(create_app('production').test_client().delete('/workouts/1').status_code)
+"""], cwd=SERVER, capture_output=True, text=True,
+        env={**os.environ, 'DATABASE_URL': f"sqlite:///{tmp_path / 'shared.db'}"})
+    assert result.stdout.strip() == '200', result.stderr
+
+    assert client.get('/workouts/1').status_code == 404
+    response = client.get('/workouts')
+    assert response.headers['X-Cache'] == 'MISS'
+    assert response.json == []
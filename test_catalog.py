@@ -0,0 +1,75 @@
+"""
+Exercise catalog tests: GET /exercises from memory must match the SQL keyset
+page, and every write to exercises must reach the catalog.
+Run with: python -m pytest test_catalog.py
+"""
+
+import pytest
+from sqlalchemy import text
+from werkzeug.datastructures import MultiDict
+
+from catalog import app_catalog, exercise_page
+from cache import response_cache
+from models import db, Exercise
+from pagination import paginate
+from schemas import ExerciseSchema
+
+CATEGORIES = ['strength', 'cardio', 'flexibility']
+
+@pytest.fixture
+def exercises(app):
+    db.session.add_all(Exercise(name=f"Exercise {i}", category=CATEGORIES[i % 3], equipment_needed=i % 2 == 0)
+                       for i in range(25))
+    db.session.commit()
+
+@pytest.mark.parametrize('fast', [False, True])
+@pytest.mark.parametrize('args', [{}, {'limit': '4'}, {'limit': '3', 'fields': 'name,category'}, {'fields': 'id'}])
+def test_pages_match_sql(app, exercises, args, fast):
+    """Test every catalog page, with its cursor, equals the SQL keyset page"""
+    app.config['FAST_LIST_SERIALIZATION'] = fast
+    try:
+        catalog = app_catalog(app).current()
+        args = MultiDict(args)
+        while True:
+            with app.test_request_context(query_string=args):
+                expected = paginate(Exercise, ExerciseSchema, ('id',))
+            assert exercise_page(catalog, ExerciseSchema, args, {}, fast) == expected
+            if not expected[1]:
+                break
+            args['cursor'] = expected[1]
+    finally:
+        app.config['FAST_LIST_SERIALIZATION'] = False
+
+def test_category_filter(client, exercises):
+    """Test ?category= pages through one category in id order and rejects unknown ones"""
+    response = client.get('/exercises?category=Cardio&limit=5')
+    assert [row['id'] for row in response.json] == [2, 5, 8, 11, 14]
+    response = client.get(f"/exercises?category=cardio&limit=5&cursor={response.headers['X-Next-Cursor']}")
+    assert [row['id'] for row in response.json] == [17, 20, 23]
+    assert 'X-Next-Cursor' not in response.headers
+    assert client.get('/exercises?category=sports').json == []
+    assert client.get('/exercises?category=chess').status_code == 400
+
+def test_every_write_reaches_catalog(app, client, count_queries, exercises):
+    """Test the list costs one version read when nothing changed and reloads after any write"""
+    client.get('/exercises')
+    response, queries = count_queries('GET', '/exercises?limit=1')
+    assert queries == 1
+
+    catalog = app_catalog(app)
+    version = catalog.current().version
+    client.post('/exercises', json={"name": "Rowing", "category": "cardio"})
+    client.post('/exercises/bulk', json=[{"name": "Plank", "category": "balance"}])
+    client.delete('/exercises/1')
+    # A write that skips the API entirely, as another process or the CLI might
+    db.session.execute(text("UPDATE exercises SET category = 'sports' WHERE id = 2"))
+    db.session.execute(text("UPDATE exercises SET updated_at = NULL WHERE id = 3"))
+    db.session.commit()
+    assert catalog.current().version == version + 4
+
+    response_cache.clear()
+    listed = {row['id']: row for row in client.get('/exercises?limit=500').json}
+    assert 1 not in listed
+    assert listed[2]['category'] == 'sports'
+    assert {row['name'] for row in listed.values()} >= {"Rowing", "Plank"}
+    assert [row['id'] for row in client.get('/exercises?category=sports').json] == [2]
@@ -0,0 +1,75 @@
+"""
+Delete tests: set-based cascades and the background job mode.
+Run with: python -m pytest test_deletes.py
+"""
+
+import socket
+import subprocess
+import sys
+
+from sqlalchemy import update
+
+from jobs import INTERRUPTED, JobRegistry, jobs
+from models import db, Exercise, Job, Workout, WorkoutExercise
+from test_queries import add_exercises, add_workouts, link
+
+def test_delete_exercise_queries_constant(count_queries):
+    """Test DELETE /exercises/<id> runs the same statements for 1 or 50 linked workouts"""
+    small, large = add_exercises(2)
+    link(add_workouts(1), [small])
+    link(add_workouts(50), [large])
+
+    counts = []
+    for exercise in (small, large):
+        response, queries = count_queries('DELETE', f'/exercises/{exercise.id}')
+        assert response.status_code == 200
+        counts.append(queries)
+    assert counts[0] == counts[1]
+    assert WorkoutExercise.query.count() == 0
+
+def test_delete_workout_removes_links(client):
+    """Test DELETE /workouts/<id> removes its workout_exercises and leaves others alone"""
+    first, second = add_workouts(2)
+    link([first, second], add_exercises(3))
+    first_id = first.id
+
+    assert client.delete(f'/workouts/{first_id}').status_code == 200
+    assert db.session.get(Workout, first_id) is None
+    assert WorkoutExercise.query.filter_by(workout_id=first_id).count() == 0
+    assert WorkoutExercise.query.filter_by(workout_id=second.id).count() == 3
+
+def test_async_delete_exercise(client, monkeypatch):
+    """Test ?mode=async returns 202 with a job that deletes links in batches"""
+    import deletes
+    monkeypatch.setattr(deletes, 'DELETE_BATCH_SIZE', 7)
+    exercise = add_exercises(1)[0]
+    link(add_workouts(30), [exercise])
+    exercise_id = exercise.id
+
+    response = client.delete(f'/exercises/{exercise_id}?mode=async')
+    assert response.status_code == 202
+    assert response.headers['Location'] == f"/jobs/{response.json['id']}"
+
+    job = jobs.wait(response.json['id'], timeout=10)
+    assert job['status'] == 'done'
+    assert job['progress'] == 30
+    assert client.get(f"/jobs/{job['id']}").json['status'] == 'done'
+    db.session.expire_all()
+    assert db.session.get(Exercise, exercise_id) is None
+    assert WorkoutExercise.query.count() == 0
+
+def test_job_status_is_shared(app, client):
+    """Test any process can answer a poll, and a job whose process exited is reported as failed"""
+    job = jobs.create('delete_exercise')
+    # A registry of its own stands in for another worker process
+    assert JobRegistry().get(job['id']) == job
+    assert client.get(f"/jobs/{job['id']}").json == job
+
+    # Ended while its job was still running
+    exited = subprocess.Popen([sys.executable, '-c', 'pass'])
+    exited.wait()
+    db.session.execute(update(Job).where(Job.id == job['id'])
+                       .values(status='running', owner=f"{socket.gethostname()}:{exited.pid}"))
+    db.session.commit()
+    assert client.get(f"/jobs/{job['id']}").json == {**job, "status": "failed", "error": INTERRUPTED}
+    assert client.get('/jobs/unknown').status_code == 404
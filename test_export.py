@@ -0,0 +1,83 @@
+"""
+Streaming export tests: the NDJSON body of GET /workouts/export against the
+database rows, its ordering across batches, and the GET /workouts filters.
+Run with: python -m pytest test_export.py
+"""
+
+import json
+from datetime import date
+
+import pytest
+
+import app as app_module
+from models import db, Exercise, Workout, WorkoutExercise
+from schemas import workout_detail_schema
+
+@pytest.fixture
+def history(app):
+    """Eight workouts inserted out of date order, two sharing a date; squats in the odd ids, running in every third"""
+    squat = Exercise(name="Squat", category="strength")
+    run = Exercise(name="Running", category="cardio")
+    days = [5, 2, 8, 2, 1, 7, 3, 6]
+    workouts = [Workout(date=date(2024, 3, day), duration_minutes=day * 10, notes=f"day {day}") for day in days]
+    db.session.add_all([squat, run, *workouts])
+    db.session.flush()
+    for workout in workouts:
+        if workout.id % 2:
+            db.session.add(WorkoutExercise(workout_id=workout.id, exercise_id=squat.id, reps=5, sets=workout.id))
+        if workout.id % 3 == 0:
+            db.session.add(WorkoutExercise(workout_id=workout.id, exercise_id=run.id, duration_seconds=600))
+    db.session.commit()
+    return squat, run
+
+def export(client, query=''):
+    response = client.get(f'/workouts/export{query}')
+    assert response.status_code == 200, response.get_data(as_text=True)
+    assert response.is_streamed
+    assert response.mimetype == 'application/x-ndjson'
+    body = response.get_data(as_text=True)
+    response.close()
+    assert body == '' or body.endswith('\n')
+    return [json.loads(line) for line in body.splitlines()]
+
+def expected(*clauses):
+    """The rows the export should stream, dumped straight from the database"""
+    db.session.expire_all()
+    workouts = Workout.query.filter(*clauses).order_by(Workout.date, Workout.id).all()
+    return [workout_detail_schema.dump(workout) for workout in workouts]
+
+def test_export_matches_database(client, history):
+    """Test every workout is streamed once, by date then id, with its workout_exercises inline"""
+    rows = export(client)
+    assert rows == expected()
+    assert [(row['date'], row['id']) for row in rows] == sorted((row['date'], row['id']) for row in rows)
+    assert [row['id'] for row in rows if row['date'] == '2024-03-02'] == [2, 4]
+    by_id = {row['id']: row for row in rows}
+    assert [(link['exercise_id'], link['sets']) for link in by_id[3]['workout_exercises']] == [(1, 3), (2, None)]
+    assert by_id[4]['workout_exercises'] == []
+
+def test_export_order_across_batches(client, history, monkeypatch):
+    """Test batches smaller than the table still stream every row once and in order"""
+    monkeypatch.setattr(app_module, 'EXPORT_BATCH_SIZE', 3)
+    assert export(client) == expected()
+
+@pytest.mark.parametrize('query, clauses', [
+    ('?from=2024-03-03&to=2024-03-07', lambda squat, run: [Workout.date.between(date(2024, 3, 3), date(2024, 3, 7))]),
+    ('?min_duration=30&max_duration=60', lambda squat, run: [Workout.duration_minutes.between(30, 60)]),
+    ('?exercise_id=1', lambda squat, run: [Workout.id.in_([1, 3, 5, 7])]),
+    ('?category=Cardio&from=2024-03-02', lambda squat, run: [Workout.id.in_([3, 6]), Workout.date >= date(2024, 3, 2)]),
+    ('?limit=1&cursor=nonsense', lambda squat, run: []),
+])
+def test_export_filters(client, history, query, clauses):
+    """Test the GET /workouts filters narrow the export; pagination parameters are ignored"""
+    rows = export(client, query)
+    assert rows == expected(*clauses(*history))
+    assert rows
+
+def test_export_empty_and_invalid(client, history):
+    """Test a filter matching nothing streams an empty body and bad filters are rejected before streaming"""
+    assert export(client, '?from=2025-01-01') == []
+    response = client.get('/workouts/export?min_duration=50&max_duration=10')
+    assert response.status_code == 400
+    assert 'min_duration' in response.json['errors']
+    assert client.get('/workouts/export?category=chess').status_code == 400
@@ -0,0 +1,78 @@
+"""
+Workout filter tests: every GET /workouts filter, their validation, and
+filters combined with cursor pagination.
+Run with: python -m pytest test_filters.py
+"""
+
+from datetime import date
+
+import pytest
+
+from models import db, Exercise, Workout, WorkoutExercise
+
+@pytest.fixture
+def history(app):
+    """Ten workouts on 2024-03-01..10 lasting 10..100 minutes; squats in the even ones, running in every third"""
+    squat = Exercise(name="Squat", category="strength")
+    run = Exercise(name="Running", category="cardio")
+    workouts = [Workout(date=date(2024, 3, day), duration_minutes=day * 10) for day in range(1, 11)]
+    db.session.add_all([squat, run, *workouts])
+    db.session.flush()
+    for day, workout in enumerate(workouts, start=1):
+        if day % 2 == 0:
+            db.session.add(WorkoutExercise(workout_id=workout.id, exercise_id=squat.id, reps=5, sets=5))
+        if day % 3 == 0:
+            db.session.add(WorkoutExercise(workout_id=workout.id, exercise_id=run.id, duration_seconds=600))
+    db.session.commit()
+    return squat, run
+
+def days(client, query):
+    response = client.get(f'/workouts?{query}')
+    assert response.status_code == 200, response.json
+    return [int(row['date'][-2:]) for row in response.json]
+
+def test_date_bounds(client, history):
+    """Test from/to are inclusive and may be used alone"""
+    assert days(client, 'from=2024-03-04&to=2024-03-06') == [4, 5, 6]
+    assert days(client, 'from=2024-03-09') == [9, 10]
+    assert days(client, 'to=2024-03-02') == [1, 2]
+    assert days(client, 'from=2024-03-05&to=2024-03-05') == [5]
+
+def test_exercise_and_category(client, history):
+    """Test exercise_id and category match workouts containing it, once each, category case-insensitively"""
+    squat, run = history
+    assert days(client, f'exercise_id={squat.id}') == [2, 4, 6, 8, 10]
+    assert days(client, 'category=cardio') == [3, 6, 9]
+    assert days(client, 'category=CarDio') == [3, 6, 9]
+    assert days(client, 'category=flexibility') == []
+    assert days(client, f'exercise_id={squat.id}&category=cardio') == [6]
+
+def test_duration_range(client, history):
+    """Test min/max_duration are inclusive bounds"""
+    assert days(client, 'min_duration=30&max_duration=50') == [3, 4, 5]
+    assert days(client, 'min_duration=95') == [10]
+
+@pytest.mark.parametrize('query, errors', [
+    ('min_duration=50&max_duration=40', {"min_duration": ["min_duration must not be greater than max_duration."]}),
+    ('from=2024-03-05&to=2024-03-01', {"from": ["'from' must not be after 'to'."]}),
+    ('min_duration=long', {"min_duration": ["Not a valid integer."]}),
+    ('from=yesterday', {"from": ["Not a valid date."]}),
+    ('category=chess', {"category": ["Category must be one of: strength, cardio, flexibility, balance, sports"]}),
+])
+def test_invalid_filters(client, history, query, errors):
+    """Test bad values and inverted ranges are a 400 naming the parameter"""
+    response = client.get(f'/workouts?{query}')
+    assert response.status_code == 400
+    assert response.json == {"errors": errors}
+
+def test_filters_with_cursor(client, history):
+    """Test following the cursor keeps the filters and walks only matching workouts"""
+    query, seen = 'from=2024-03-02&max_duration=90&exercise_id=1&limit=2', []
+    url = f'/workouts?{query}'
+    while url:
+        response = client.get(url)
+        assert len(response.json) <= 2
+        seen += [int(row['date'][-2:]) for row in response.json]
+        cursor = response.headers.get('X-Next-Cursor')
+        url = f'/workouts?{query}&cursor={cursor}' if cursor else None
+    assert seen == [2, 4, 6, 8]
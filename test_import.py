@@ -0,0 +1,101 @@
+"""
+Import tests: `flask import-logs` must insert what the API would accept,
+keep summaries current, and write everything else to the rejects file.
+Run with: python -m pytest test_import.py
+"""
+
+import csv
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from models import Workout, WorkoutExercise
+from summaries import drift
+from test_queries import add_exercises
+
+SERVER = os.path.join(os.path.dirname(__file__), 'server')
+
+CSV_LOG = """\
+workout,date,duration_minutes,notes,exercise,reps,sets,duration_seconds,errors
+a,2024-03-01,45,Legs,Exercise 0,5,5,,
+a,2024-03-01,45,Legs,Exercise 1,8,3,,
+b,2024-03-02,30,,Exercise 2,,,600,
+c,2024-03-03,2,,Exercise 0,5,5,,
+d,2024-03-04,30,,Exercise 0,5,5,,
+d,2024-03-04,30,,Bowling,5,5,,
+d,2024-03-04,30,,Exercise 1,,,,
+e,2024-03-05,20,Rest day,,,,,
+"""
+
+def run(app, tmp_path, name, content, *args):
+    path = tmp_path / name
+    path.write_text(content)
+    result = app.test_cli_runner().invoke(args=['import-logs', str(path), *args])
+    assert result.exit_code == 0, result.output
+    return result.output
+
+@pytest.mark.parametrize('workers', ['0', '1'])
+def test_csv_import(app, client, tmp_path, workers):
+    """Test valid workouts land with their summaries and invalid ones go whole to the rejects file"""
+    add_exercises(3)
+    output = run(app, tmp_path, 'log.csv', CSV_LOG, '--workers', workers, '--chunk-size', '2', '--batch-size', '2')
+    assert "Imported 3 workouts" in output
+    assert "Wrote 4 rejected rows" in output
+
+    assert [(w.date.isoformat(), w.duration_minutes, w.notes) for w in Workout.query.order_by(Workout.id)] == [
+        ('2024-03-01', 45, "Legs"), ('2024-03-02', 30, None), ('2024-03-05', 20, "Rest day")]
+    assert WorkoutExercise.query.count() == 3
+    assert client.get('/workouts/1/summary').json['total_reps'] == 13
+    assert drift() == {'workout_summaries': 0, 'exercise_records': 0}
+
+    with open(tmp_path / 'log.rejected.csv', newline='') as file:
+        rejected = list(csv.DictReader(file))
+    assert [row['workout'] for row in rejected] == ['c', 'd', 'd', 'd']
+    assert [json.loads(row['errors']) for row in rejected] == [
+        {"duration_minutes": ["Workout duration must be between 5 and 600 minutes."]},
+        {"_workout": ["Rejected with the rest of its workout"]},
+        {"exercise": ["Unknown exercise 'Bowling'"]},
+        {"_schema": ["At least one of reps, sets, or duration_seconds must be provided"]},
+    ]
+
+def test_jsonl_import(app, tmp_path):
+    """Test JSON Lines input, and that a fixed rejects file imports again as is"""
+    add_exercises(2)
+    lines = [
+        {"date": "2024-03-01", "duration_minutes": 45, "exercises": [{"exercise": "Exercise 0", "reps": 5}]},
+        {"duration_minutes": 30, "exercises": [{"exercise": "Exercise 1", "sets": 3}, {"exercise": "Exercise 1", "sets": 1}]},
+    ]
+    content = "\n".join(json.dumps(line) for line in lines) + "\nnot json\n"
+    output = run(app, tmp_path, 'log.jsonl', content, '--workers', '0')
+    assert "Imported 1 workouts" in output
+
+    with open(tmp_path / 'log.rejected.jsonl') as file:
+        rejected = [json.loads(line) for line in file]
+    assert rejected[0]['errors'] == {"exercises": {"1": {"exercise": ["Exercise already added to this workout"]}}}
+    assert rejected[1] == {"line": "not json", "errors": {"workout": {"_schema": ["Invalid input type."]}}}
+
+    rejected[0]['exercises'].pop()
+    output = run(app, tmp_path, 'fixed.jsonl', json.dumps(rejected[0]) + "\n", '--workers', '0')
+    assert "Imported 1 workouts" in output
+    assert [link.sets for link in WorkoutExercise.query.order_by(WorkoutExercise.id)] == [None, 3]
+
+def test_import_invalidates_running_servers(shared_app, tmp_path):
+    """Test an import run from the command line makes a server process's cached responses stale"""
+    add_exercises(3)
+    client = shared_app.test_client()
+    client.get('/workouts')
+    assert client.get('/workouts').headers['X-Cache'] == 'HIT'
+
+    path = tmp_path / 'log.csv'
+    path.write_text(CSV_LOG)
+    result = subprocess.run(['flask', 'import-logs', str(path), '--workers', '0'], cwd=SERVER, capture_output=True,
+                            text=True, env={**os.environ, 'FLASK_APP': 'app:create_app', 'APP_CONFIG': 'production',
+                                            'DATABASE_URL': f"sqlite:///{tmp_path / 'shared.db'}"})
+    assert "Imported 3 workouts" in result.stdout, result.stderr
+
+    response = client.get('/workouts')
+    assert response.headers['X-Cache'] == 'MISS'
+    assert len(response.json) == 3
@@ -0,0 +1,66 @@
+"""
+Workout-exercise create path tests: the precompiled loader must match the schema,
+and constraint failures must give the same responses as the old lookups.
+Run with: python -m pytest test_links.py
+"""
+
+import pytest
+from marshmallow import ValidationError
+
+from links import link_loader
+from schemas import workout_exercise_metrics_schema
+from test_queries import add_exercises, add_workouts
+
+BODIES = [
+    {}, {"reps": 10}, {"reps": 10, "sets": 3, "duration_seconds": 60}, {"reps": None, "sets": 2},
+    {"reps": "12"}, {"reps": 7.9}, {"reps": "7.9"}, {"reps": True}, {"sets": False}, {"reps": 0},
+    {"reps": -3}, {"reps": "abc"}, {"reps": [1]}, {"reps": {"n": 1}}, {"reps": float('inf')},
+    {"reps": float('nan')}, {"reps": 10**30}, {"reps": 5, "weight": 80}, {"id": 9, "reps": 1},
+    {"reps": 0, "sets": "x", "duration_seconds": None, "extra": 1}, [], [{"reps": 1}], "reps", None, 5,
+]
+
+def load(loader, body):
+    try:
+        return 'ok', loader(body)
+    except ValidationError as e:
+        return 'error', e.messages
+
+@pytest.mark.parametrize('body', BODIES, ids=repr)
+def test_loader_matches_schema(body):
+    """Test the precompiled loader accepts, coerces and rejects like the schema"""
+    assert load(link_loader().load, body) == load(workout_exercise_metrics_schema.load, body)
+
+def test_create_link_responses(client):
+    """Test a new link is returned in full and constraint failures map to 404 and 400"""
+    workout = add_workouts(1)[0]
+    exercise = add_exercises(1)[0]
+    url = f'/workouts/{workout.id}/exercises/{exercise.id}/workout_exercises'
+
+    response = client.post(url, json={"reps": "10", "workout_id": 999})
+    assert response.status_code == 201
+    assert response.json == {"id": 1, "workout_id": workout.id, "exercise_id": exercise.id,
+                             "reps": 10, "sets": None, "duration_seconds": None}
+
+    assert client.post(url, json={"reps": 5}).json == {"error": "Exercise already added to this workout"}
+    assert client.post(f'/workouts/999/exercises/{exercise.id}/workout_exercises', json={"reps": 5}).status_code == 404
+    assert client.post(f'/workouts/{workout.id}/exercises/999/workout_exercises', json={"reps": 5}).status_code == 404
+    assert client.get(f'/workouts/{workout.id}/summary').json['total_reps'] == 10
+
+    # A missing parent or duplicate is still reported before a bad body
+    assert client.post('/workouts/999/exercises/1/workout_exercises', json={}).status_code == 404
+    assert client.post(url, json={"reps": -1}).json == {"error": "Exercise already added to this workout"}
+
+    other = add_exercises(1, offset=1)[0]
+    url = f'/workouts/{workout.id}/exercises/{other.id}/workout_exercises'
+    assert client.post(url, json={}).json == {"error": "At least one of reps, sets, or duration_seconds must be provided"}
+    assert client.post(url, json={"reps": -1}).json == {"errors": {"reps": ["Value must be a positive number."]}}
+    assert client.post(url, json=[1]).json == {"errors": {"_schema": ["Invalid input type."]}}
+
+def test_create_link_statements(count_queries):
+    """Test a new link costs the INSERT plus the two summary upserts, with no lookups first"""
+    workout = add_workouts(1)[0]
+    exercise = add_exercises(1)[0]
+    response, queries = count_queries('POST', f'/workouts/{workout.id}/exercises/{exercise.id}/workout_exercises',
+                                      json={"reps": 10, "sets": 3})
+    assert response.status_code == 201
+    assert queries == 3
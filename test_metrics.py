@@ -0,0 +1,86 @@
+"""
+Metrics tests: the Server-Timing header, /metrics totals (streamed bodies
+and other worker processes included) and the slow query log.
+Run with: python -m pytest test_metrics.py
+"""
+
+import re
+
+import pytest
+
+from cache import response_cache
+from metrics import Metrics, metrics
+from test_queries import add_workouts
+
+@pytest.fixture
+def fresh_metrics(app):
+    metrics.reset()
+    yield metrics
+    metrics.reset()
+
+def sample(body, name, **labels):
+    """The value of one series in Prometheus text, or None"""
+    selector = ','.join(f'{key}="{value}"' for key, value in labels.items())
+    series = f'{name}{{{selector}}}' if labels else name
+    match = re.search(rf'^{re.escape(series)} (\S+)$', body, re.M)
+    return float(match.group(1)) if match else None
+
+def test_server_timing(client, fresh_metrics):
+    """Test every response reports its total, SQL and serialization time"""
+    add_workouts(3)
+    response = client.get('/workouts')
+    assert re.fullmatch(r'app;dur=[\d.]+, db;dur=[\d.]+;desc="[1-9]\d* queries", serialize;dur=[\d.]+',
+                        response.headers['Server-Timing'])
+
+def test_metrics_totals(client, fresh_metrics):
+    """Test /metrics counts requests per route and status, their queries, and the process counters"""
+    add_workouts(3)
+    client.get('/workouts')
+    client.get('/workouts')
+    # Error pages are streamed by werkzeug too: like a server, close them so they are recorded
+    client.get('/workouts/999').close()
+    body = client.get('/metrics').text
+    assert sample(body, 'http_request_duration_seconds_count', method='GET', route='/workouts', status='200') == 2
+    assert sample(body, 'http_request_duration_seconds_bucket', method='GET', route='/workouts', status='200', le='+Inf') == 2
+    assert sample(body, 'http_request_duration_seconds_count', method='GET', route='/workouts/<int:id>', status='404') == 1
+    assert sample(body, 'db_queries_total', method='GET', route='/workouts') >= 1
+    assert sample(body, 'response_cache_hits_total') == response_cache.stats()['hits']
+    assert sample(body, 'write_behind_links_written_total') == 0
+
+def test_streamed_body_is_counted(client, fresh_metrics):
+    """Test queries run by a streamed body count once the body is closed"""
+    add_workouts(3)
+    response = client.get('/workouts/export')
+    assert len(response.get_data().splitlines()) == 3
+    assert sample(client.get('/metrics').text, 'db_queries_total', method='GET', route='/workouts/export') is None
+    response.close()
+    body = client.get('/metrics').text
+    assert sample(body, 'http_request_duration_seconds_count', method='GET', route='/workouts/export', status='200') == 1
+    assert sample(body, 'db_queries_total', method='GET', route='/workouts/export') >= 1
+
+def test_totals_of_every_worker(client, fresh_metrics, tmp_path, monkeypatch):
+    """Test /metrics sums the totals every process sharing METRICS_DIR wrote, whichever answers"""
+    monkeypatch.setattr(metrics, 'metrics_dir', None)
+    metrics.set_metrics_dir(str(tmp_path))
+    other = Metrics()
+    other.counters = lambda: [('response_cache_hits_total', 'Responses served from the response cache', 5)]
+    other.set_metrics_dir(str(tmp_path))
+    other._record(('GET', '/workouts', '200'), {'start': 0, 'queries': 4, 'sql': 0.5, 'serialize': 0.25})
+    other.flush()
+
+    add_workouts(1)
+    client.get('/workouts')
+    body = client.get('/metrics').text
+    assert len(list(tmp_path.iterdir())) == 2
+    assert sample(body, 'http_request_duration_seconds_count', method='GET', route='/workouts', status='200') == 2
+    assert sample(body, 'db_queries_total', method='GET', route='/workouts') >= 5
+    assert sample(body, 'response_cache_hits_total') == response_cache.stats()['hits'] + 5
+
+def test_slow_query_log(client, fresh_metrics, caplog, monkeypatch):
+    """Test statements over the threshold are logged with the route and their query plan"""
+    add_workouts(1)
+    monkeypatch.setattr(metrics, 'slow_query_threshold', 0)
+    with caplog.at_level('WARNING', logger='slow_query'):
+        client.get('/workouts?limit=5')
+    messages = [record.getMessage() for record in caplog.records if record.name == 'slow_query']
+    assert any('/workouts\n  SELECT' in message and 'plan: ' in message for message in messages)
@@ -0,0 +1,72 @@
+"""
+Pagination tests: keyset cursors must walk every row exactly once, and
+?limit=, ?fields= and ?cursor= must be validated.
+Run with: python -m pytest test_pagination.py
+"""
+
+from datetime import date
+
+import pytest
+from marshmallow import ValidationError
+from werkzeug.datastructures import MultiDict
+
+from models import db, Workout
+from pagination import MAX_LIMIT, build_page, encode_cursor
+from schemas import WorkoutSchema
+
+DATES = [date(2024, 3, 2), date(2024, 3, 1), date(2024, 3, 2), date(2024, 3, 3), date(2024, 3, 1)]
+
+@pytest.fixture
+def workouts(app):
+    db.session.add_all(Workout(date=day, duration_minutes=30 + i, notes=f"Workout {i}") for i, day in enumerate(DATES))
+    db.session.commit()
+
+def walk(client, url):
+    pages = []
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        pages.append(response.json)
+        cursor = response.headers.get('X-Next-Cursor')
+        url = response.headers['Link'][1:response.headers['Link'].index('>')] if cursor else None
+    return pages
+
+@pytest.mark.parametrize('limit', [1, 2, 4, 5])
+def test_cursor_walks_every_row_once(client, workouts, limit):
+    """Test following the cursors pages through (date, id) order, ties on date included"""
+    pages = walk(client, f'/workouts?limit={limit}')
+    assert all(len(page) == limit for page in pages[:-1])
+    assert [(row['date'], row['id']) for page in pages for row in page] == [
+        ('2024-03-01', 2), ('2024-03-01', 5), ('2024-03-02', 1), ('2024-03-02', 3), ('2024-03-03', 4)]
+
+def test_fields_projection(client, workouts):
+    """Test ?fields= returns only the requested fields and still pages on the keys it leaves out"""
+    pages = walk(client, '/workouts?limit=2&fields=notes,%20duration_minutes')
+    assert pages[0] == [{"notes": "Workout 1", "duration_minutes": 31}, {"notes": "Workout 4", "duration_minutes": 34}]
+    assert sum(len(page) for page in pages) == 5
+    assert client.get('/workouts?fields=notes,password').json == {"errors": {"fields": ["Unknown field(s): password"]}}
+
+def test_limit_bounds(client, app):
+    """Test ?limit= must be a positive integer and is clamped to MAX_LIMIT"""
+    assert client.get('/workouts?limit=0').json == {"errors": {"limit": ["Limit must be at least 1."]}}
+    assert client.get('/workouts?limit=ten').json == {"errors": {"limit": ["Limit must be an integer."]}}
+    db.session.add_all(Workout(date=date(2024, 1, 1), duration_minutes=30) for _ in range(MAX_LIMIT + 1))
+    db.session.commit()
+    response = client.get(f'/workouts?limit={MAX_LIMIT * 2}')
+    assert len(response.json) == MAX_LIMIT
+    assert 'X-Next-Cursor' in response.headers
+
+@pytest.mark.parametrize('cursor', ['not-a-cursor', encode_cursor(['2024-03-01']), encode_cursor([None, 1]),
+                                    encode_cursor(['yesterday', 1])])
+def test_invalid_cursor(client, workouts, cursor):
+    """Test malformed cursors, including ones with a NULL key, are a 400 rather than a 500"""
+    response = client.get(f'/workouts?cursor={cursor}')
+    assert response.status_code == 400
+    assert response.json == {"errors": {"cursor": ["Invalid cursor."]}}
+
+def test_keys_must_be_not_null(app):
+    """Test a keyset on a nullable column is refused, since NULL keys never compare past a cursor"""
+    with pytest.raises(ValueError, match='notes'):
+        build_page(Workout, WorkoutSchema, ('notes', 'id'), MultiDict())
+    with pytest.raises(ValidationError):
+        WorkoutSchema(load_instance=False).load({"date": None, "duration_minutes": 30})
@@ -0,0 +1,71 @@
+"""
+Query-count tests: a route's number of SQL statements must not grow with the
+number of rows it returns. Run with: python -m pytest test_queries.py
+"""
+
+from datetime import date, timedelta
+
+from models import db, Exercise, Workout, WorkoutExercise
+
+def add_workouts(count):
+    workouts = [
+        Workout(date=date.today() - timedelta(days=i + 1), duration_minutes=30, notes=f"Workout {i}")
+        for i in range(count)
+    ]
+    db.session.add_all(workouts)
+    db.session.commit()
+    return workouts
+
+def add_exercises(count, offset=0):
+    exercises = [Exercise(name=f"Exercise {offset + i}", category="strength") for i in range(count)]
+    db.session.add_all(exercises)
+    db.session.commit()
+    return exercises
+
+def link(workouts, exercises):
+    db.session.add_all(
+        WorkoutExercise(workout_id=w.id, exercise_id=e.id, reps=10, sets=3)
+        for w in workouts for e in exercises
+    )
+    db.session.commit()
+
+def assert_constant(count_queries, url, grow, sizes=(1, 20)):
+    """Grow the data set between requests and check the query count stays flat"""
+    counts = []
+    for size in sizes:
+        grow(size)
+        response, queries = count_queries('GET', url)
+        assert response.status_code == 200
+        counts.append(queries)
+    assert len(set(counts)) == 1, f"{url} query count grew with result size: {counts}"
+
+def test_get_workouts_queries_constant(count_queries):
+    """Test GET /workouts issues the same queries for 1 or 20 workouts"""
+    assert_constant(count_queries, '/workouts', add_workouts)
+
+def test_get_exercises_queries_constant(count_queries):
+    """Test GET /exercises issues the same queries for 1 or 20 exercises"""
+    offsets = iter(range(0, 1000, 100))
+    assert_constant(count_queries, '/exercises', lambda n: add_exercises(n, next(offsets)))
+
+def test_get_workout_detail_queries_constant(count_queries):
+    """Test GET /workouts/<id> loads its workout_exercises without extra round-trips"""
+    workout = add_workouts(1)[0]
+    offsets = iter(range(0, 1000, 100))
+    assert_constant(count_queries, f'/workouts/{workout.id}', lambda n: link([workout], add_exercises(n, next(offsets))))
+
+def test_get_exercise_detail_queries_constant(count_queries):
+    """Test GET /exercises/<id> loads its workout_exercises without extra round-trips"""
+    exercise = add_exercises(1)[0]
+    assert_constant(count_queries, f'/exercises/{exercise.id}', lambda n: link(add_workouts(n), [exercise]))
+
+def test_export_workouts_queries_constant(count_queries):
+    """Test GET /workouts/export batches nested workout_exercises instead of one query per workout"""
+    exercises = add_exercises(3)
+    assert_constant(count_queries, '/workouts/export', lambda n: link(add_workouts(n), exercises))
+
+def test_exercise_stats_queries_constant(count_queries):
+    """Test GET /exercises/stats aggregates in SQL rather than per exercise"""
+    workouts = add_workouts(3)
+    offsets = iter(range(0, 1000, 100))
+    assert_constant(count_queries, '/exercises/stats', lambda n: link(workouts, add_exercises(n, next(offsets))))
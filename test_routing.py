@@ -0,0 +1,90 @@
+"""
+Read/write routing tests: GET requests read through the read engine, writes go to the
+primary, and a request reads its own writes. Uses two SQLite files as primary and replica.
+Run with: python -m pytest test_routing.py
+"""
+
+import pytest
+from sqlalchemy import create_engine, insert, select
+
+from app import create_app
+from config import TestingConfig, config
+from models import db, Exercise
+
+def make_app(monkeypatch, tmp_path, read_uri):
+    class RoutingConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'primary.db'}"
+        SQLALCHEMY_READ_URI = read_uri
+        RESPONSE_CACHE_ENABLED = False
+
+    monkeypatch.setitem(config, 'routing', RoutingConfig)
+    app = create_app('routing')
+    with app.app_context():
+        db.create_all()
+    return app
+
+@pytest.fixture
+def replica_app(monkeypatch, tmp_path):
+    # The "replica" is a separate file, so what each side returns shows where a query went
+    replica = create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    db.metadata.create_all(replica)
+    with replica.begin() as connection:
+        connection.execute(insert(Exercise), {"name": "Replica Row", "category": "cardio"})
+    replica.dispose()
+
+    app = make_app(monkeypatch, tmp_path, f"sqlite:///{tmp_path / 'replica.db'}")
+    yield app
+    app.extensions['read_engine'].dispose()
+    with app.app_context():
+        db.engine.dispose()
+
+def names(engine):
+    with engine.connect() as connection:
+        return connection.scalars(select(Exercise.name)).all()
+
+def test_reads_go_to_replica_and_writes_to_primary(replica_app):
+    """Test GETs are answered from the read engine and POSTs land on the primary"""
+    client = replica_app.test_client()
+    assert [row['name'] for row in client.get('/exercises').json] == ["Replica Row"]
+    assert client.get('/exercises/1').json['name'] == "Replica Row"
+
+    assert client.post('/exercises', json={"name": "Primary Row", "category": "strength"}).status_code == 201
+    with replica_app.app_context():
+        assert names(db.engine) == ["Primary Row"]
+    assert names(replica_app.extensions['read_engine']) == ["Replica Row"]
+
+def test_read_your_writes(replica_app):
+    """Test the first write in a request pins the rest of it to the primary"""
+    with replica_app.test_request_context('/exercises', method='GET'):
+        assert db.session.scalars(select(Exercise.name)).all() == ["Replica Row"]
+        db.session.add(Exercise(name="Written Row", category="balance"))
+        db.session.flush()
+        assert db.session.scalars(select(Exercise.name)).all() == ["Written Row"]
+        db.session.rollback()
+        # Still pinned after the transaction ends
+        assert db.session.scalars(select(Exercise.name)).all() == []
+
+    # Writes outside a GET request never touch the read engine
+    with replica_app.test_request_context('/exercises', method='POST'):
+        assert db.session.scalars(select(Exercise.name)).all() == []
+    with replica_app.app_context():
+        assert db.session.scalars(select(Exercise.name)).all() == []
+
+def test_readonly_connections_to_primary(monkeypatch, tmp_path):
+    """Test 'readonly' reads the primary's file through connections that refuse writes"""
+    app = make_app(monkeypatch, tmp_path, 'readonly')
+    client = app.test_client()
+    assert client.post('/exercises', json={"name": "Squat", "category": "strength"}).status_code == 201
+    assert [row['name'] for row in client.get('/exercises').json] == ["Squat"]
+
+    engine = app.extensions['read_engine']
+    with engine.connect() as connection:
+        with pytest.raises(Exception, match='readonly'):
+            connection.execute(insert(Exercise), {"name": "Nope", "category": "cardio"})
+    engine.dispose()
+    with app.app_context():
+        db.engine.dispose()
+
+def test_in_memory_database_reads_from_primary(app):
+    """Test there is no read engine for the in-memory test database"""
+    assert 'read_engine' not in app.extensions
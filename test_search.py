@@ -0,0 +1,84 @@
+"""
+Full-text search tests: FTS5 ranking, prefix queries, pagination and trigger sync.
+Run with: python -m pytest test_search.py
+"""
+
+from cache import response_cache
+from models import db, Exercise, Workout
+
+def add(exercises=(), notes=()):
+    rows = [Exercise(name=name, category="strength") for name in exercises]
+    rows += [Workout(duration_minutes=30, notes=text) for text in notes]
+    db.session.add_all(rows)
+    db.session.commit()
+    return rows
+
+def hits(client, url):
+    response = client.get(url)
+    assert response.status_code == 200, response.json
+    return [(result['type'], result['id']) for result in response.json]
+
+def test_search_ranking_and_prefix(client):
+    """Test whole-word and prefix matches, bm25 order, type filter and snippets"""
+    squat, front_squat, _, squats, _ = add(
+        exercises=["Squat", "Front Squat", "Bench Press"],
+        notes=["Squats then lunges, legs were sore", "Easy run"],
+    )
+    # The shorter name is the better match
+    assert hits(client, '/search?q=squat') == [('exercise', squat.id), ('exercise', front_squat.id)]
+    assert set(hits(client, '/search?q=SQU*')) == {('exercise', squat.id), ('exercise', front_squat.id), ('workout', squats.id)}
+    assert hits(client, '/search?q=squ*&type=workout') == [('workout', squats.id)]
+    assert hits(client, '/search?q=squat+lunges') == []
+
+    result = client.get('/search?q=sore').json[0]
+    assert result['snippet'] == 'Squats then lunges, legs were <mark>sore</mark>'
+    assert result['workout']['notes'] == squats.notes and 'exercise' not in result
+    assert result['score'] > 0
+
+    # FTS5 syntax in user input is plain text, not an error
+    assert hits(client, '/search?q=%22squat%22+(-') == [('exercise', squat.id), ('exercise', front_squat.id)]
+    assert client.get('/search?q=%22)(').status_code == 400
+    assert client.get('/search').status_code == 400
+    assert client.get('/search?q=squat&type=set').status_code == 400
+
+def test_search_pages(client):
+    """Test following the cursor visits every hit exactly once, best first"""
+    add(exercises=[f"Press {'variation ' * i}{i}" for i in range(7)], notes=["press day"] * 5)
+    seen, scores, url = [], [], '/search?q=press&limit=3'
+    while url:
+        response = client.get(url)
+        seen += [(result['type'], result['id']) for result in response.json]
+        scores += [result['score'] for result in response.json]
+        url = response.headers.get('Link', '').partition('>')[0].lstrip('<') or None
+    assert len(seen) == len(set(seen)) == 12
+    assert scores == sorted(scores, reverse=True)
+
+def test_search_index_follows_writes(client):
+    """Test the triggers keep the index in step with inserts, updates and deletes"""
+    exercise = add(exercises=["Kettlebell Swing"])[0]
+    assert hits(client, '/search?q=kettlebell') == [('exercise', exercise.id)]
+
+    # No API route renames exercises, so change the row directly
+    exercise.name = "Goblet Squat"
+    db.session.commit()
+    response_cache.clear()
+    assert hits(client, '/search?q=kettlebell') == []
+    assert hits(client, '/search?q=goblet') == [('exercise', exercise.id)]
+
+    created = client.post('/workouts/bulk', json=[{"duration_minutes": 20, "notes": "Goblet squat ladder"}]).json['created']
+    assert len(hits(client, '/search?q=goblet')) == 2
+
+    assert client.delete(f'/exercises/{exercise.id}').status_code == 200
+    assert client.delete(f"/workouts/{created[0]['id']}").status_code == 200
+    assert hits(client, '/search?q=goblet') == []
+
+def test_search_queries_constant(count_queries):
+    """Test a page costs one ranking query plus one load per result type, whatever its size"""
+    counts, total = [], 0
+    for size in (1, 20):
+        add(exercises=[f"Row {size}-{i}" for i in range(size)], notes=["row intervals"] * size)
+        total += 2 * size
+        response, queries = count_queries('GET', '/search?q=row')
+        assert len(response.json) == total
+        counts.append(queries)
+    assert counts == [3, 3]
@@ -0,0 +1,63 @@
+"""
+Differential tests: the fast list serializer must produce exactly the bytes
+the marshmallow schemas do. Run with: python -m pytest test_serialization.py
+"""
+
+from datetime import date, timedelta
+
+import pytest
+
+from cache import response_cache
+from models import db, Exercise, Workout
+
+NOTES = [
+    None,
+    "",
+    "Plain notes",
+    'Quotes " and \\ backslashes / slashes',
+    "Control\nchars\t\r\x08\x0c\x01\x1f",
+    "DEL \x7f",
+    "Unicode: café ☃   \U0001F4AA",
+    "<script>&amp;</script>",
+]
+
+@pytest.fixture
+def seeded(app):
+    db.session.add_all(
+        Workout(date=date.today() - timedelta(days=i % 5 + 1), duration_minutes=5 + i, notes=NOTES[i % len(NOTES)])
+        for i in range(40)
+    )
+    db.session.add_all(
+        Exercise(name=f"Exercise {name}", category="cardio", equipment_needed=i % 2 == 0)
+        for i, name in enumerate(["A", "café", 'quote "q"', "tab\tname"])
+    )
+    db.session.commit()
+
+def fetch(app, client, url, fast):
+    app.config['FAST_LIST_SERIALIZATION'] = fast
+    response_cache.clear()
+    try:
+        return client.get(url)
+    finally:
+        app.config['FAST_LIST_SERIALIZATION'] = False
+
+@pytest.mark.parametrize('url', [
+    '/workouts',
+    '/workouts?limit=7',
+    '/workouts?fields=notes',
+    '/workouts?fields=id,date&limit=3',
+    '/workouts?min_duration=20',
+    '/exercises',
+    '/exercises?fields=name,equipment_needed&limit=2',
+    '/exercises?category=cardio&limit=3',
+])
+def test_fast_path_matches_schema_output(app, client, seeded, url):
+    """Test every page of the fast path is byte-for-byte identical to the schema path"""
+    while url:
+        slow = fetch(app, client, url, fast=False)
+        fast = fetch(app, client, url, fast=True)
+        assert fast.status_code == slow.status_code == 200
+        assert fast.get_data() == slow.get_data()
+        assert fast.headers.get('Link') == slow.headers.get('Link')
+        link = slow.headers.get('Link')
+        url = link[1:link.index('>')] if link else None
@@ -0,0 +1,50 @@
+"""
+Startup tests: a worker builds the app without Alembic or any schema instance,
+and `flask db` still works from the command line.
+Run with: python -m pytest test_startup.py
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+from bench_startup import DEFERRED
+from schemas import LazySchema, WorkoutSchema
+
+SERVER = os.path.join(os.path.dirname(__file__), 'server')
+
+def run(*args):
+    result = subprocess.run([sys.executable, *args], cwd=SERVER, capture_output=True, text=True,
+                            env={**os.environ, 'FLASK_APP': 'app:create_app', 'APP_CONFIG': 'testing'})
+    assert result.returncode == 0, result.stderr
+    return result.stdout
+
+def test_worker_start_is_lazy():
+    """Test create_app imports no deferred module and builds no schema instance"""
+    output = run('-c', """
+import json, sys
+import schemas
+from app import create_app
+create_app('testing')
+built = [name for name, value in vars(schemas).items() if isinstance(value, schemas.LazySchema) and value._schema]
+print(json.dumps({"modules": sorted({name.split('.')[0] for name in sys.modules}), "built": built}))
+""")
+    result = json.loads(output)
+    assert not set(DEFERRED) & set(result['modules'])
+    assert result['built'] == []
+
+def test_lazy_schema_builds_once():
+    """Test a LazySchema constructs its schema on first use and then reuses it"""
+    schema = LazySchema(WorkoutSchema, many=True, only=('id', 'duration_minutes'))
+    assert schema._schema is None
+    assert schema.dump([]) == []
+    built = schema._schema
+    assert built.many and set(built.fields) == {'id', 'duration_minutes'}
+    schema.load([{"duration_minutes": 30}], transient=True)
+    assert schema._schema is built
+
+def test_flask_db_command():
+    """Test the `flask` command still registers Flask-Migrate's `db` group"""
+    assert 'Perform database migrations.' in run('-m', 'flask', '--help')
+    assert 'upgrade' in run('-m', 'flask', 'db', '--help')
@@ -0,0 +1,87 @@
+"""
+Exercise stats tests: lifetime totals and Monday-based weekly buckets from
+GET /exercises/<id>/stats and GET /exercises/stats, and ?weeks= validation.
+Run with: python -m pytest test_stats.py
+"""
+
+from datetime import date, timedelta
+
+import pytest
+
+from models import db, Exercise, Workout, WorkoutExercise
+from stats import MAX_TREND_WEEKS
+
+MONDAY = date.today() - timedelta(days=date.today().weekday())
+
+@pytest.fixture
+def history(app):
+    """Squats on this Monday, last Wednesday and Sunday and 20 weeks ago; a run last Sunday; planks never"""
+    squat = Exercise(name="Squat", category="strength")
+    run = Exercise(name="Running", category="cardio")
+    plank = Exercise(name="Plank", category="balance")
+    days = {offset: Workout(date=MONDAY - timedelta(days=offset), duration_minutes=45) for offset in (0, 1, 5, 140)}
+    db.session.add_all([squat, run, plank, *days.values()])
+    db.session.flush()
+    db.session.add_all([
+        WorkoutExercise(workout_id=days[0].id, exercise_id=squat.id, reps=5, sets=5),
+        WorkoutExercise(workout_id=days[1].id, exercise_id=squat.id, reps=10, sets=3, duration_seconds=60),
+        WorkoutExercise(workout_id=days[5].id, exercise_id=squat.id, reps=8, sets=2),
+        WorkoutExercise(workout_id=days[140].id, exercise_id=squat.id, reps=4, sets=4),
+        WorkoutExercise(workout_id=days[1].id, exercise_id=run.id, duration_seconds=600),
+    ])
+    db.session.commit()
+    return squat.id, run.id, plank.id
+
+def week(start, volume, duration_seconds, session_count):
+    return {"week_start": start.isoformat(), "volume": volume, "duration_seconds": duration_seconds,
+            "session_count": session_count}
+
+def test_exercise_stats(client, history):
+    """Test totals cover every link, and Sunday falls in the week starting the Monday before it"""
+    squat, _, _ = history
+    response = client.get(f'/exercises/{squat}/stats')
+    assert response.status_code == 200
+    assert response.json == {
+        "exercise_id": squat,
+        "total_volume": 25 + 30 + 16 + 16,
+        "total_duration_seconds": 60,
+        "session_count": 4,
+        "first_workout_date": (MONDAY - timedelta(days=140)).isoformat(),
+        "last_workout_date": MONDAY.isoformat(),
+        # The link 20 weeks ago is outside the default 12 weeks
+        "weekly": [week(MONDAY - timedelta(weeks=1), 30 + 16, 60, 2), week(MONDAY, 25, 0, 1)],
+    }
+    assert client.get(f'/exercises/{squat}/stats?weeks=1').json['weekly'] == [week(MONDAY, 25, 0, 1)]
+    assert len(client.get(f'/exercises/{squat}/stats?weeks=21').json['weekly']) == 3
+
+def test_all_exercise_stats(client, history):
+    """Test every exercise is listed, a duration-only one with no volume and an unused one with empty totals"""
+    squat, run, plank = history
+    stats = client.get('/exercises/stats').json
+    assert [row['exercise_id'] for row in stats] == [squat, run, plank]
+    assert stats[1] == {
+        "exercise_id": run, "total_volume": 0, "total_duration_seconds": 600, "session_count": 1,
+        "first_workout_date": (MONDAY - timedelta(days=1)).isoformat(),
+        "last_workout_date": (MONDAY - timedelta(days=1)).isoformat(),
+        "weekly": [week(MONDAY - timedelta(weeks=1), 0, 600, 1)],
+    }
+    assert stats[2] == {"exercise_id": plank, "total_volume": 0, "total_duration_seconds": 0, "session_count": 0,
+                        "first_workout_date": None, "last_workout_date": None, "weekly": []}
+    assert client.get(f'/exercises/{plank}/stats').json == stats[2]
+
+@pytest.mark.parametrize('weeks, message', [
+    ('0', f"Weeks must be between 1 and {MAX_TREND_WEEKS}."),
+    (str(MAX_TREND_WEEKS + 1), f"Weeks must be between 1 and {MAX_TREND_WEEKS}."),
+    ('many', "Weeks must be an integer."),
+])
+def test_invalid_weeks(client, history, weeks, message):
+    """Test ?weeks= outside 1..MAX_TREND_WEEKS is a 400 on both endpoints"""
+    squat, _, _ = history
+    for url in (f'/exercises/{squat}/stats', '/exercises/stats'):
+        response = client.get(f'{url}?weeks={weeks}')
+        assert response.status_code == 400
+        assert response.json == {"errors": {"weeks": [message]}}
+
+def test_unknown_exercise(client, history):
+    """Test stats for an exercise that doesn't exist are a 404"""
+    assert client.get('/exercises/999/stats').status_code == 404
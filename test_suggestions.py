@@ -0,0 +1,105 @@
+"""
+Suggestion tests: GET /workouts/<id>/suggestions ranks exercises by co-occurrence, and the
+in-memory matrix follows every write through the co-occurrence log.
+Run with: python -m pytest test_suggestions.py
+"""
+
+import numpy as np
+from sqlalchemy import select, update
+
+from models import db, CooccurrenceChange, WorkoutExercise
+from suggestions import CoOccurrence
+
+def post(client, url, body, status=201):
+    response = client.post(url, json=body)
+    assert response.status_code == status, response.json
+    return response.json
+
+def setup_workouts(client, groups):
+    """One workout per group of exercise ids, linked with the bulk endpoint"""
+    post(client, '/exercises/bulk', [{"name": f"Lift {i}", "category": "strength"} for i in range(1, 7)])
+    for group in groups:
+        workout = post(client, '/workouts', {"duration_minutes": 30})
+        post(client, f"/workouts/{workout['id']}/workout_exercises/bulk",
+             [{"exercise_id": exercise_id, "reps": 5} for exercise_id in group])
+
+def scored(client, workout_id, query=''):
+    response = client.get(f'/workouts/{workout_id}/suggestions{query}')
+    assert response.status_code == 200, response.json
+    return [(row['exercise']['id'], row['score']) for row in response.json]
+
+def dense(matrix, size):
+    """A CoOccurrence's counts, pending deltas included, as a size x size array"""
+    result = np.zeros((size, size), dtype=np.int64)
+    counts = matrix.matrix.toarray()
+    result[:counts.shape[0], :counts.shape[1]] = counts
+    for row, deltas in matrix.pending.items():
+        for column, delta in deltas.items():
+            result[row, column] += delta
+    return result
+
+def assert_current(app):
+    """The app's matrix, brought up to date, equals one built from scratch"""
+    connection = db.session.connection()
+    matrix = app.extensions['cooccurrence']
+    matrix.catch_up(connection)
+    fresh = CoOccurrence()
+    fresh.build(connection)
+    size = max(matrix.matrix.shape[0], fresh.matrix.shape[0], *(id + 1 for id in matrix.pending))
+    assert (dense(matrix, size) == dense(fresh, size)).all()
+
+def test_suggestions_rank_by_cooccurrence(client):
+    """Test scores sum shared workouts, skip the workout's own exercises and break ties by id"""
+    setup_workouts(client, [(1, 2, 3), (1, 2, 4), (2, 5), (1, 6), (3,)])
+    assert scored(client, 5) == [(1, 1), (2, 1)]
+    # From exercises 1 and 2: 3 and 4 share a workout with both, 5 and 6 with one each
+    workout = post(client, '/workouts', {"duration_minutes": 20})
+    for exercise_id in (1, 2):
+        post(client, f"/workouts/{workout['id']}/exercises/{exercise_id}/workout_exercises", {"reps": 3})
+    assert scored(client, workout['id']) == [(3, 2), (4, 2), (5, 1), (6, 1)]
+    assert scored(client, workout['id'], '?limit=3') == [(3, 2), (4, 2), (5, 1)]
+    row = client.get(f"/workouts/{workout['id']}/suggestions?limit=1").json[0]
+    assert row == {"exercise": {"id": 3, "name": "Lift 3", "category": "strength", "equipment_needed": False},
+                   "score": 2}
+
+    empty = post(client, '/workouts', {"duration_minutes": 20})
+    assert scored(client, empty['id']) == []
+    assert client.get('/workouts/999/suggestions').status_code == 404
+    assert client.get(f"/workouts/{workout['id']}/suggestions?limit=0").status_code == 400
+
+def test_matrix_follows_every_write(app, client):
+    """Test link creates, moves and cascade deletes reach the built matrix through the log"""
+    setup_workouts(client, [(1, 2, 3), (1, 2, 4), (2, 5)])
+    assert scored(client, 3) == [(1, 2), (3, 1), (4, 1)]
+    assert_current(app)
+
+    post(client, '/workouts/3/exercises/1/workout_exercises', {"reps": 8})
+    post(client, '/workouts/1/workout_exercises/bulk', [{"exercise_id": 6, "reps": 2}])
+    assert scored(client, 3) == [(3, 2), (4, 2), (6, 2)]
+    # The API never moves a link, but the log covers direct updates too
+    db.session.execute(update(WorkoutExercise).where(WorkoutExercise.workout_id == 2, WorkoutExercise.exercise_id == 4)
+                       .values(exercise_id=6))
+    db.session.commit()
+    assert_current(app)
+
+    assert client.delete('/exercises/2').status_code == 200
+    assert client.delete('/workouts/1').status_code == 200
+    assert_current(app)
+    # Exercise 6 is past the matrix built at the start, so folding it in grows the matrix
+    app.extensions['cooccurrence'].fold()
+    assert_current(app)
+    assert scored(client, 3) == [(6, 1)]
+
+def test_rebuilds_when_log_is_gone(app, client):
+    """Test a matrix whose last applied log row was pruned is rebuilt instead of patched"""
+    setup_workouts(client, [(1, 2), (1, 3)])
+    assert scored(client, 1) == [(3, 1)]
+    matrix = app.extensions['cooccurrence']
+    seq = matrix.seq
+    assert seq == db.session.scalar(select(db.func.max(CooccurrenceChange.seq)))
+
+    db.session.query(CooccurrenceChange).delete()
+    db.session.commit()
+    post(client, '/workouts/2/exercises/4/workout_exercises', {"reps": 1})
+    assert scored(client, 1) == [(3, 1), (4, 1)]
+    assert matrix.pending == {} and matrix.seq > seq
@@ -0,0 +1,88 @@
+"""
+Workout summary and exercise record tests: incremental maintenance must match a rebuild.
+Run with: python -m pytest test_summaries.py
+"""
+
+from jobs import jobs
+from models import db, WorkoutSummary
+from summaries import drift
+from test_queries import add_exercises, add_workouts
+
+def add(client, workout, exercise, **metrics):
+    response = client.post(f'/workouts/{workout.id}/exercises/{exercise.id}/workout_exercises', json=metrics)
+    assert response.status_code == 201
+
+def test_records_and_summary(client):
+    """Test records keep the best value and its workout date, and summaries total a workout"""
+    older, newer = add_workouts(2)[::-1]
+    squat, run = add_exercises(2)
+    add(client, older, squat, reps=10, sets=5)
+    add(client, newer, squat, reps=12, sets=3)
+    add(client, newer, run, duration_seconds=600)
+
+    records = client.get(f'/exercises/{squat.id}/records').json
+    assert records['max_reps'] == {"value": 12, "date": newer.date.isoformat(), "workout_id": newer.id}
+    assert records['max_volume'] == {"value": 50, "date": older.date.isoformat(), "workout_id": older.id}
+    assert records['max_duration_seconds'] is None
+
+    summary = client.get(f'/workouts/{newer.id}/summary').json
+    assert summary['exercise_count'] == 2
+    assert summary['total_volume'] == 36
+    assert summary['total_duration_seconds'] == 600
+    assert client.get('/exercises/999/records').status_code == 404
+
+def test_ties_go_to_earliest_workout(client):
+    """Test an equal value from an earlier workout takes over the record"""
+    older, newer = add_workouts(2)[::-1]
+    exercise = add_exercises(1)[0]
+    add(client, newer, exercise, reps=10)
+    add(client, older, exercise, reps=10)
+
+    assert client.get(f'/exercises/{exercise.id}/records').json['max_reps']['workout_id'] == older.id
+    assert drift() == {'workout_summaries': 0, 'exercise_records': 0}
+
+def test_incremental_updates_match_rebuild(client):
+    """Test inserts and every delete path leave the tables equal to a fresh computation"""
+    workouts = add_workouts(6)
+    exercises = add_exercises(4)
+    for i, workout in enumerate(workouts):
+        add(client, workout, exercises[0], reps=5 + i, sets=3)
+    response = client.post(f'/workouts/{workouts[0].id}/workout_exercises/bulk', json=[
+        {"exercise_id": exercises[1].id, "reps": 8, "sets": 4},
+        {"exercise_id": exercises[2].id, "duration_seconds": 300},
+    ])
+    assert response.status_code == 201
+    add(client, workouts[5], exercises[2], duration_seconds=900)
+    add(client, workouts[5], exercises[3], sets=2)
+    assert drift() == {'workout_summaries': 0, 'exercise_records': 0}
+
+    # The last workout holds the max_reps and max_duration_seconds records
+    assert client.delete(f'/workouts/{workouts[5].id}').status_code == 200
+    assert drift() == {'workout_summaries': 0, 'exercise_records': 0}
+    assert client.get(f'/exercises/{exercises[0].id}/records').json['max_reps']['value'] == 9
+
+    assert client.delete(f'/exercises/{exercises[1].id}').status_code == 200
+    assert drift() == {'workout_summaries': 0, 'exercise_records': 0}
+
+    job_id = client.delete(f'/exercises/{exercises[0].id}?mode=async').json['id']
+    assert jobs.wait(job_id, timeout=10)['status'] == 'done'
+    db.session.expire_all()
+    assert drift() == {'workout_summaries': 0, 'exercise_records': 0}
+    assert client.get(f'/workouts/{workouts[3].id}/summary').json['exercise_count'] == 0
+
+def test_rebuild_command(app, client):
+    """Test `flask summaries rebuild` reports drift, repairs it and verifies the result"""
+    workout = add_workouts(1)[0]
+    add(client, workout, add_exercises(1)[0], reps=10, sets=3)
+    db.session.get(WorkoutSummary, workout.id).total_volume = 1
+    db.session.commit()
+
+    runner = app.test_cli_runner()
+    check = runner.invoke(args=['summaries', 'rebuild', '--check'])
+    assert check.exit_code == 1
+    assert 'workout_summaries: 1 rows differ' in check.output
+
+    rebuilt = runner.invoke(args=['summaries', 'rebuild'])
+    assert rebuilt.exit_code == 0, rebuilt.output
+    assert runner.invoke(args=['summaries', 'rebuild', '--check']).exit_code == 0
+    assert client.get(f'/workouts/{workout.id}/summary').json['total_volume'] == 30
@@ -0,0 +1,146 @@
+"""
+Offline sync tests: the change feed after a since-token, and idempotent mutation batches.
+Run with: python -m pytest test_sync.py
+"""
+
+from datetime import timedelta
+
+from sqlalchemy import update
+
+from deletes import TOMBSTONE_RETENTION
+from jobs import utcnow
+from models import db, Exercise, IdempotentRequest, SyncState, Tombstone, Workout, WorkoutExercise
+from sync import RESYNC_REQUIRED
+
+def feed(client, token=None, limit=None):
+    """Follow the change feed from token to the end; returns (pages, final token)"""
+    pages = []
+    while True:
+        args = {key: value for key, value in (('since', token), ('limit', limit)) if value}
+        response = client.get('/sync', query_string=args)
+        assert response.status_code == 200, response.json
+        pages.append(response.json)
+        token = response.json['next']
+        if not response.json['has_more']:
+            return pages, token
+
+def post(client, mutations, key='batch-1'):
+    return client.post('/sync', json={"mutations": mutations}, headers={'Idempotency-Key': key})
+
+BATCH = [
+    {"op": "create", "type": "exercise", "ref": "e1", "data": {"name": "Squat", "category": "strength"}},
+    {"op": "create", "type": "workout", "ref": "w1", "data": {"date": "2024-01-08", "duration_minutes": 45}},
+    {"op": "create", "type": "workout_exercise", "ref": "l1",
+     "data": {"workout_id": "w1", "exercise_id": "e1", "reps": 5, "sets": 5}},
+    {"op": "update", "type": "workout_exercise", "id": "l1", "data": {"reps": 8}},
+]
+
+def test_change_feed(client):
+    """Test every insert, update and delete shows up once, in order, across pages"""
+    _, start = feed(client)
+    assert client.post('/exercises/bulk', json=[{"name": f"Lift {i}", "category": "strength"} for i in range(3)]).status_code == 201
+    workout = client.post('/workouts', json={"duration_minutes": 30}).json
+    assert post(client, [{"op": "update", "type": "exercise", "id": 1, "data": {"category": "cardio"}}]).status_code == 200
+    assert client.delete('/exercises/2').status_code == 200
+
+    # Exercise 1's insert is superseded by its update and exercise 2's by its delete
+    pages, token = feed(client, start, limit=2)
+    assert len(pages) == 2
+    changes = [(name, row['id']) for page in pages for name, rows in page['changes'].items() for row in rows]
+    assert sorted(changes) == [('exercises', 1), ('exercises', 3), ('workouts', workout['id'])]
+    assert [page['deleted']['exercises'] for page in pages] == [[], [2]]
+    row = pages[-1]['changes']['exercises'][0]
+    assert row['category'] == 'cardio' and row['change_seq'] and row['updated_at']
+
+    # Caught up: nothing new until the next write
+    assert feed(client, token) == ([{"changes": {"exercises": [], "workouts": [], "workout_exercises": []},
+                                     "deleted": {"exercises": [], "workouts": [], "workout_exercises": []},
+                                     "next": token, "has_more": False}], token)
+    assert client.get('/sync?since=nope').json == {"errors": {"since": ["Invalid sync token."]}}
+    assert client.get('/sync?since=WzEwMDBd').status_code == 400
+
+def test_batch_applies_once(client):
+    """Test a batch resolves refs, keeps summaries in step, and replays instead of reapplying"""
+    response = post(client, BATCH)
+    assert response.status_code == 200, response.json
+    assert [result['id'] for result in response.json['results']] == [1, 1, 1, 1]
+    assert response.json['results'][2] == {"op": "create", "type": "workout_exercise", "id": 1, "ref": "l1"}
+    assert client.get('/workouts/1/summary').json['total_reps'] == 8
+    assert client.get('/exercises/1/records').json['max_reps']['value'] == 8
+
+    replay = post(client, BATCH)
+    assert replay.status_code == 200 and replay.json == response.json
+    assert replay.headers['Idempotent-Replayed'] == 'true'
+    assert db.session.query(WorkoutExercise).count() == 1
+
+    assert post(client, BATCH[:1]).status_code == 422
+    assert client.post('/sync', json={"mutations": BATCH}).json == {"errors": {"Idempotency-Key": ["Header is required."]}}
+
+    # Moving the workout's date moves its records' dates too
+    assert post(client, [{"op": "update", "type": "workout", "id": 1, "data": {"date": "2024-02-01"}}], 'batch-2').status_code == 200
+    assert client.get('/exercises/1/records').json['max_reps']['date'] == '2024-02-01'
+
+def test_batch_is_atomic(client):
+    """Test a failing mutation rolls back the whole batch and is not stored"""
+    bad = [*BATCH[:3], {"op": "update", "type": "workout_exercise", "id": "l1", "data": {"reps": None, "sets": None}}]
+    response = post(client, bad)
+    assert response.status_code == 400
+    assert response.json == {"errors": {"mutations": {"3": {"data": {"_schema": [
+        "At least one of reps, sets, or duration_seconds must be provided"]}}}}}
+    assert db.session.query(Exercise).count() == db.session.query(Workout).count() == 0
+    assert db.session.query(IdempotentRequest).count() == 0
+    _, token = feed(client)
+    assert feed(client, token)[0][0]['has_more'] is False
+
+    errors = post(client, [*BATCH[:1], {"op": "delete", "type": "workout", "id": "e1"}]).json['errors']
+    assert errors == {"mutations": {"1": {"id": ["No workout was created with ref 'e1' earlier in this batch."]}}}
+    errors = post(client, [BATCH[0], BATCH[0]]).json['errors']
+    assert errors == {"mutations": {"1": {"ref": ["Already used by a create earlier in this batch."]}}}
+    errors = post(client, [{"op": "create", "type": "exercise", "id": 4, "data": {}}]).json['errors']
+    assert list(errors['mutations']['0']) == ['id']
+
+    # The same key works once the batch is fixed
+    assert post(client, BATCH).status_code == 200
+
+def test_update_rejects_null_date(client):
+    """Test a workout update cannot clear its date, which keys the list cursor, rollups and summaries"""
+    assert post(client, BATCH).status_code == 200
+    response = post(client, [{"op": "update", "type": "workout", "id": 1, "data": {"date": None}}], key='batch-2')
+    assert response.status_code == 400
+    assert response.json == {"errors": {"mutations": {"0": {"data": {"date": ["Field may not be null."]}}}}}
+    assert db.session.get(Workout, 1).date.isoformat() == '2024-01-08'
+    assert client.get('/workouts').status_code == 200
+
+def test_batch_deletes(client):
+    """Test deletes go through the summaries and come back as tombstones"""
+    post(client, BATCH)
+    _, token = feed(client)
+    response = post(client, [{"op": "delete", "type": "exercise", "id": 1}], 'batch-2')
+    assert response.status_code == 200
+    assert client.get('/workouts/1/summary').json['exercise_count'] == 0
+
+    page = feed(client, token)[0][0]
+    assert page['deleted'] == {"exercises": [1], "workouts": [], "workout_exercises": [1]}
+    assert post(client, [{"op": "delete", "type": "exercise", "id": 1}], 'batch-3').json['errors'] == {
+        "mutations": {"0": {"id": ["Exercise 1 not found."]}}}
+
+def test_expired_tombstones_require_resync(client):
+    """Test old tombstones are pruned and a token from before them gets 410 instead of a feed missing deletions"""
+    client.post('/exercises/bulk', json=[{"name": f"Lift {i}", "category": "strength"} for i in range(3)])
+    _, before = feed(client)
+    client.delete('/exercises/1')
+    _, after = feed(client)
+    db.session.execute(update(Tombstone).values(deleted_at=utcnow() - TOMBSTONE_RETENTION - timedelta(hours=1)))
+    db.session.commit()
+
+    # Any later delete prunes the expired tombstone
+    client.delete('/exercises/2')
+    assert [tombstone.row_id for tombstone in Tombstone.query] == [2]
+    assert db.session.get(SyncState, 1).pruned_seq == 4
+
+    response = client.get('/sync', query_string={'since': before})
+    assert response.status_code == 410
+    assert response.json == {"error": RESYNC_REQUIRED, "resync": True}
+    assert feed(client, after)[0][0]['deleted']['exercises'] == [2]
+    page = feed(client)[0][0]
+    assert [row['id'] for row in page['changes']['exercises']] == [3]
@@ -0,0 +1,98 @@
+"""
+Calendar rollup tests: trigger-maintained daily rollups must match a rebuild, and
+GET /stats/timeline must bucket them by day, week and month.
+Run with: python -m pytest test_timeline.py
+"""
+
+from jobs import jobs
+from models import db, DailyWorkoutTotals
+from timeline import drift
+
+NO_DRIFT = {'daily_workout_totals': 0, 'daily_category_volume': 0}
+
+def post(client, url, body, status=201):
+    response = client.post(url, json=body)
+    assert response.status_code == status, response.json
+    return response.json
+
+def sync(client, key, *mutations):
+    response = client.post('/sync', json={"mutations": list(mutations)}, headers={'Idempotency-Key': key})
+    assert response.status_code == 200, response.json
+
+def test_timeline_buckets(client):
+    """Test day, week and month buckets total workouts and volume per category"""
+    squat = post(client, '/exercises', {"name": "Squat", "category": "strength"})
+    run = post(client, '/exercises', {"name": "Run", "category": "cardio"})
+    # Monday 2024-01-01, Wednesday 2024-01-03 and Monday 2024-01-08
+    monday, wednesday, next_monday = (
+        post(client, '/workouts', {"date": day, "duration_minutes": minutes})
+        for day, minutes in (("2024-01-01", 30), ("2024-01-03", 45), ("2024-01-08", 60))
+    )
+    post(client, f"/workouts/{monday['id']}/exercises/{squat['id']}/workout_exercises", {"reps": 5, "sets": 5})
+    post(client, f"/workouts/{wednesday['id']}/workout_exercises/bulk",
+         [{"exercise_id": squat['id'], "reps": 3, "sets": 4}, {"exercise_id": run['id'], "duration_seconds": 1200}])
+
+    weeks = client.get('/stats/timeline?bucket=week&from=2024-01-02&to=2024-01-08').json
+    assert weeks == [
+        {"start": "2024-01-01", "workout_count": 2, "duration_minutes": 75, "categories": {
+            "cardio": {"exercise_count": 1, "total_sets": 0, "total_reps": 0, "total_volume": 0, "total_duration_seconds": 1200},
+            "strength": {"exercise_count": 2, "total_sets": 9, "total_reps": 8, "total_volume": 37, "total_duration_seconds": 0},
+        }},
+        {"start": "2024-01-08", "workout_count": 1, "duration_minutes": 60, "categories": {}},
+    ]
+    days = client.get('/stats/timeline?bucket=day&from=2024-01-02&to=2024-01-08').json
+    assert [(day['start'], day['workout_count']) for day in days] == [("2024-01-03", 1), ("2024-01-08", 1)]
+    months = client.get('/stats/timeline?bucket=month&from=2024-01-15&to=2024-01-15').json
+    assert [(month['start'], month['workout_count'], month['duration_minutes']) for month in months] == [("2024-01-01", 3, 135)]
+
+    assert client.get('/stats/timeline?bucket=year').status_code == 400
+    assert client.get('/stats/timeline?from=2024-02-01&to=2024-01-01').status_code == 400
+    assert client.get('/stats/timeline?from=1990-01-01&to=2024-01-01').status_code == 400
+
+def test_rollups_follow_every_write(client):
+    """Test creates, deletes and sync updates leave the rollups equal to a fresh computation"""
+    exercises = post(client, '/exercises/bulk', [{"name": f"Lift {i}", "category": "strength"} for i in range(3)])['created']
+    workouts = post(client, '/workouts/bulk', [{"date": f"2024-03-0{i + 1}", "duration_minutes": 20 + i} for i in range(4)])['created']
+    for workout in workouts:
+        post(client, f"/workouts/{workout['id']}/workout_exercises/bulk",
+             [{"exercise_id": exercise['id'], "reps": 2 + workout['id'], "sets": 3} for exercise in exercises])
+    assert drift() == NO_DRIFT
+
+    sync(client, 'moves',
+         {"op": "update", "type": "workout", "id": workouts[0]['id'], "data": {"date": "2024-03-04", "duration_minutes": 90}},
+         {"op": "update", "type": "exercise", "id": exercises[0]['id'], "data": {"category": "cardio"}},
+         {"op": "update", "type": "workout_exercise", "id": 5, "data": {"reps": 40}})
+    assert drift() == NO_DRIFT
+    days = client.get('/stats/timeline?bucket=day&from=2024-03-01&to=2024-03-31').json
+    assert [day['start'] for day in days] == ["2024-03-02", "2024-03-03", "2024-03-04"]
+    assert days[-1]['workout_count'] == 2 and days[-1]['categories']['cardio']['exercise_count'] == 2
+
+    assert client.delete(f"/workouts/{workouts[1]['id']}").status_code == 200
+    assert client.delete(f"/exercises/{exercises[1]['id']}").status_code == 200
+    job_id = client.delete(f"/workouts/{workouts[2]['id']}?mode=async").json['id']
+    assert jobs.wait(job_id, timeout=10)['status'] == 'done'
+    db.session.expire_all()
+    assert drift() == NO_DRIFT
+    assert [day['start'] for day in client.get('/stats/timeline?bucket=day&from=2024-03-01&to=2024-03-31').json] == ["2024-03-04"]
+
+def test_timeline_is_one_query(count_queries):
+    """Test a year of daily buckets is a single statement over the rollups"""
+    response, queries = count_queries('GET', '/stats/timeline?bucket=day')
+    assert response.status_code == 200
+    assert queries == 1
+
+def test_rebuild_command(app, client):
+    """Test `flask timeline rebuild` reports drift, backfills and verifies the result"""
+    post(client, '/workouts', {"date": "2024-05-01", "duration_minutes": 30})
+    db.session.query(DailyWorkoutTotals).delete()
+    db.session.commit()
+
+    runner = app.test_cli_runner()
+    check = runner.invoke(args=['timeline', 'rebuild', '--check'])
+    assert check.exit_code == 1
+    assert 'daily_workout_totals: 1 rows differ' in check.output
+
+    rebuilt = runner.invoke(args=['timeline', 'rebuild'])
+    assert rebuilt.exit_code == 0, rebuilt.output
+    assert runner.invoke(args=['timeline', 'rebuild', '--check']).exit_code == 0
+    assert client.get('/stats/timeline?bucket=day&from=2024-05-01&to=2024-05-01').json[0]['workout_count'] == 1
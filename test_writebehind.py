@@ -0,0 +1,141 @@
+"""
+Write-behind tests: ?mode=async links are queued, committed in groups, and
+reported through their receipts; the queue is bounded and drains on close.
+Run with: python -m pytest test_writebehind.py
+"""
+
+import threading
+import time
+
+from sqlalchemy.exc import OperationalError
+
+import writebehind
+from models import LinkReceipt, WorkoutExercise
+from test_queries import add_exercises, add_workouts
+from writebehind import LinkWriter
+
+def post(client, workout_id, exercise_id, **metrics):
+    return client.post(f'/workouts/{workout_id}/exercises/{exercise_id}/workout_exercises?mode=async', json=metrics)
+
+def test_links_commit_in_groups(app, client, monkeypatch):
+    """Test queued links return 202 receipts and are written in full groups, conflicts included"""
+    monkeypatch.setitem(app.config, 'WRITE_BEHIND_BATCH_SIZE', 5)
+    monkeypatch.setitem(app.config, 'WRITE_BEHIND_FLUSH_MS', 30000)
+    workouts = add_workouts(4)
+    exercises = add_exercises(2)
+
+    receipts = []
+    for workout in workouts:
+        for exercise in exercises:
+            response = post(client, workout.id, exercise.id, reps=10, sets=2)
+            assert response.status_code == 202
+            assert response.headers['Location'] == response.json['status_url']
+            receipts.append(response.json)
+    receipts.append(post(client, workouts[0].id, exercises[0].id, reps=1).json)
+    receipts.append(post(client, 999, exercises[0].id, reps=1).json)
+    # A bad body is still rejected before anything is queued
+    assert post(client, workouts[0].id, 999, reps=-1).status_code == 404
+    assert post(client, workouts[0].id, exercises[0].id).status_code == 400
+    writer = app.extensions['link_writer']
+    writer.join()
+
+    statuses = [client.get(receipt['status_url']).json for receipt in receipts]
+    assert [status['status'] for status in statuses] == ['done'] * 8 + ['failed'] * 2
+    assert statuses[0]['workout_exercise'] == {"id": 1, "workout_id": workouts[0].id, "exercise_id": exercises[0].id,
+                                               "reps": 10, "sets": 2, "duration_seconds": None}
+    assert [status['error'] for status in statuses[8:]] == ["Exercise already added to this workout",
+                                                            "Workout or exercise not found"]
+    assert writer.stats() == {"pending": 0, "written": 8, "failed": 2, "commits": 2}
+    assert WorkoutExercise.query.count() == 8
+    assert client.get(f'/workouts/{workouts[0].id}/summary').json['total_reps'] == 20
+    assert client.get('/workout_exercises/receipts/unknown').status_code == 404
+
+def test_queue_is_bounded(app, client):
+    """Test a full queue answers 503, and close() writes everything queued before refusing more"""
+    writer = app.extensions['link_writer'] = LinkWriter(app, max_pending=2, batch_size=1)
+    writing, release = threading.Event(), threading.Event()
+    write = writer._write
+
+    def blocked_write(batch):
+        writing.set()
+        release.wait(10)
+        write(batch)
+
+    writer._write = blocked_write
+    workout = add_workouts(1)[0]
+    exercises = add_exercises(5)
+
+    assert post(client, workout.id, exercises[0].id, reps=1).status_code == 202
+    # The writer holds the first link while the next two fill the queue
+    assert writing.wait(10)
+    assert post(client, workout.id, exercises[1].id, reps=1).status_code == 202
+    assert post(client, workout.id, exercises[2].id, reps=1).status_code == 202
+    response = post(client, workout.id, exercises[3].id, reps=1)
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    assert response.json == {"error": "Write-behind queue is full"}
+
+    release.set()
+    writer.close()
+    assert not writer._thread.is_alive()
+    assert WorkoutExercise.query.count() == 3
+    assert writer.stats() == {"pending": 0, "written": 3, "failed": 0, "commits": 3}
+    assert post(client, workout.id, exercises[4].id, reps=1).json == {"error": "Write-behind queue is shutting down"}
+
+def test_receipts_are_stored(app, client):
+    """Test decided receipts are read from link_receipts, as from a worker that never queued them"""
+    workout = add_workouts(1)[0]
+    exercises = add_exercises(2)
+    done = post(client, workout.id, exercises[0].id, reps=5).json
+    failed = post(client, 999, exercises[1].id, reps=5).json
+    app.extensions['link_writer'].close()
+    # Another worker's writer knows nothing about these receipts
+    app.extensions['link_writer'] = LinkWriter(app)
+
+    assert client.get(done['status_url']).json == {
+        "id": done['id'], "status": "done", "workout_id": workout.id, "exercise_id": exercises[0].id, "error": None,
+        "workout_exercise": {"id": 1, "workout_id": workout.id, "exercise_id": exercises[0].id,
+                             "reps": 5, "sets": None, "duration_seconds": None},
+    }
+    assert client.get(failed['status_url']).json == {
+        "id": failed['id'], "status": "failed", "workout_id": 999, "exercise_id": exercises[1].id,
+        "workout_exercise": None, "error": "Workout or exercise not found",
+    }
+    assert LinkReceipt.query.count() == 2
+
+def test_failed_group_keeps_its_receipts(app, client, monkeypatch):
+    """Test receipts of a group that could not be written or stored are answered until they are stored"""
+    monkeypatch.setattr(writebehind, 'RETRY_SECONDS', 0.01)
+    writer = app.extensions['link_writer'] = LinkWriter(app)
+    workout = add_workouts(1)[0]
+    exercise = add_exercises(1)[0]
+
+    def locked(batch, session):
+        raise OperationalError('INSERT', {}, Exception('database is locked'))
+
+    store, calls = writebehind.store_receipts, []
+
+    def store_once_locked(results, session):
+        calls.append(len(results))
+        if len(calls) == 1:
+            raise OperationalError('INSERT', {}, Exception('database is locked'))
+        store(results, session)
+
+    monkeypatch.setattr(writer, '_insert_batch', locked)
+    monkeypatch.setattr(writebehind, 'store_receipts', store_once_locked)
+    receipt = post(client, workout.id, exercise.id, reps=1).json
+    writer.join()
+
+    # Storing failed too: the receipt is still answered, from memory
+    status = client.get(receipt['status_url']).json
+    assert status['status'] == 'failed'
+    assert 'database is locked' in status['error']
+
+    # Polls memory only: the tests' in-memory database is one connection shared with the writer
+    deadline = time.monotonic() + 5
+    while writer.get(receipt['id']) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert calls == [1, 1]
+    assert LinkReceipt.query.count() == 1
+    assert client.get(receipt['status_url']).json == status
+    assert WorkoutExercise.query.count() == 0